@@ -1,37 +1,109 @@
 import streamlit as st
-import snowflake.connector
 import pandas as pd
 import os
+import tempfile
+import time
 from dotenv import load_dotenv
-import pyodbc
 import toml
+from compare import DEFAULT_MAX_EXAMPLES, validate_data_by_key, compare_columns, comparisons_to_frame, rows_to_frame, validate_data_batches, row_order_matched
+from normalize import configure as configure_normalization
+from timing import configure_log as configure_timing_log, span, timed_run
+from connections import pool, snowflake_env_config, mssql_env_config
+from catalog import DEFAULT_LIST_LIMIT, DEFAULT_MAX_NAMES, DEFAULT_TTL, catalog_cache, get_table_names
+from checksum import validate_checksums
+from profiling import DEFAULT_DISTINCT_TOLERANCE, validate_profiles
+from bucket_diff import DEFAULT_FANOUT, DEFAULT_LEAF_ROWS, bucket_diff
+from sampling import DEFAULT_CONFIDENCE, DEFAULT_SAMPLE_FRACTION, validate_sample
+from snapshot import DEFAULT_MAX_BYTES, DEFAULT_SNAPSHOT_DIR, DEFAULT_SNAPSHOT_TTL, get_mssql_snapshot, get_snowflake_snapshot, iter_snapshot_batches, snapshot_cache
+from incremental import DEFAULT_STATE_FILE, WatermarkStore, advance_window, pair_key, plan_window, window_batches, window_is_empty
+from metadata import COLUMN_NAME_POSITION, DEFAULT_ATTRIBUTES, METADATA_COLUMNS, validate_schema_bulk, validate_schema_by_name
+from orchestrator import DEFAULT_MSSQL_WORKERS, DEFAULT_SNOWFLAKE_WORKERS, make_job, run_jobs
+from viewer import DEFAULT_CHUNK_ROWS, DEFAULT_PAGE_SIZE, MAX_RESULT_SETS, PAGE_SIZES, csv_chunk, drop_source, frame_fingerprint, has_mismatch_filter, page_count, read_page, source_columns, source_rows, spill_frame, view_frame
+from snowflake_async import POLL_INTERVAL, cancel_query, check_query, fetch_query_results, submit_query
+from parallel_compare import DEFAULT_WORKERS, validate_data_parallel
+from external_diff import DEFAULT_MEMORY_LIMIT, validate_data_external
+from table_stats import choose_batch_size, format_bytes, get_table_size, limit_size, memory_warning, validate_table_sizes
+from extract import DEFAULT_BATCH_SIZE, get_mssql_columns, iter_mssql_batches, get_snowflake_columns, iter_snowflake_arrow_batches, snowflake_select
 config = toml.load("config.toml")
 
+# Table catalog cache settings from the [catalog] section of config.toml
+catalog_settings = config.get('catalog', {})
+catalog_cache.ttl = catalog_settings.get('ttl_seconds', DEFAULT_TTL)
+catalog_cache.max_names = catalog_settings.get('max_names', DEFAULT_MAX_NAMES)
+
+# Value normalization rules from the [normalization] section of config.toml
+configure_normalization(config.get('normalization', {}))
+
+# Timing spans are also written as JSON lines when [timing] log_file is set in config.toml
+configure_timing_log(config.get('timing', {}).get('log_file'))
+
+# Number of mismatched values kept for display, every mismatch is still counted
+max_examples = config.get('results', {}).get('max_examples', DEFAULT_MAX_EXAMPLES)
+
+# Allowed difference between the approximate distinct counts from the [profile] section of config.toml
+distinct_tolerance = config.get('profile', {}).get('distinct_tolerance', DEFAULT_DISTINCT_TOLERANCE)
+
+# Default sample size and confidence level from the [sampling] section of config.toml
+sampling_settings = config.get('sampling', {})
+
+# Local Parquet snapshots of fetched extracts from the [snapshots] section of config.toml
+snapshot_settings = config.get('snapshots', {})
+snapshot_cache.directory = snapshot_settings.get('directory', DEFAULT_SNAPSHOT_DIR)
+snapshot_cache.ttl = snapshot_settings.get('ttl_seconds', DEFAULT_SNAPSHOT_TTL)
+snapshot_cache.max_bytes = snapshot_settings.get('max_bytes', DEFAULT_MAX_BYTES)
+
+# Worker processes and partitions of the parallel key comparison from the [parallel] section of config.toml
+parallel_settings = config.get('parallel', {})
+
+# Memory limit and spill directory of the out of core key comparison from the [external_diff] section of config.toml
+external_settings = config.get('external_diff', {})
+
+# Last validated watermark per table pair, kept in the [incremental] state_file of config.toml
+watermark_store = WatermarkStore(config.get('incremental', {}).get('state_file', DEFAULT_STATE_FILE))
+
 # Load environment variables from .env file
 load_dotenv("credentials.env")
 
+# Function to check out this session's connection to a database, kind is 'snowflake' or 'mssql'.
+# The connection is the session's alone until release_session_connections() returns it at the
+# end of the rerun, a connection held for the same details is reused.
+def checkout_session_connection(kind, config):
+    held = st.session_state.get(f'{kind}_conn')
+    if held is not None:
+        if st.session_state.get(f'{kind}_config') == config:
+            return held
+        del st.session_state[f'{kind}_conn']
+        pool.checkin(held)
+    conn = pool.checkout(kind, config)
+    st.session_state[f'{kind}_conn'] = conn
+    return conn
+
+# Function to check the connections of this session out again at the start of a rerun
+def restore_session_connections():
+    for kind, label in (('mssql', 'MS SQL Server'), ('snowflake', 'Snowflake')):
+        if st.session_state.get(f'{kind}_connection_success') and f'{kind}_config' in st.session_state:
+            try:
+                checkout_session_connection(kind, st.session_state[f'{kind}_config'])
+            except Exception as e:
+                st.session_state[f'{kind}_connection_success'] = False
+                st.error(f"Error reconnecting to {label}: {str(e)}")
+
+# Function to give the connections of this session back to the pool when the rerun ends
+def release_session_connections():
+    for kind in ('mssql', 'snowflake'):
+        conn = st.session_state.pop(f'{kind}_conn', None)
+        if conn is not None:
+            pool.checkin(conn)
+
+# Function to connect to Snowflake. Connections come from the shared pool, so a rerun with the
+# same details reuses an open connection instead of logging in again.
 def connect_snowflake(config=None):
     try:
-        if config:
-            conn = snowflake.connector.connect(
-                user=config.get('user'),
-                password=config.get('password'),
-                account=config.get('account'),
-                role=config.get('role'),
-                warehouse=config.get('warehouse'),
-                database=config.get('database'),
-                schema=config.get('schema')
-            )
-        else:
-            conn = snowflake.connector.connect(
-                user=os.getenv("SNOWFLAKE_USER"),
-                password=os.getenv("SNOWFLAKE_PASSWORD"),
-                account=os.getenv("SNOWFLAKE_ACCOUNT"),
-                role=os.getenv("SNOWFLAKE_ROLE"),
-                warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
-                database=os.getenv("SNOWFLAKE_DATABASE"),
-                schema=os.getenv("SNOWFLAKE_SCHEMA")
-            )
+        config = config or snowflake_env_config()
+        with span('connect'):
+            conn = checkout_session_connection('snowflake', config)
+        # Kept so that background workers can open their own connections
+        st.session_state['snowflake_config'] = config
         st.success("Snowflake connection successful!")
         st.session_state['snowflake_connection_success'] = True
         return conn
@@ -51,25 +123,13 @@ def write_env_variables(config):
     with open("credentials.env", "w") as f:
         f.writelines(preserved_lines)
 
-#Function to connect to mssql
+#Function to connect to mssql, through the shared connection pool
 def connect_mssql(config=None):
     try:
-        if config:
-            mssql_conn = pyodbc.connect(
-                f'DRIVER={{ODBC Driver 17 for SQL Server}};'
-                f'SERVER={config["server"]};'
-                f'DATABASE={config["database"]};'
-                f'UID={config["uid"]};'
-                f'PWD={config["password"]}'
-            )
-        else:
-            mssql_conn = pyodbc.connect(
-                f'DRIVER={{ODBC Driver 17 for SQL Server}};'
-                f'SERVER={os.getenv("MSSQL_SERVER")};'
-                f'DATABASE={os.getenv("MSSQL_DATABASE")};'
-                f'Trusted_Connection=yes;'
-                f'UID={os.getenv("MSSQL_USER")};'
-                f'PWD={os.getenv("MSSQL_PASSWORD")}')
+        config = config or mssql_env_config()
+        with span('connect'):
+            mssql_conn = checkout_session_connection('mssql', config)
+        st.session_state['mssql_config'] = config
         st.success("MSSQL connection successful!")
         st.session_state['mssql_connection_success'] = True
         return mssql_conn
@@ -92,12 +152,14 @@ def write_mssql_env_variables(mssql_config):
 # Function to fetch MSSQL table metadata
 def get_mssql_metadata(mssql_conn, mssql_table_name):
     try:
-        cursor = mssql_conn.cursor()
-        cursor.execute(f"""SELECT
-        *
-        FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_NAME = '{mssql_table_name}'""")
-        mssql_metadata = cursor.fetchall()
+        with span('metadata fetch') as record:
+            cursor = mssql_conn.cursor()
+            cursor.execute(f"""SELECT
+            *
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = '{mssql_table_name}'""")
+            mssql_metadata = cursor.fetchall()
+            record['rows'] = len(mssql_metadata)
         mssql_column_names = [desc[0] for desc in cursor.description]
         mssql_metadata = [list(row) for row in mssql_metadata]
         cursor.close()
@@ -106,129 +168,311 @@ def get_mssql_metadata(mssql_conn, mssql_table_name):
        st.error(f"Error fetching metadata: {str(e)}")
        return None, None
 
-# Function to fetch Snowflake table metadata
-def get_snowflake_metadata(snowflake_conn, snow_table_name):
+# Function to start a Snowflake query in the background, its query id is kept in the session under state_key
+def start_snowflake_query(snowflake_conn, state_key, query):
     try:
-        cursor = snowflake_conn.cursor()
-        cursor.execute(f"DESC TABLE {snow_table_name}")
-        snowflake_metadata = cursor.fetchall()
-        snow_column_names = [i[0] for i in cursor.description]
+        query_id = submit_query(snowflake_conn, query)
+    except Exception as e:
+        st.error(f"Error starting Snowflake query: {str(e)}")
+        return
+    st.session_state[state_key] = {'query_id': query_id, 'started': time.time()}
+
+# Function to check a background Snowflake query once, rerun by Streamlit every POLL_INTERVAL
+# seconds while the query runs. Once it finished, or failed, the whole app is rerun to pick it up.
+@st.fragment(run_every=POLL_INTERVAL)
+def poll_snowflake_query(snowflake_conn, state_key):
+    pending = st.session_state.get(state_key)
+    if pending is None or 'finished' in pending:
+        return
+    try:
+        running, status = check_query(snowflake_conn, pending['query_id'])
+    except Exception as e:
+        pending['finished'] = str(e)
+        st.rerun()
+    if not running:
+        pending['finished'] = None
+        st.rerun()
+    st.write(f"Snowflake query {pending['query_id']}: {status.lower()}, {time.time() - pending['started']:.0f}s elapsed")
+
+# Function to follow a background Snowflake query. While it runs the status and elapsed time are
+# polled without blocking the script and shown with a Cancel button; once it finished the rows and
+# column names are returned, otherwise None. The query id stays in the session until then, so a
+# rerun reattaches to the running query instead of starting it again.
+def follow_snowflake_query(snowflake_conn, state_key):
+    pending = st.session_state.get(state_key)
+    if pending is None:
+        return None
+    if st.button('Cancel Snowflake Query', key=f"{state_key}_cancel"):
+        st.session_state.pop(state_key, None)
+        try:
+            cancel_query(snowflake_conn, pending['query_id'])
+            st.warning(f"Cancelled Snowflake query {pending['query_id']}.")
+        except Exception as e:
+            st.error(f"Error cancelling Snowflake query: {str(e)}")
+        return None
+    if 'finished' not in pending:
+        poll_snowflake_query(snowflake_conn, state_key)
+        return None
+    st.session_state.pop(state_key, None)
+    if pending['finished'] is not None:
+        st.error(f"Error running Snowflake query: {pending['finished']}")
+        return None
+    try:
+        with span('data fetch') as record:
+            cursor = fetch_query_results(snowflake_conn, pending['query_id'])
+            data = cursor.fetchall()
+            record['rows'] = len(data)
+        column_names = [i[0] for i in cursor.description]
         cursor.close()
-        return snowflake_metadata, snow_column_names
     except Exception as e:
-       st.error(f"Error fetching metadata: {str(e)}")
-       return None, None
+        st.error(f"Error running Snowflake query: {str(e)}")
+        return None
+    return data, column_names
+
+# Function to start fetching Snowflake table metadata in the background
+def start_snowflake_metadata(snowflake_conn, snow_table_name):
+    start_snowflake_query(snowflake_conn, 'snowflake_metadata_query', f"DESC TABLE {snow_table_name}")
 
 # Function to fetch MSSQL table data
 def get_mssql_data(mssql_conn, mssql_table_name):
     try:
-        cursor = mssql_conn.cursor()
-        cursor.execute(f"select * FROM {mssql_table_name}")
-        data = cursor.fetchall()
+        with span('data fetch') as record:
+            cursor = mssql_conn.cursor()
+            cursor.execute(f"select * FROM {mssql_table_name}")
+            data = cursor.fetchall()
+            record['rows'] = len(data)
         mssqldata_column_names = [i[0] for i in cursor.description]
         cursor.close()
-        data = [list(row) for row in data]
+        with span('convert', rows=len(data)):
+            data = [list(row) for row in data]
         return data, mssqldata_column_names
     except Exception as e:
         st.error(f"Error fetching data: {str(e)}")
         return None
 
-# Function to fetch Snowflake table data
-def get_snowflake_data(snowflake_conn, snow_table_name):
-    try:
-        cursor = snowflake_conn.cursor()
-        cursor.execute(f"SELECT * FROM {snow_table_name} LIMIT 1000")
-        data = cursor.fetchall()
-        snowdata_columns_names = [i[0] for i in cursor.description]
-        cursor.close()
-        return data,snowdata_columns_names
-    except Exception as e:
-        st.error(f"Error fetching data: {str(e)}")
-        return None
+# Function to start fetching Snowflake table data in the background, row_limit of None or 0 fetches the whole table
+def start_snowflake_data(snowflake_conn, snow_table_name, row_limit=1000):
+    start_snowflake_query(snowflake_conn, 'snowflake_data_query', snowflake_select(snow_table_name, row_limit=row_limit))
     
 
-def normalize_value(value):
-    normalization_dict = {
-        "no": "n",
-        "yes": "y",
-        "true": "1",
-        "false": "0",
-        "numeric": "number"
-    }
-    value_str = str(value).lower()
-    normalized_value = normalization_dict.get(value_str, value_str)
-    return normalized_value
-
-def strip_precision(data_type):
-        return data_type.split('(')[0] if '(' in data_type else data_type
-
 # Function to validate schema based on column indices from both mapping document and metadata
-
 def map_validate_schema(mapping_df, snowflake_metadata, mapping_indices, snowflake_metadata_indices):
-    validation_results = []
-    for index, row in mapping_df.iterrows():
-        for map_idx, meta_idx in zip(mapping_indices, snowflake_metadata_indices):
-            expected_value = normalize_value(strip_precision(row.iloc[map_idx]))
-            try:
-                actual_value = normalize_value(strip_precision(snowflake_metadata[index][meta_idx]))
-                match = (expected_value == actual_value)
-            except IndexError:
-                actual_value = "Index out of range"
-                match = False
-            validation_results.append({
-                'row_index': index,
-                'mapping_index': map_idx,
-                'metadata_index': meta_idx,
-                'expected_value': expected_value,
-                'actual_value': actual_value,
-                'match': match
-            })
-    return validation_results
+    metadata_df = rows_to_frame(snowflake_metadata, None)
+    comparisons, row_count = compare_columns(mapping_df, metadata_df, mapping_indices, snowflake_metadata_indices, pad_missing=True)
+    validation_df = comparisons_to_frame(mapping_df, metadata_df, comparisons, row_count, mapping_indices, snowflake_metadata_indices)
+    return validation_df.rename(columns={
+        'source_column': 'mapping_index',
+        'target_column': 'metadata_index',
+        'source_value': 'expected_value',
+        'target_value': 'actual_value'
+    })
 
 # Function to validate schema based on column indices from both mssql_metadata and snowflake_metadata
 def meta_validate_schema(mssql_metadata, snowflake_metadata, mssql_metadata_indices, snowflake_metadata_indices):
-    validation_results = []
-    for index, row in enumerate(mssql_metadata):
-        for src_idx, tgt_idx in zip(mssql_metadata_indices, snowflake_metadata_indices):
-            expected_value = normalize_value(strip_precision(row[src_idx]))
-            try:
-                actual_value = normalize_value(strip_precision(snowflake_metadata[index][tgt_idx]))
-                match = (expected_value == actual_value)
-            except IndexError:
-                actual_value = "Index out of range"
-                match = False
-            validation_results.append({
-                'row_index': index,
-                'mssql_metadata_index': src_idx,
-                'snowflake_metadata_index': tgt_idx,
-                'expected_value': expected_value,
-                'actual_value': actual_value,
-                'match': match
-            })
-    return validation_results
-
-# Function to validate data between MSSQL and Snowflake
-def validate_data(source_data, target_data, source_column_names, target_column_names):
-    validation_results = []
-    for src_row, tgt_row in zip(source_data, target_data):
-        for src_col, tgt_col in zip(source_column_names, target_column_names):
-            src_idx = source_column_names.index(src_col)
-            tgt_idx = target_column_names.index(tgt_col)
-            expected_value = normalize_value(strip_precision(src_row[src_idx]))
-            actual_value = normalize_value(strip_precision(tgt_row[tgt_idx]))
-            match = (expected_value == actual_value)
-            validation_results.append({
-                'source_column': src_col,
-                'target_column': tgt_col,
-                'source_value': expected_value,
-                'target_value': actual_value,
-                'match': match
-            })
-    return validation_results
-
-
-# Streamlit app
+    mssql_metadata_df = rows_to_frame(mssql_metadata, None)
+    snowflake_metadata_df = rows_to_frame(snowflake_metadata, None)
+    comparisons, row_count = compare_columns(mssql_metadata_df, snowflake_metadata_df, mssql_metadata_indices, snowflake_metadata_indices, pad_missing=True)
+    validation_df = comparisons_to_frame(mssql_metadata_df, snowflake_metadata_df, comparisons, row_count, mssql_metadata_indices, snowflake_metadata_indices)
+    return validation_df.rename(columns={
+        'source_column': 'mssql_metadata_index',
+        'target_column': 'snowflake_metadata_index',
+        'source_value': 'expected_value',
+        'target_value': 'actual_value'
+    })
+
+# Function to validate schema by column name, the selected attributes of the columns with the
+# same (normalized) name are compared whatever order the rows come in
+def schema_validate_by_name(source_df, snowflake_metadata, source_name_index, metadata_name_index, source_indices, metadata_indices, source_labels, metadata_labels):
+    metadata_df = rows_to_frame(snowflake_metadata, None)
+    return validate_schema_by_name(source_df, metadata_df, source_name_index, metadata_name_index, source_indices, metadata_indices,
+                                   [source_labels[idx] for idx in source_indices], [metadata_labels[idx] for idx in metadata_indices])
+
+# Function to show the results of a name keyed schema validation
+def show_schema_name_results(name_results):
+    st.write(f"Matched columns: {name_results['matched']}, missing in Snowflake: {len(name_results['missing'])}, extra in Snowflake: {len(name_results['extra'])}, differing attributes: {len(name_results['differences'])}")
+    if name_results['missing']:
+        st.write("Columns Missing in Snowflake:")
+        show_frame(pd.DataFrame({'column_name': name_results['missing']}), 'Columns Missing in Snowflake')
+    if name_results['extra']:
+        st.write("Extra Columns in Snowflake:")
+        show_frame(pd.DataFrame({'column_name': name_results['extra']}), 'Extra Columns in Snowflake')
+    if name_results['duplicates']:
+        st.warning(f"Repeated column names, only the first one was compared: {', '.join(map(str, name_results['duplicates']))}")
+    st.write("Differing Attributes:")
+    show_frame(name_results['differences'], 'Differing Attributes')
+
+# Function to pick an MSSQL table. Names come from the catalog cache and are filtered by
+# prefix on the server.
+def select_mssql_table(mssql_conn):
+    prefix = st.text_input('Filter MSSQL Tables by Prefix', key='mssql_table_prefix')
+    refresh = st.button('Refresh MSSQL Tables', key='refresh_mssql_tables')
+    try:
+        table_names = get_table_names('mssql', mssql_conn, prefix=prefix, limit=catalog_settings.get('list_limit', DEFAULT_LIST_LIMIT), refresh=refresh)
+    except Exception as e:
+        st.error(f"Error fetching table names: {str(e)}")
+        return None
+    return st.selectbox('Select MSSQL Table', table_names)
+
+# Function to pick a Snowflake table from the catalog cache
+def select_snowflake_table(snowflake_conn):
+    prefix = st.text_input('Filter Snowflake Tables by Prefix', key='snowflake_table_prefix')
+    refresh = st.button('Refresh Snowflake Tables', key='refresh_snowflake_tables')
+    try:
+        table_names = get_table_names('snowflake', snowflake_conn, prefix=prefix, limit=catalog_settings.get('list_limit', DEFAULT_LIST_LIMIT), refresh=refresh)
+    except Exception as e:
+        st.error(f"Error fetching table names: {str(e)}")
+        return None
+    return st.selectbox('Select Snowflake Table', table_names)
+
+# Function to read the catalog row count and size of the selected table once per table and show
+# them, None when the catalog does not have them
+def show_table_size(kind, conn, table_name):
+    state_key = f'{kind}_table_size'
+    if table_name and st.session_state.get(state_key, (None, None))[0] != table_name:
+        try:
+            st.session_state[state_key] = (table_name, get_table_size(kind, conn, table_name))
+        except Exception:
+            st.session_state[state_key] = (table_name, None)
+    size = st.session_state.get(state_key, (None, None))[1] if table_name else None
+    if size is not None:
+        st.caption(f"Catalog statistics: {size[0]} rows, {format_bytes(size[1])}")
+    return size
+
+# Function to warn before a full fetch that will probably not fit in memory
+def warn_fetch_memory(kind, size):
+    warning = memory_warning(kind, size)
+    if warning is not None:
+        st.warning(f"Fetching all of it takes about {format_bytes(warning[0])} of memory, {format_bytes(warning[1])} are available. Stream it in batches or keep it as a local snapshot instead.")
+
+# Function to show the counters and examples of a key comparison
+def show_merged_key_results(merged_results):
+    st.write("Validation Results:")
+    if 'partitions' in merged_results:
+        st.write(f"Compared on {merged_results['workers']} processes in {merged_results['partitions']} partitions.")
+    elif 'source_runs' in merged_results:
+        st.write(f"Sorted runs spilled: {merged_results['source_runs']} from MSSQL, {merged_results['target_runs']} from Snowflake, extra merge passes: {merged_results['merge_passes']}.")
+    st.write(f"Matched rows: {merged_results['matched_rows']}")
+    st.write(f"Mismatched rows: {merged_results['mismatched_rows']}")
+    st.write(f"Rows only in MSSQL: {merged_results['source_only_rows']}")
+    st.write(f"Rows only in Snowflake: {merged_results['target_only_rows']}")
+    show_frame(merged_results['summary'], 'Summary by Column')
+    if merged_results['truncated']:
+        st.warning(f"Only the first {max_examples} examples of each kind are shown.")
+    st.write("Mismatched Values:")
+    show_frame(merged_results['mismatches'], 'Mismatched Values')
+    st.write("Rows only in MSSQL:")
+    show_frame(merged_results['source_only'], 'Rows only in MSSQL')
+    st.write("Rows only in Snowflake:")
+    show_frame(merged_results['target_only'], 'Rows only in Snowflake')
+    if merged_results['duplicate_keys']:
+        st.warning(f"{merged_results['duplicate_keys']} duplicate keys were skipped.")
+        show_frame(merged_results['duplicates'], 'Duplicate Keys')
+
+# Function to keep a result set for the result viewer, replacing an older one with the same title.
+# The file of a spilled result set that is dropped is deleted.
+def keep_result(title, source):
+    result_sets = st.session_state.setdefault('result_sets', {})
+    old_source = result_sets.pop(title, None)
+    if old_source is not None and old_source != source:
+        drop_source(old_source)
+    result_sets[title] = source
+    while len(result_sets) > MAX_RESULT_SETS:
+        drop_source(result_sets.pop(next(iter(result_sets))))
+
+# Function to get the directory of the result sets spilled by this session. It is deleted once
+# the session ends and its state is garbage collected.
+def result_directory():
+    if 'result_directory' not in st.session_state:
+        st.session_state['result_directory'] = tempfile.TemporaryDirectory(prefix='datavalidator_results_')
+    return st.session_state['result_directory'].name
+
+# Function to show a data frame, the time Streamlit takes to render it is recorded. Frames longer
+# than a page only send their first page to the browser and are spilled to a Parquet file for the
+# result viewer, the session keeps only its path. A rerun showing the same frame again reuses
+# the file it was spilled to.
+def show_frame(frame, title='Result'):
+    with span('render', rows=min(len(frame), DEFAULT_PAGE_SIZE)):
+        if len(frame) <= DEFAULT_PAGE_SIZE:
+            st.dataframe(frame)
+            return
+        try:
+            fingerprint = frame_fingerprint(frame)
+            source = st.session_state.get('result_sets', {}).get(title)
+            if source is None or source.get('fingerprint') != fingerprint:
+                source = dict(spill_frame(frame, result_directory()), fingerprint=fingerprint)
+            keep_result(title, source)
+        except Exception as e:
+            st.error(f"Error keeping result set for the viewer: {str(e)}")
+        st.dataframe(frame.head(DEFAULT_PAGE_SIZE))
+        st.caption(f"First {DEFAULT_PAGE_SIZE} of {len(frame)} rows. Page through, filter, sort and download all of them as '{title}' in the Result Viewer below.")
+
+# Function to browse the kept result sets page by page. Filtering and sorting run on the server,
+# only the visible page is sent to the browser and downloads are cut into CSV chunks.
+def show_result_viewer():
+    result_sets = st.session_state.get('result_sets')
+    if not result_sets:
+        return
+    st.header("Result Viewer")
+    title = st.selectbox('Result Set', options=list(reversed(result_sets)), key='viewer_result')
+    source = result_sets[title]
+    columns = source_columns(source)
+    col9, col10 = st.columns(2)
+    with col9:
+        filter_column = st.selectbox('Filter Column', options=[None] + columns, format_func=lambda col: '(none)' if col is None else col, key=f'viewer_filter_column_{title}')
+        filter_text = st.text_input('Contains', key=f'viewer_filter_text_{title}')
+    with col10:
+        sort_column = st.selectbox('Sort By', options=[None] + columns, format_func=lambda col: '(none)' if col is None else col, key=f'viewer_sort_column_{title}')
+        ascending = st.radio('Order', ('Ascending', 'Descending'), horizontal=True, key=f'viewer_order_{title}') == 'Ascending'
+    mismatches_only = st.checkbox('Differences only', key=f'viewer_mismatches_only_{title}') if has_mismatch_filter(source) else False
+    page_size = st.selectbox('Rows per page', options=PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f'viewer_page_size_{title}')
+    try:
+        view = view_frame(source, mismatches_only, filter_column, filter_text, sort_column, ascending)
+        rows = source_rows(source) if view is None else len(view)
+    except Exception as e:
+        st.error(f"Error reading result set: {str(e)}")
+        return
+    pages = page_count(rows, page_size)
+    page_key = f'viewer_page_{title}'
+    # The page lives in the session state only, a value= as well would make Streamlit warn
+    st.session_state[page_key] = min(st.session_state.get(page_key, 1), pages)
+    page = st.number_input(f'Page (of {pages}, {rows} rows)', min_value=1, max_value=pages, step=1, key=page_key)
+    try:
+        page_df = read_page(source, view, page, page_size)
+    except Exception as e:
+        st.error(f"Error reading result set: {str(e)}")
+        return
+    with span('render', rows=len(page_df)):
+        st.dataframe(page_df)
+    chunks = page_count(rows, DEFAULT_CHUNK_ROWS)
+    chunk = 1
+    if chunks > 1:
+        chunk_key = f'viewer_chunk_{title}'
+        st.session_state[chunk_key] = min(st.session_state.get(chunk_key, 1), chunks)
+        chunk = st.number_input(f'Download part (of {chunks}, {DEFAULT_CHUNK_ROWS} rows each)', min_value=1, max_value=chunks, step=1, key=chunk_key)
+    if st.button('Prepare CSV Download', key=f'viewer_prepare_{title}'):
+        st.download_button('Download CSV', data=csv_chunk(source, view, chunk), file_name=f"{title.replace(' ', '_')}_{chunk}.csv", mime='text/csv', key=f'viewer_download_{title}')
+
+# Function to show where the time of this run went, phase by phase
+def show_timings(timer):
+    summary_df = timer.summary_frame()
+    if not (~summary_df['phase'].isin(['connect', 'render'])).any():
+        return
+    with st.expander("Timing Breakdown"):
+        st.write(f"Total: {timer.to_dict()['seconds']:.3f} s")
+        st.dataframe(summary_df)
+        st.bar_chart(summary_df.set_index('phase')['seconds'])
+
+# Streamlit app, every rerun is timed as one run
 def main():
+    with timed_run('app rerun') as timer:
+        try:
+            restore_session_connections()
+            render_app()
+        finally:
+            release_session_connections()
+    show_timings(timer)
+
+def render_app():
     st.title("Data Validation Tool")
     if 'mssql_connection_success' not in st.session_state and 'snowflake_connection_success' not in st.session_state:
         st.session_state['mssql_connection_success'] = False
@@ -269,7 +513,7 @@ def main():
                 try:
                     mapping_df = pd.read_csv(uploaded_file)
                     st.write("Mapping Document:")
-                    st.dataframe(mapping_df)
+                    show_frame(mapping_df, 'Mapping Document')
                     st.write(f"The column count in Mapping Doc : {len(mapping_df)}")
                     st.session_state['mapping_df'] = mapping_df
                 except pd.errors.EmptyDataError:
@@ -304,18 +548,12 @@ def main():
                 if snowflake_conn:
                     st.session_state['snowflake_conn'] = snowflake_conn
     # Validation Type
-    validation_type = st.radio("Select Validation Type", ('Schema Validation', 'Data Validation'))
+    validation_type = st.radio("Select Validation Type", ('Schema Validation', 'Bulk Schema Validation', 'Data Validation', 'Multi-Table Data Validation', 'Incremental Data Validation', 'Profile Validation', 'Checksum Validation', 'Table Size Pre-Check'))
     if validation_type == 'Schema Validation':
         if 'mssql_conn' in st.session_state and st.session_state['mssql_connection_success']:
                 mssql_conn = st.session_state['mssql_conn']
-                try:
-                    cursor = mssql_conn.cursor()
-                    cursor.execute("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'")
-                    tables = cursor.fetchall()
-                    table_names = [table[0] for table in tables]
-                    mssql_table_name = st.selectbox('Select MSSQL Table', table_names)
-                except Exception as e:
-                    st.error(f"Error fetching table names: {str(e)}")
+                mssql_table_name = select_mssql_table(mssql_conn)
+                if mssql_table_name is not None:
                     if st.button('Fetch Metadata from MS SQL Server', key='fetch_metadata_mssql'):
                         mssql_conn = st.session_state['mssql_conn']
                         if mssql_conn is not None:
@@ -325,36 +563,29 @@ def main():
                                         mssql_metadata_df = pd.DataFrame(mssql_metadata, columns=mssql_column_names)
                                         st.write(f"The column count in mssql Metadata: {len(mssql_metadata_df)}")
                                         st.write("MS SQL Server Table Metadata:")
-                                        st.dataframe(mssql_metadata_df)
+                                        show_frame(mssql_metadata_df, 'MS SQL Server Table Metadata')
                                         st.session_state['mssql_metadata'] = mssql_metadata
                                         st.session_state['mssql_column_names'] = mssql_column_names
                                 except Exception as e:
                                     st.error(f"Error fetching metadata: {str(e)}")
                 
         if 'snowflake_conn'in st.session_state and st.session_state['snowflake_connection_success']:
-            try:    
-                snowflake_conn = st.session_state['snowflake_conn']
-                cursor = snowflake_conn.cursor()
-                cursor.execute("SHOW TABLES")
-                tables = cursor.fetchall()
-                table_names = [table[1] for table in tables]
-                snow_table_name = st.selectbox('Select Snowflake Table', table_names)
-            except Exception as e:
-                st.error(f"Error fetching table names: {str(e)}")
+            snowflake_conn = st.session_state['snowflake_conn']
+            snow_table_name = select_snowflake_table(snowflake_conn)
             if st.button('Fetch Metadata from Snowflake', key='fetch_metadata_snowflake'):
                     snowflake_conn = st.session_state['snowflake_conn']
                     if snowflake_conn is not None:
-                        try:
-                            snowflake_metadata, snow_column_names = get_snowflake_metadata(snowflake_conn, snow_table_name)
-                            if snowflake_metadata:
-                                snowflake_metadata_df = pd.DataFrame(snowflake_metadata, columns=snow_column_names)
-                                st.write(f"The column count in Metadata: {len(snowflake_metadata_df)}")
-                                st.write("Snowflake Table Metadata:")
-                                st.dataframe(snowflake_metadata_df)
-                                st.session_state['snowflake_metadata'] = snowflake_metadata
-                                st.session_state['snow_column_names'] = snow_column_names
-                        except Exception as e:
-                                st.error(f"Error fetching metadata: {str(e)}")
+                        start_snowflake_metadata(snowflake_conn, snow_table_name)
+            finished_query = follow_snowflake_query(snowflake_conn, 'snowflake_metadata_query')
+            if finished_query is not None:
+                snowflake_metadata, snow_column_names = finished_query
+                if snowflake_metadata:
+                    snowflake_metadata_df = pd.DataFrame(snowflake_metadata, columns=snow_column_names)
+                    st.write(f"The column count in Metadata: {len(snowflake_metadata_df)}")
+                    st.write("Snowflake Table Metadata:")
+                    show_frame(snowflake_metadata_df, 'Snowflake Table Metadata')
+                    st.session_state['snowflake_metadata'] = snowflake_metadata
+                    st.session_state['snow_column_names'] = snow_column_names
         if 'snowflake_conn' in st.session_state and 'snowflake_metadata' in st.session_state:
             snowflake_conn = st.session_state['snowflake_conn']
             snowflake_metadata = st.session_state['snowflake_metadata']
@@ -372,11 +603,19 @@ def main():
                     options=range(len(snow_column_names)),
                     format_func=lambda x: snow_column_names[x]
                 )
+                match_columns_by = st.radio('Match Columns By', ('Column Name', 'Row Order'), key='mapping_match_by')
+                if match_columns_by == 'Column Name':
+                    mapping_name_index = st.selectbox('Column Name in Mapping Document', options=range(len(mapping_df.columns)), format_func=lambda x: mapping_df.columns[x])
+                    metadata_name_index = st.selectbox('Column Name in Metadata', options=range(len(snow_column_names)), format_func=lambda x: snow_column_names[x])
                 if st.button('Validate Schema', key='validate_schema_mapping') and validation_type == 'Schema Validation':
-                    validation_results = map_validate_schema(mapping_df, snowflake_metadata, mapping_indices, metadata_indices)
-                    validation_df = pd.DataFrame(validation_results)
-                    st.write("Validation Results:")
-                    st.dataframe(validation_df)
+                    if match_columns_by == 'Column Name':
+                        name_results = schema_validate_by_name(mapping_df, snowflake_metadata, mapping_name_index, metadata_name_index, mapping_indices, metadata_indices, list(mapping_df.columns), snow_column_names)
+                        show_schema_name_results(name_results)
+                    else:
+                        validation_results = map_validate_schema(mapping_df, snowflake_metadata, mapping_indices, metadata_indices)
+                        validation_df = pd.DataFrame(validation_results)
+                        st.write("Validation Results:")
+                        show_frame(validation_df, 'Validation Results')
             elif source_db == 'MSSQL' and 'mssql_conn' in st.session_state:
                 mssql_conn = st.session_state['mssql_conn']       
                 if 'mssql_metadata' in st.session_state:
@@ -393,26 +632,62 @@ def main():
                         options=range(len(snow_column_names)),
                         format_func=lambda x: snow_column_names[x]
                     )
+                    match_columns_by = st.radio('Match Columns By', ('Column Name', 'Row Order'), key='metadata_match_by')
+                    if match_columns_by == 'Column Name':
+                        mssql_name_index = st.selectbox('Column Name in mssql Metadata', options=range(len(mssql_column_names)), format_func=lambda x: mssql_column_names[x])
+                        snowflake_name_index = st.selectbox('Column Name in snowflake Metadata', options=range(len(snow_column_names)), format_func=lambda x: snow_column_names[x])
                     if st.button('Validate Schema') and validation_type == 'Schema Validation':
-                        validation_results = meta_validate_schema(mssql_metadata, snowflake_metadata, mssql_metadata_indices, snowflake_metadata_indices)
-                        validation_df = pd.DataFrame(validation_results)
-                        st.write("Validation Results:")
-                        st.dataframe(validation_df)
+                        if match_columns_by == 'Column Name':
+                            mssql_metadata_df = rows_to_frame(mssql_metadata, mssql_column_names)
+                            name_results = schema_validate_by_name(mssql_metadata_df, snowflake_metadata, mssql_name_index, snowflake_name_index, mssql_metadata_indices, snowflake_metadata_indices, mssql_column_names, snow_column_names)
+                            show_schema_name_results(name_results)
+                        else:
+                            validation_results = meta_validate_schema(mssql_metadata, snowflake_metadata, mssql_metadata_indices, snowflake_metadata_indices)
+                            validation_df = pd.DataFrame(validation_results)
+                            st.write("Validation Results:")
+                            show_frame(validation_df, 'Validation Results')
     elif validation_type == 'Data Validation':
         if 'mssql_conn' in  st.session_state and st.session_state['mssql_connection_success'] :
             if 'mssql_conn' in st.session_state:
                 mssql_conn = st.session_state['mssql_conn']
-                try:
-                    cursor = mssql_conn.cursor()
-                    cursor.execute("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'")
-                    tables = cursor.fetchall()
-                    table_names = [table[0] for table in tables]
-                    mssql_table_name = st.selectbox('Select MSSQL Table', table_names)
-                except Exception as e:
-                    st.error(f"Error fetching table names: {str(e)}")
+                mssql_table_name = select_mssql_table(mssql_conn)
+                mssql_table_size = show_table_size('mssql', mssql_conn, mssql_table_name)
+            stream_mssql = st.checkbox('Stream MSSQL data in batches', key='stream_mssql')
+            snapshot_mssql = st.checkbox('Keep the MSSQL extract as a local snapshot', key='snapshot_mssql')
+            if snapshot_mssql:
+                refresh_mssql_snapshot = st.checkbox('Fetch again even when a fresh snapshot exists', key='refresh_mssql_snapshot')
+            if stream_mssql or snapshot_mssql:
+                # The default batch size follows the row width from the catalog statistics
+                mssql_batch_size = st.number_input('MSSQL batch size (rows)', min_value=1000, value=choose_batch_size('mssql', mssql_table_size, DEFAULT_BATCH_SIZE), step=1000, key='mssql_batch_size')
+            else:
+                warn_fetch_memory('mssql', mssql_table_size)
             if st.button('Fetch Data from MS SQL Server', key='fetch_data_mssql'):
                 mssql_conn = st.session_state['mssql_conn']
-                if mssql_conn is not None:
+                if mssql_conn is not None and snapshot_mssql:
+                    # The whole extract is kept as Parquet on disk, the selected columns are read from it during validation
+                    try:
+                        mssql_snapshot = get_mssql_snapshot(mssql_conn, mssql_table_name, batch_size=mssql_batch_size, refresh=refresh_mssql_snapshot)
+                        st.write(f"{'Loaded the cached snapshot' if mssql_snapshot['hit'] else 'Fetched and cached'}: {mssql_snapshot['rows']} rows, {len(mssql_snapshot['columns'])} columns")
+                        st.session_state.pop('mssql_data', None)
+                        st.session_state.pop('mssql_stream_table', None)
+                        st.session_state['mssql_snapshot'] = mssql_snapshot['path']
+                        keep_result(f"MSSQL snapshot {mssql_table_name}", {'path': mssql_snapshot['path']})
+                        st.session_state['mssqldata_column_names'] = mssql_snapshot['columns']
+                    except Exception as e:
+                        st.error(f"Error fetching data: {str(e)}")
+                elif mssql_conn is not None and stream_mssql:
+                    # Only the column names are read here, the rows are streamed during validation
+                    try:
+                        mssqldata_column_names = get_mssql_columns(mssql_conn, mssql_table_name)
+                        st.write(f"The column count in mssql table: {len(mssqldata_column_names)}")
+                        st.write("MS SQL Server data will be streamed in batches during validation.")
+                        st.session_state.pop('mssql_data', None)
+                        st.session_state.pop('mssql_snapshot', None)
+                        st.session_state['mssql_stream_table'] = mssql_table_name
+                        st.session_state['mssqldata_column_names'] = mssqldata_column_names
+                    except Exception as e:
+                        st.error(f"Error fetching data: {str(e)}")
+                elif mssql_conn is not None:
                     try:
                         mssql_data, mssqldata_column_names = get_mssql_data(mssql_conn, mssql_table_name)
                         if mssql_data:
@@ -421,41 +696,73 @@ def main():
                             st.write(f"The row count in mssql Metadata: {rowcount}")
                             st.write(f"The column count in mssql Metadata: {colcount}")
                             st.write("MS SQL Server Table data:")
-                            st.dataframe(mssql_data_df)
+                            show_frame(mssql_data_df, 'MS SQL Server Table data')
+                            st.session_state.pop('mssql_stream_table', None)
+                            st.session_state.pop('mssql_snapshot', None)
                             st.session_state['mssql_data'] = mssql_data
                             st.session_state['mssqldata_column_names'] = mssqldata_column_names
                     except Exception as e:
                         st.error(f"Error fetching data: {str(e)}")
         if 'snowflake_conn'in st.session_state and st.session_state['snowflake_connection_success']:
-            try:
-                snowflake_conn = st.session_state['snowflake_conn']
-                cursor = snowflake_conn.cursor()
-                cursor.execute("SHOW TABLES")
-                tables = cursor.fetchall()
-                table_names = [table[1] for table in tables]
-                snow_table_name = st.selectbox('Select Snowflake Table', table_names)
-            except Exception as e:
-                st.error(f"Error fetching table names: {str(e)}")
+            snowflake_conn = st.session_state['snowflake_conn']
+            snow_table_name = select_snowflake_table(snowflake_conn)
+            snowflake_table_size = show_table_size('snowflake', snowflake_conn, snow_table_name)
+            snowflake_row_limit = st.number_input('Snowflake row limit (0 = no limit)', min_value=0, value=1000, step=1000, key='snowflake_row_limit')
+            stream_snowflake = st.checkbox('Stream Snowflake data as Arrow batches', key='stream_snowflake')
+            snapshot_snowflake = st.checkbox('Keep the Snowflake extract as a local snapshot', key='snapshot_snowflake')
+            if not stream_snowflake and not snapshot_snowflake:
+                warn_fetch_memory('snowflake', limit_size(snowflake_table_size, snowflake_row_limit))
+            if snapshot_snowflake:
+                refresh_snowflake_snapshot = st.checkbox('Fetch again even when a fresh snapshot exists', key='refresh_snowflake_snapshot')
             if st.button('Fetch data from Snowflake', key='fetch_data_snowflake'):
                     snowflake_conn = st.session_state['snowflake_conn']
-                    if snowflake_conn is not None:
+                    if snowflake_conn is not None and snapshot_snowflake:
+                        # The whole extract is kept as Parquet on disk, the selected columns are read from it during validation
                         try:
-                            snowflake_data, snowdata_column_names = get_snowflake_data(snowflake_conn, snow_table_name)
-                            if snowflake_data:
-                                snowflake_data_df = pd.DataFrame(snowflake_data, columns=snowdata_column_names)
-                                rowcount, colcount = snowflake_data_df.shape
-                                st.write(f"The row count in table: {rowcount}")
-                                st.write(f"The column count in table: {colcount}")
-                                st.write("Snowflake Table data:")
-                                st.dataframe(snowflake_data_df)
-                                st.session_state['snowflake_data'] = snowflake_data
-                                st.session_state['snowdata_column_names'] = snowdata_column_names
+                            snowflake_snapshot = get_snowflake_snapshot(snowflake_conn, snow_table_name, row_limit=snowflake_row_limit, refresh=refresh_snowflake_snapshot)
+                            st.write(f"{'Loaded the cached snapshot' if snowflake_snapshot['hit'] else 'Fetched and cached'}: {snowflake_snapshot['rows']} rows, {len(snowflake_snapshot['columns'])} columns")
+                            st.session_state.pop('snowflake_data', None)
+                            st.session_state.pop('snowflake_stream_table', None)
+                            st.session_state['snowflake_snapshot'] = snowflake_snapshot['path']
+                            keep_result(f"Snowflake snapshot {snow_table_name}", {'path': snowflake_snapshot['path']})
+                            st.session_state['snowdata_column_names'] = snowflake_snapshot['columns']
                         except Exception as e:
-                                    st.error(f"Error fetching data: {str(e)}")
-        if 'snowflake_conn' in st.session_state and 'mssql_conn' in st.session_state and 'mssql_data' in st.session_state and 'snowflake_data' in st.session_state:
-            snowflake_data = st.session_state['snowflake_data']
+                            st.error(f"Error fetching data: {str(e)}")
+                    elif snowflake_conn is not None and stream_snowflake:
+                        # Only the column names are read here, the Arrow batches are fetched during validation
+                        try:
+                            snowdata_column_names = get_snowflake_columns(snowflake_conn, snow_table_name)
+                            st.write(f"The column count in table: {len(snowdata_column_names)}")
+                            st.write("Snowflake data will be fetched as Arrow batches during validation.")
+                            st.session_state.pop('snowflake_data', None)
+                            st.session_state.pop('snowflake_snapshot', None)
+                            st.session_state['snowflake_stream_table'] = snow_table_name
+                            st.session_state['snowflake_stream_limit'] = snowflake_row_limit
+                            st.session_state['snowdata_column_names'] = snowdata_column_names
+                        except Exception as e:
+                            st.error(f"Error fetching data: {str(e)}")
+                    elif snowflake_conn is not None:
+                        start_snowflake_data(snowflake_conn, snow_table_name, snowflake_row_limit)
+            finished_query = follow_snowflake_query(snowflake_conn, 'snowflake_data_query')
+            if finished_query is not None:
+                snowflake_data, snowdata_column_names = finished_query
+                if snowflake_data:
+                    snowflake_data_df = pd.DataFrame(snowflake_data, columns=snowdata_column_names)
+                    rowcount, colcount = snowflake_data_df.shape
+                    st.write(f"The row count in table: {rowcount}")
+                    st.write(f"The column count in table: {colcount}")
+                    st.write("Snowflake Table data:")
+                    show_frame(snowflake_data_df, 'Snowflake Table data')
+                    st.session_state.pop('snowflake_stream_table', None)
+                    st.session_state.pop('snowflake_snapshot', None)
+                    st.session_state['snowflake_data'] = snowflake_data
+                    st.session_state['snowdata_column_names'] = snowdata_column_names
+        mssql_data_ready = 'mssql_data' in st.session_state or 'mssql_stream_table' in st.session_state or 'mssql_snapshot' in st.session_state
+        snowflake_data_ready = 'snowflake_data' in st.session_state or 'snowflake_stream_table' in st.session_state or 'snowflake_snapshot' in st.session_state
+        if 'snowflake_conn' in st.session_state and 'mssql_conn' in st.session_state and mssql_data_ready and snowflake_data_ready:
+            snowflake_data = st.session_state.get('snowflake_data')
             snowdata_column_names = st.session_state['snowdata_column_names']
-            mssql_data = st.session_state['mssql_data']
+            mssql_data = st.session_state.get('mssql_data')
             mssqldata_column_names = st.session_state['mssqldata_column_names']
             st.write("Select Columns for Data Validation:")
             mssql_data_indices = st.multiselect(
@@ -468,18 +775,336 @@ def main():
             options=range(len(snowdata_column_names)),
             format_func=lambda x: snowdata_column_names[x]
             )
+            row_matching = st.radio("Match Rows By", ('Row Order', 'Key Columns'), key='row_matching')
+            if row_matching == 'Key Columns':
+                mssql_key_indices = st.multiselect(
+                'Select Key Columns from MSSQL Data',
+                options=mssql_data_indices,
+                format_func=lambda x: mssqldata_column_names[x]
+                )
+                snowflake_key_indices = st.multiselect(
+                'Select Key Columns from Snowflake Data',
+                options=snowflake_data_indices,
+                format_func=lambda x: snowdata_column_names[x]
+                )
+                key_comparison = st.radio('Key Comparison', ('In Memory', 'Several Cores (partitions by key hash)', 'Out of Core (sorted runs on disk)'), key='key_comparison')
+                if key_comparison.startswith('Several Cores'):
+                    compare_workers = st.number_input('Worker processes', min_value=1, value=parallel_settings.get('workers', DEFAULT_WORKERS), step=1, key='compare_workers')
+                elif key_comparison.startswith('Out of Core'):
+                    compare_memory_mb = st.number_input('Memory limit (MB)', min_value=16, value=external_settings.get('memory_mb', DEFAULT_MEMORY_LIMIT // 1024 ** 2), step=256, key='compare_memory_mb')
         if st.button('Validate Selected Data', key='validate_selected_data') and validation_type == 'Data Validation':
             if len(mssql_data_indices) != len(snowflake_data_indices):
                 st.error("The number of selected columns from MSSQL and Snowflake must be the same.")
             else:
-                selected_mssql_data = [[row[idx] for idx in mssql_data_indices] for row in mssql_data]
-                selected_snowflake_data = [[row[idx] for idx in snowflake_data_indices] for row in snowflake_data]
                 selected_mssql_columns = [mssqldata_column_names[idx] for idx in mssql_data_indices]
                 selected_snowflake_columns = [snowdata_column_names[idx] for idx in snowflake_data_indices]
-                validation_results = validate_data(selected_mssql_data, selected_snowflake_data, selected_mssql_columns, selected_snowflake_columns)
-                validation_df = pd.DataFrame(validation_results)
-                st.write("Validation Results:")
-                st.dataframe(validation_df)
+                if 'mssql_snapshot' in st.session_state:
+                    # Snapshot mode: only the selected columns are read from the local Parquet file
+                    selected_mssql_batches = iter_snapshot_batches(st.session_state['mssql_snapshot'], selected_mssql_columns)
+                elif mssql_data is None:
+                    # Streaming mode: the selected MSSQL columns are read batch by batch while validating
+                    selected_mssql_batches = iter_mssql_batches(st.session_state['mssql_conn'], st.session_state['mssql_stream_table'], st.session_state.get('mssql_batch_size', DEFAULT_BATCH_SIZE), selected_mssql_columns)
+                else:
+                    selected_mssql_batches = [[[row[idx] for idx in mssql_data_indices] for row in mssql_data]]
+                if 'snowflake_snapshot' in st.session_state:
+                    # Snapshot mode: only the selected columns are read from the local Parquet file
+                    selected_snowflake_batches = iter_snapshot_batches(st.session_state['snowflake_snapshot'], selected_snowflake_columns)
+                elif snowflake_data is None:
+                    # Arrow mode: the selected Snowflake columns arrive as Arrow batches while validating
+                    selected_snowflake_batches = iter_snowflake_arrow_batches(st.session_state['snowflake_conn'], st.session_state['snowflake_stream_table'], st.session_state['snowflake_stream_limit'], selected_snowflake_columns)
+                else:
+                    selected_snowflake_batches = [[[row[idx] for idx in snowflake_data_indices] for row in snowflake_data]]
+                if row_matching == 'Key Columns':
+                    mssql_key_columns = [mssqldata_column_names[idx] for idx in mssql_key_indices]
+                    snowflake_key_columns = [snowdata_column_names[idx] for idx in snowflake_key_indices]
+                    if key_comparison != 'In Memory':
+                        try:
+                            if key_comparison.startswith('Several Cores'):
+                                merged_results = validate_data_parallel(selected_mssql_batches, selected_snowflake_batches, selected_mssql_columns, selected_snowflake_columns, mssql_key_columns, snowflake_key_columns,
+                                                                        compare_workers, parallel_settings.get('partitions'), max_examples)
+                            else:
+                                merged_results = validate_data_external(selected_mssql_batches, selected_snowflake_batches, selected_mssql_columns, selected_snowflake_columns, mssql_key_columns, snowflake_key_columns,
+                                                                        compare_memory_mb * 1024 ** 2, max_examples, external_settings.get('directory'))
+                        except ValueError as e:
+                            st.error(str(e))
+                        except Exception as e:
+                            st.error(f"Error validating data: {str(e)}")
+                        else:
+                            show_merged_key_results(merged_results)
+                    else:
+                        try:
+                            with span('compare'):
+                                key_results = validate_data_by_key(selected_mssql_batches, selected_snowflake_batches, selected_mssql_columns, selected_snowflake_columns, mssql_key_columns, snowflake_key_columns, max_examples)
+                        except ValueError as e:
+                            st.error(str(e))
+                        except Exception as e:
+                            st.error(f"Error validating data: {str(e)}")
+                        else:
+                            show_merged_key_results(key_results)
+                else:
+                    try:
+                        stream_results = validate_data_batches(selected_mssql_batches, selected_snowflake_batches, selected_mssql_columns, selected_snowflake_columns, max_examples,
+                                                               st.session_state.get('snowflake_row_limit'))
+                    except Exception as e:
+                        st.error(f"Error validating data: {str(e)}")
+                    else:
+                        st.write("Validation Results:")
+                        st.write(f"Rows compared: {stream_results['rows_compared']}")
+                        if stream_results['source_rows'] != stream_results['target_rows']:
+                            st.warning(f"MSSQL returned {stream_results['source_rows']} rows and Snowflake {stream_results['target_rows']}, the extra rows were not compared.")
+                        show_frame(stream_results['summary'], 'Summary by Column')
+                        st.write("Mismatched Values:")
+                        if stream_results['truncated']:
+                            st.warning(f"Showing the first {len(stream_results['mismatches'])} of {int(stream_results['summary']['mismatches'].sum())} mismatched values.")
+                        show_frame(stream_results['mismatches'], 'Mismatched Values')
+    elif validation_type == 'Profile Validation':
+        if 'mssql_conn' in st.session_state and st.session_state['mssql_connection_success'] and 'snowflake_conn' in st.session_state and st.session_state['snowflake_connection_success']:
+            mssql_conn = st.session_state['mssql_conn']
+            snowflake_conn = st.session_state['snowflake_conn']
+            mssql_table_name = select_mssql_table(mssql_conn)
+            snow_table_name = select_snowflake_table(snowflake_conn)
+            try:
+                mssql_profile_columns = get_mssql_columns(mssql_conn, mssql_table_name)
+                snowflake_profile_columns = get_snowflake_columns(snowflake_conn, snow_table_name)
+            except Exception as e:
+                st.error(f"Error fetching column names: {str(e)}")
+            else:
+                st.write("Select Columns to Profile (leave empty to use the columns both tables share by name):")
+                mssql_selected = st.multiselect('Select Columns from MSSQL Table', options=mssql_profile_columns, key='profile_mssql_columns')
+                snowflake_selected = st.multiselect('Select Columns from Snowflake Table', options=snowflake_profile_columns, key='profile_snowflake_columns')
+                if st.button('Run Profile Validation', key='run_profile_validation'):
+                    try:
+                        profile_df = validate_profiles(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name, mssql_selected, snowflake_selected, distinct_tolerance)
+                    except ValueError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        st.error(f"Error running profile validation: {str(e)}")
+                    else:
+                        if profile_df['match'].all():
+                            st.success("All column profiles match.")
+                        else:
+                            st.error(f"{(~profile_df['match']).sum()} of {len(profile_df)} profile values differ.")
+                        st.write(f"Distinct counts are estimates and match within {distinct_tolerance:.0%}.")
+                        show_frame(profile_df, 'Column Profiles')
+        else:
+            st.write("Connect to both MSSQL and Snowflake to run a profile validation.")
+    elif validation_type == 'Checksum Validation':
+        if 'mssql_conn' in st.session_state and st.session_state['mssql_connection_success'] and 'snowflake_conn' in st.session_state and st.session_state['snowflake_connection_success']:
+            mssql_conn = st.session_state['mssql_conn']
+            snowflake_conn = st.session_state['snowflake_conn']
+            mssql_table_name = select_mssql_table(mssql_conn)
+            snow_table_name = select_snowflake_table(snowflake_conn)
+            try:
+                mssql_checksum_columns = get_mssql_columns(mssql_conn, mssql_table_name)
+                snowflake_checksum_columns = get_snowflake_columns(snowflake_conn, snow_table_name)
+            except Exception as e:
+                st.error(f"Error fetching column names: {str(e)}")
+            else:
+                st.write("Select Columns for Checksum Validation (leave empty to use the columns both tables share by name):")
+                mssql_selected = st.multiselect('Select Columns from MSSQL Table', options=mssql_checksum_columns)
+                snowflake_selected = st.multiselect('Select Columns from Snowflake Table', options=snowflake_checksum_columns)
+                if st.button('Run Checksum Validation', key='run_checksum_validation'):
+                    try:
+                        checksum_df = validate_checksums(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name, mssql_selected, snowflake_selected)
+                    except ValueError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        st.error(f"Error running checksum validation: {str(e)}")
+                    else:
+                        if checksum_df['match'].all():
+                            st.success("All checksums match.")
+                        else:
+                            st.error(f"{(~checksum_df['match']).sum()} of {len(checksum_df)} checksums differ.")
+                        show_frame(checksum_df, 'Checksums')
+                st.write("Find Differing Rows by Bucketed Hash Diff:")
+                mssql_diff_keys = st.multiselect('Select Key Columns from MSSQL Table', options=mssql_checksum_columns)
+                snowflake_diff_keys = st.multiselect('Select Key Columns from Snowflake Table', options=snowflake_checksum_columns)
+                diff_fanout = st.number_input('Buckets per level', min_value=2, value=DEFAULT_FANOUT, step=1)
+                diff_leaf_rows = st.number_input('Fetch rows when a bucket has at most', min_value=1, value=DEFAULT_LEAF_ROWS, step=100)
+                if st.button('Find Differing Rows', key='run_bucket_diff'):
+                    try:
+                        differences_df, diff_stats = bucket_diff(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name, mssql_diff_keys, snowflake_diff_keys, mssql_selected, snowflake_selected, diff_fanout, diff_leaf_rows)
+                    except ValueError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        st.error(f"Error running bucket diff: {str(e)}")
+                    else:
+                        st.write(f"Differing rows: {len(differences_df)}")
+                        st.write(f"Levels: {diff_stats['depth']}, buckets compared: {diff_stats['buckets_compared']}, leaf buckets: {diff_stats['leaf_buckets']}, rows fetched: {diff_stats['rows_fetched']}, queries: {diff_stats['queries']}")
+                        show_frame(differences_df, 'Differing Rows')
+                st.write("Validate a Deterministic Sample (uses the key columns above):")
+                sample_fraction = st.number_input('Sample Fraction', min_value=0.000001, max_value=1.0, value=float(sampling_settings.get('fraction', DEFAULT_SAMPLE_FRACTION)), step=0.01, format='%.6f')
+                sample_target_rows = st.number_input('Or Target Sample Rows (0 to use the fraction)', min_value=0, value=int(sampling_settings.get('target_rows', 0)), step=1000)
+                sample_confidence = st.number_input('Confidence Level', min_value=0.5, max_value=0.999, value=float(sampling_settings.get('confidence', DEFAULT_CONFIDENCE)), step=0.01)
+                if st.button('Validate Sample', key='run_sample_validation'):
+                    try:
+                        sample_results = validate_sample(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name, mssql_diff_keys, snowflake_diff_keys,
+                                                         mssql_selected, snowflake_selected, sample_fraction, sample_target_rows, sample_confidence)
+                    except ValueError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        st.error(f"Error running sample validation: {str(e)}")
+                    else:
+                        st.write(f"Sampled {sample_results['fraction']:.4%} of the keys: {sample_results['source_rows']} MSSQL rows, {sample_results['target_rows']} Snowflake rows")
+                        st.write(f"Estimated Difference Rates ({sample_confidence:.1%} confidence):")
+                        show_frame(sample_results['estimates'], 'Estimated Difference Rates')
+                        st.write("Differing Sampled Rows:")
+                        show_frame(sample_results['differences'], 'Differing Sampled Rows')
+        else:
+            st.write("Connect to both MSSQL and Snowflake to run a checksum validation.")
+    elif validation_type == 'Bulk Schema Validation':
+        if 'mssql_conn' in st.session_state and st.session_state['mssql_connection_success'] and 'snowflake_conn' in st.session_state and st.session_state['snowflake_connection_success']:
+            mssql_conn = st.session_state['mssql_conn']
+            snowflake_conn = st.session_state['snowflake_conn']
+            mssql_schema = st.text_input('MSSQL Schema (empty for all schemas)', key='bulk_mssql_schema')
+            snowflake_schema = st.text_input('Snowflake Schema (empty for all schemas)', key='bulk_snowflake_schema')
+            table_list = st.text_area('Tables to Validate (comma or newline separated, empty for the whole schema)', key='bulk_tables')
+            bulk_attributes = st.multiselect('Metadata Attributes to Compare', options=METADATA_COLUMNS[COLUMN_NAME_POSITION + 1:], default=DEFAULT_ATTRIBUTES)
+            if st.button('Run Bulk Schema Validation', key='run_bulk_schema_validation'):
+                tables = [name.strip() for name in table_list.replace(',', '\n').split('\n') if name.strip()]
+                try:
+                    summary_df, schema_mismatches_df = validate_schema_bulk(mssql_conn, snowflake_conn, mssql_schema, snowflake_schema, tables, bulk_attributes)
+                except Exception as e:
+                    st.error(f"Error running bulk schema validation: {str(e)}")
+                else:
+                    matched_tables = (summary_df['status'] == 'match').sum()
+                    st.write(f"Tables checked: {len(summary_df)}, matching: {matched_tables}, differing or missing: {len(summary_df) - matched_tables}")
+                    st.write("Summary by Table:")
+                    show_frame(summary_df, 'Summary by Table')
+                    st.write("Differing Attributes and Missing Columns:")
+                    show_frame(schema_mismatches_df, 'Differing Attributes and Missing Columns')
+        else:
+            st.write("Connect to both MSSQL and Snowflake to run a bulk schema validation.")
+    elif validation_type == 'Table Size Pre-Check':
+        if 'mssql_conn' in st.session_state and st.session_state['mssql_connection_success'] and 'snowflake_conn' in st.session_state and st.session_state['snowflake_connection_success']:
+            mssql_conn = st.session_state['mssql_conn']
+            snowflake_conn = st.session_state['snowflake_conn']
+            # Row counts come from the catalog statistics, one query per side for the whole schema
+            mssql_schema = st.text_input('MSSQL Schema (empty for all schemas)', key='sizes_mssql_schema')
+            snowflake_schema = st.text_input('Snowflake Schema (empty for all schemas)', key='sizes_snowflake_schema')
+            table_list = st.text_area('Tables to Check (comma or newline separated, empty for the whole schema)', key='sizes_tables')
+            if st.button('Compare Row Counts', key='run_table_size_check'):
+                tables = [name.strip() for name in table_list.replace(',', '\n').split('\n') if name.strip()]
+                try:
+                    sizes_df = validate_table_sizes(mssql_conn, snowflake_conn, mssql_schema, snowflake_schema, tables)
+                except Exception as e:
+                    st.error(f"Error reading table statistics: {str(e)}")
+                else:
+                    matched_tables = (sizes_df['status'] == 'match').sum()
+                    st.write(f"Tables checked: {len(sizes_df)}, same row count: {matched_tables}, differing or missing: {len(sizes_df) - matched_tables}")
+                    if matched_tables < len(sizes_df):
+                        st.write("Differing or Missing Tables:")
+                        show_frame(sizes_df[sizes_df['status'] != 'match'], 'Differing or Missing Tables')
+                    st.write("Row Counts by Table:")
+                    show_frame(sizes_df, 'Row Counts by Table')
+        else:
+            st.write("Connect to both MSSQL and Snowflake to run a table size pre-check.")
+    elif validation_type == 'Multi-Table Data Validation':
+        if 'mssql_config' in st.session_state and st.session_state['mssql_connection_success'] and 'snowflake_config' in st.session_state and st.session_state['snowflake_connection_success']:
+            job_list = st.text_area('Tables to Validate, one per line as "MSSQL table, Snowflake table" (a single name is used on both sides)', key='multi_table_jobs')
+            col5, col6 = st.columns(2)
+            with col5:
+                mssql_workers = st.number_input('Concurrent MSSQL queries', min_value=1, value=DEFAULT_MSSQL_WORKERS, step=1)
+            with col6:
+                snowflake_workers = st.number_input('Concurrent Snowflake queries', min_value=1, value=DEFAULT_SNOWFLAKE_WORKERS, step=1)
+            if st.button('Run Multi-Table Validation', key='run_multi_table_validation'):
+                jobs = []
+                for line in job_list.splitlines():
+                    names = [name.strip() for name in line.split(',') if name.strip()]
+                    if names:
+                        jobs.append(make_job(names[0], names[-1]))
+                if not jobs:
+                    st.error("Enter at least one table.")
+                else:
+                    progress = st.progress(0.0)
+                    results_table = st.empty()
+                    job_results = []
+                    for done, (idx, job, results) in enumerate(run_jobs(jobs, st.session_state['mssql_config'], st.session_state['snowflake_config'], mssql_workers, snowflake_workers, max_examples=max_examples), start=1):
+                        if 'error' in results:
+                            job_results.append([job['source_table'], job['target_table'], 'error', None, None, None, None, str(results['error'])])
+                        else:
+                            mismatch_count = int(results['summary']['mismatches'].sum())
+                            if results['source_rows'] != results['target_rows']:
+                                status = 'row count differs'
+                            else:
+                                status = 'match' if mismatch_count == 0 else 'mismatch'
+                            job_results.append([job['source_table'], job['target_table'], status, results['source_rows'], results['target_rows'], results['rows_compared'], mismatch_count, None])
+                        progress.progress(done / len(jobs))
+                        results_table.dataframe(pd.DataFrame(job_results, columns=['source_table', 'target_table', 'status', 'source_rows', 'target_rows', 'rows_compared', 'mismatches', 'error']))
+        else:
+            st.write("Connect to both MSSQL and Snowflake to run a multi-table validation.")
+    elif validation_type == 'Incremental Data Validation':
+        if 'mssql_conn' in st.session_state and st.session_state['mssql_connection_success'] and 'snowflake_conn' in st.session_state and st.session_state['snowflake_connection_success']:
+            mssql_conn = st.session_state['mssql_conn']
+            snowflake_conn = st.session_state['snowflake_conn']
+            mssql_table_name = select_mssql_table(mssql_conn)
+            snow_table_name = select_snowflake_table(snowflake_conn)
+            try:
+                mssql_incremental_columns = get_mssql_columns(mssql_conn, mssql_table_name)
+                snowflake_incremental_columns = get_snowflake_columns(snowflake_conn, snow_table_name)
+            except Exception as e:
+                st.error(f"Error fetching column names: {str(e)}")
+            else:
+                previous = watermark_store.get(pair_key(mssql_table_name, snow_table_name))
+                if previous:
+                    st.write(f"Last validated up to {previous['source_watermark']} = {previous['last']['value']} on {previous['validated_at']} ({previous['rows_validated']} rows).")
+                else:
+                    st.write("This table pair has not been validated yet, the first run checks every row.")
+                mssql_watermark = st.selectbox('MSSQL Watermark Column (increasing id or updated_at)', options=mssql_incremental_columns)
+                snowflake_watermark = st.selectbox('Snowflake Watermark Column', options=snowflake_incremental_columns)
+                st.write("Select Columns for Data Validation (in matching order):")
+                mssql_selected = st.multiselect('Select Columns from MSSQL Table', options=mssql_incremental_columns, key='incremental_mssql_columns')
+                snowflake_selected = st.multiselect('Select Columns from Snowflake Table', options=snowflake_incremental_columns, key='incremental_snowflake_columns')
+                mssql_key_columns = st.multiselect('Select Key Columns from MSSQL Table (empty to match rows in watermark order)', options=mssql_selected, key='incremental_mssql_keys')
+                snowflake_key_columns = st.multiselect('Select Key Columns from Snowflake Table', options=snowflake_selected, key='incremental_snowflake_keys')
+                full_run = st.checkbox('Validate every row again, ignoring the stored watermark', key='incremental_full')
+                col7, col8 = st.columns(2)
+                with col7:
+                    run_incremental = st.button('Validate New Rows', key='run_incremental_validation')
+                with col8:
+                    if st.button('Reset Watermark', key='reset_watermark'):
+                        watermark_store.reset(pair_key(mssql_table_name, snow_table_name))
+                        st.success("The stored watermark was removed, the next run checks every row.")
+                if run_incremental:
+                    if not mssql_selected or len(mssql_selected) != len(snowflake_selected):
+                        st.error("Select the same number of columns (at least one) from MSSQL and Snowflake.")
+                    else:
+                        try:
+                            window = plan_window(watermark_store, mssql_conn, mssql_table_name, snow_table_name, mssql_watermark, snowflake_watermark, full_run)
+                            if window_is_empty(window):
+                                st.success("No new rows since the last validated run.")
+                            else:
+                                st.write(f"Validating rows with {mssql_watermark} above {window['last'] if window['last'] is not None else 'the start'} up to {window['upper']}.")
+                                mssql_batches, snowflake_batches = window_batches(mssql_conn, snowflake_conn, window, mssql_selected, snowflake_selected, ordered=not mssql_key_columns)
+                                if mssql_key_columns:
+                                    with span('compare'):
+                                        key_results = validate_data_by_key(mssql_batches, snowflake_batches, mssql_selected, snowflake_selected, mssql_key_columns, snowflake_key_columns, max_examples)
+                                    rows_validated = key_results['matched_rows']
+                                    window_matched = not (key_results['mismatched_rows'] or key_results['source_only_rows'] or key_results['target_only_rows'])
+                                    show_merged_key_results(key_results)
+                                else:
+                                    stream_results = validate_data_batches(mssql_batches, snowflake_batches, mssql_selected, snowflake_selected, max_examples)
+                                    rows_validated = stream_results['rows_compared']
+                                    # Rows missing on one side must keep the watermark where it is
+                                    window_matched = row_order_matched(stream_results)
+                                    st.write(f"Rows compared: {stream_results['rows_compared']}")
+                                    if stream_results['source_rows'] != stream_results['target_rows']:
+                                        st.warning(f"The window has {stream_results['source_rows']} rows in MSSQL and {stream_results['target_rows']} in Snowflake.")
+                                    show_frame(stream_results['summary'], 'Summary by Column')
+                                    st.write("Mismatched Values:")
+                                    show_frame(stream_results['mismatches'], 'Mismatched Values')
+                                if window_matched:
+                                    advance_window(watermark_store, window, int(rows_validated))
+                                    st.success(f"All rows matched, the next run starts after {window['upper']}.")
+                                else:
+                                    st.error("Differences were found, the watermark was not advanced and these rows are checked again on the next run.")
+                        except ValueError as e:
+                            st.error(str(e))
+                        except Exception as e:
+                            st.error(f"Error running incremental validation: {str(e)}")
+        else:
+            st.write("Connect to both MSSQL and Snowflake to run an incremental validation.")
+    show_result_viewer()
 
 if __name__ == "__main__":
     main()
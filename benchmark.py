@@ -0,0 +1,364 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import queue
+import re
+import resource
+import sqlite3
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from compare import compare_columns, comparisons_to_frame, rows_to_frame, validate_data_batches, validate_data_by_key
+from extract import iter_mssql_batches, iter_snowflake_arrow_batches
+from metadata import validate_schema_by_name
+
+# Benchmarks for the validation paths, runnable offline on a plain Linux box:
+#
+#     python benchmark.py                       run everything and print the results
+#     python benchmark.py --check               fail when slower than benchmark_baseline.json
+#     python benchmark.py --update-baseline     record the current numbers as the baseline
+#
+# Tables and mapping docs are generated with a configurable size, type mix and mismatch rate.
+# The fetch paths read from SQLite through stand-ins with the cursor interface of pyodbc and the
+# Snowflake connector. Each benchmark runs in its own process so its peak RSS is its own.
+# Numbers depend on the machine, record the baseline on the box that runs --check.
+
+BASELINE_FILE = 'benchmark_baseline.json'
+
+DEFAULT_ROWS = 100000
+DEFAULT_COLUMNS = 20
+DEFAULT_TYPE_MIX = 'int,float,decimal,string,date,datetime,bool'
+DEFAULT_MISMATCH_RATE = 0.001
+DEFAULT_REPEAT = 5
+# Allowed slowdown (rows/sec) and growth (peak RSS) before --check fails
+DEFAULT_TOLERANCE = 0.25
+# Seconds a single benchmark may run before its process is stopped
+DEFAULT_TIMEOUT = 1800
+# Seconds between two checks whether a benchmark process is still alive
+POLL_SECONDS = 1.0
+
+DATA_TYPES = ['VARCHAR(50)', 'NUMBER(38,0)', 'NUMBER(10,2)', 'DATE', 'TIMESTAMP_NTZ(9)', 'BOOLEAN', 'FLOAT']
+
+# Function to generate one column of values of the given type
+def generate_values(column_type, rows, rng):
+    if column_type == 'int':
+        return rng.integers(-10**9, 10**9, rows).tolist()
+    if column_type == 'float':
+        return np.round(rng.normal(0, 1000, rows), 4).tolist()
+    if column_type == 'decimal':
+        return [Decimal(value).scaleb(-2) for value in rng.integers(0, 10**8, rows).tolist()]
+    if column_type == 'string':
+        return [f"value_{value}" for value in rng.integers(0, rows, rows).tolist()]
+    if column_type == 'date':
+        start = datetime.date(2000, 1, 1)
+        return [start + datetime.timedelta(days=value) for value in rng.integers(0, 9000, rows).tolist()]
+    if column_type == 'datetime':
+        start = datetime.datetime(2000, 1, 1)
+        return [start + datetime.timedelta(seconds=value) for value in rng.integers(0, 10**9, rows).tolist()]
+    if column_type == 'bool':
+        return rng.integers(0, 2, rows).astype(bool).tolist()
+    raise ValueError(f"Unknown column type: {column_type}")
+
+# Function to change a value so that it no longer matches
+def change_value(value):
+    if isinstance(value, bool):
+        return not value
+    if isinstance(value, str):
+        return value + 'x'
+    if isinstance(value, Decimal):
+        return value + Decimal('0.01')
+    if isinstance(value, datetime.date):
+        return value + datetime.timedelta(days=1)
+    return value + 1
+
+# Function to generate a source table and a target copy with mismatching cells.
+# The first column is a unique integer id. Returns the column names, types and both row lists.
+def generate_table(rows=DEFAULT_ROWS, columns=DEFAULT_COLUMNS, type_mix=DEFAULT_TYPE_MIX, mismatch_rate=DEFAULT_MISMATCH_RATE, seed=0):
+    rng = np.random.default_rng(seed)
+    types = type_mix.split(',')
+    column_types = ['id'] + [types[idx % len(types)] for idx in range(columns - 1)]
+    column_names = ['id'] + [f"col_{idx}_{column_type}" for idx, column_type in enumerate(column_types[1:], start=1)]
+    source_columns = [list(range(rows))] + [generate_values(column_type, rows, rng) for column_type in column_types[1:]]
+    target_columns = [list(values) for values in source_columns]
+    for values in target_columns[1:]:
+        for row in np.flatnonzero(rng.random(rows) < mismatch_rate).tolist():
+            values[row] = change_value(values[row])
+    return column_names, column_types, list(zip(*source_columns)), list(zip(*target_columns))
+
+# Function to generate a mapping doc and the matching DESC TABLE style metadata rows.
+# The metadata comes back in shuffled order and a share of its data types differ.
+def generate_mapping_doc(columns=DEFAULT_COLUMNS, mismatch_rate=DEFAULT_MISMATCH_RATE, seed=0):
+    rng = np.random.default_rng(seed)
+    names = [f"COLUMN_{idx}" for idx in range(columns)]
+    types = [DATA_TYPES[value] for value in rng.integers(0, len(DATA_TYPES), columns).tolist()]
+    nullable = ['Y' if value else 'N' for value in rng.integers(0, 2, columns).tolist()]
+    mapping_df = pd.DataFrame({'column_name': names, 'data_type': types, 'nullable': nullable})
+    metadata = [[name, data_type, 'COLUMN', flag, None] for name, data_type, flag in zip(names, types, nullable)]
+    for row in np.flatnonzero(rng.random(columns) < mismatch_rate).tolist():
+        metadata[row][1] = 'VARIANT'
+    shuffled = [metadata[idx] for idx in rng.permutation(columns).tolist()]
+    return mapping_df, metadata, shuffled
+
+# SQLite stores decimals and dates as text
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+
+# Function to load rows into an SQLite table
+def load_sqlite_table(sqlite_conn, table_name, column_names, rows):
+    quoted = ', '.join(f'"{name}"' for name in column_names)
+    sqlite_conn.execute(f'CREATE TABLE {table_name} ({quoted})')
+    sqlite_conn.executemany(f'INSERT INTO {table_name} VALUES ({", ".join("?" * len(column_names))})', rows)
+    sqlite_conn.commit()
+
+# Cursor over SQLite with the pyodbc interface: execute(query, *params), fetchmany, arraysize.
+# SELECT TOP (n) is rewritten to LIMIT n.
+class SqliteMssqlCursor:
+    def __init__(self, sqlite_conn):
+        self.cursor = sqlite_conn.cursor()
+        self.arraysize = 1
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def execute(self, query, *params):
+        match = re.match(r'(?is)^\s*SELECT\s+TOP\s*\(?\s*(\d+)\s*\)?\s+(.*)$', query)
+        if match:
+            query = f"SELECT {match.group(2)} LIMIT {match.group(1)}"
+        self.cursor.execute(query, params)
+        return self
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self.cursor.fetchmany(size or self.arraysize)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+# Cursor over SQLite with the Snowflake connector interface: %s parameters and Arrow batches
+class SqliteSnowflakeCursor(SqliteMssqlCursor):
+    arrow_batch_size = 10000
+
+    def execute(self, query, params=None):
+        self.cursor.execute(query.replace('%s', '?'), params or ())
+        return self
+
+    def fetch_arrow_batches(self):
+        column_names = [desc[0] for desc in self.cursor.description]
+        while True:
+            rows = self.cursor.fetchmany(self.arrow_batch_size)
+            if not rows:
+                break
+            yield pa.table({name: list(values) for name, values in zip(column_names, zip(*rows))})
+
+# Connection stand-ins, cursor() is the only part the fetch functions use
+class SqliteConnection:
+    cursor_class = SqliteMssqlCursor
+
+    def __init__(self, sqlite_conn):
+        self.sqlite_conn = sqlite_conn
+
+    def cursor(self):
+        return self.cursor_class(self.sqlite_conn)
+
+    def close(self):
+        self.sqlite_conn.close()
+
+class SqliteSnowflakeConnection(SqliteConnection):
+    cursor_class = SqliteSnowflakeCursor
+
+# Each benchmark sets up its inputs and returns (rows processed per run, function to time)
+
+def bench_validate_data(params):
+    column_names, _, source_rows, target_rows = generate_table(params['rows'], params['columns'], params['type_mix'], params['mismatch_rate'])
+    return len(source_rows), lambda: validate_data_batches([source_rows], [target_rows], column_names, column_names)
+
+def bench_validate_data_by_key(params):
+    column_names, _, source_rows, target_rows = generate_table(params['rows'], params['columns'], params['type_mix'], params['mismatch_rate'])
+    return len(source_rows), lambda: validate_data_by_key([source_rows], [target_rows], column_names, column_names, ['id'], ['id'])
+
+def bench_map_validate_schema(params):
+    mapping_df, metadata, _ = generate_mapping_doc(params['schema_columns'], params['mismatch_rate'])
+    def run():
+        metadata_df = rows_to_frame(metadata, None)
+        comparisons, row_count = compare_columns(mapping_df, metadata_df, [0, 1, 2], [0, 1, 3], pad_missing=True)
+        return comparisons_to_frame(mapping_df, metadata_df, comparisons, row_count, list(mapping_df.columns), ['name', 'type', 'null?'])
+    return len(mapping_df), run
+
+def bench_meta_validate_schema(params):
+    _, metadata, _ = generate_mapping_doc(params['schema_columns'], params['mismatch_rate'], seed=1)
+    _, other_metadata, _ = generate_mapping_doc(params['schema_columns'], params['mismatch_rate'], seed=1)
+    def run():
+        source_df = rows_to_frame(metadata, None)
+        target_df = rows_to_frame(other_metadata, None)
+        comparisons, row_count = compare_columns(source_df, target_df, [0, 1, 3], [0, 1, 3], pad_missing=True)
+        return comparisons_to_frame(source_df, target_df, comparisons, row_count, ['name', 'type', 'null?'], ['name', 'type', 'null?'])
+    return len(metadata), run
+
+def bench_schema_by_name(params):
+    mapping_df, _, shuffled = generate_mapping_doc(params['schema_columns'], params['mismatch_rate'])
+    def run():
+        metadata_df = rows_to_frame(shuffled, None)
+        return validate_schema_by_name(mapping_df, metadata_df, 0, 0, [1, 2], [1, 3], ['data_type', 'nullable'], ['type', 'null?'])
+    return len(mapping_df), run
+
+def sqlite_table(params):
+    column_names, _, source_rows, _ = generate_table(params['rows'], params['columns'], params['type_mix'], 0)
+    sqlite_conn = sqlite3.connect(':memory:', check_same_thread=False)
+    load_sqlite_table(sqlite_conn, 'bench_table', column_names, source_rows)
+    return sqlite_conn, column_names, len(source_rows)
+
+def bench_fetch_mssql(params):
+    sqlite_conn, column_names, rows = sqlite_table(params)
+    mssql_conn = SqliteConnection(sqlite_conn)
+    return rows, lambda: sum(len(batch) for batch in iter_mssql_batches(mssql_conn, 'bench_table', params['batch_size'], column_names))
+
+def bench_fetch_snowflake_arrow(params):
+    sqlite_conn, column_names, rows = sqlite_table(params)
+    snowflake_conn = SqliteSnowflakeConnection(sqlite_conn)
+    return rows, lambda: sum(batch.num_rows for batch in iter_snowflake_arrow_batches(snowflake_conn, 'bench_table', None, column_names))
+
+BENCHMARKS = {
+    'validate_data': bench_validate_data,
+    'validate_data_by_key': bench_validate_data_by_key,
+    'map_validate_schema': bench_map_validate_schema,
+    'meta_validate_schema': bench_meta_validate_schema,
+    'schema_by_name': bench_schema_by_name,
+    'fetch_mssql': bench_fetch_mssql,
+    'fetch_snowflake_arrow': bench_fetch_snowflake_arrow
+}
+
+# Function to run one benchmark, called in a fresh process
+def run_benchmark(name, params, results_queue):
+    try:
+        rows, run = BENCHMARKS[name](params)
+        latencies = []
+        for _ in range(params['repeat']):
+            started = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - started)
+        latencies = np.array(latencies)
+        median = float(np.percentile(latencies, 50))
+        results_queue.put({
+            'benchmark': name,
+            'rows': rows,
+            'rows_per_sec': round(rows / median, 1) if median else None,
+            'p50_ms': round(median * 1000, 2),
+            'p90_ms': round(float(np.percentile(latencies, 90)) * 1000, 2),
+            'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 2),
+            # ru_maxrss is in KiB on Linux
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        })
+    except Exception as e:
+        results_queue.put({'benchmark': name, 'error': f"{type(e).__name__}: {e}"})
+
+# Function to wait for the result of a benchmark process. A process that exits without a
+# result (killed for memory, crashed in native code) or runs past the timeout is reported as
+# an error instead of blocking the run.
+def wait_for_result(name, process, results_queue, timeout=DEFAULT_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return results_queue.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            # The result may have been sent just before the process exited
+            try:
+                return results_queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                return {'benchmark': name, 'error': f"process exited with code {process.exitcode} without a result"}
+        if time.monotonic() > deadline:
+            process.terminate()
+            return {'benchmark': name, 'error': f"timed out after {timeout} seconds"}
+
+# Function to run the benchmarks one after another, each in its own process
+def run_benchmarks(names, params, timeout=DEFAULT_TIMEOUT):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in names:
+        results_queue = context.Queue()
+        process = context.Process(target=run_benchmark, args=(name, params, results_queue))
+        process.start()
+        result = wait_for_result(name, process, results_queue, timeout)
+        process.join()
+        results.append(result)
+    return results
+
+# Function to compare results with the baseline, returns the list of regressions
+def check_baseline(results, baseline, tolerance):
+    regressions = []
+    for result in results:
+        expected = baseline.get('benchmarks', {}).get(result['benchmark'])
+        if expected is None or 'error' in result:
+            continue
+        if result['rows_per_sec'] < expected['rows_per_sec'] * (1 - tolerance):
+            regressions.append(f"{result['benchmark']}: {result['rows_per_sec']} rows/sec, baseline {expected['rows_per_sec']}")
+        if result['peak_rss_mb'] > expected['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{result['benchmark']}: peak RSS {result['peak_rss_mb']} MB, baseline {expected['peak_rss_mb']}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the validation paths on synthetic data.')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--columns', type=int, default=DEFAULT_COLUMNS)
+    parser.add_argument('--schema-columns', type=int, default=5000, help='columns in the generated mapping doc')
+    parser.add_argument('--type-mix', default=DEFAULT_TYPE_MIX, help='comma separated column types')
+    parser.add_argument('--mismatch-rate', type=float, default=DEFAULT_MISMATCH_RATE)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help='run only this benchmark (repeatable)')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--check', action='store_true', help='exit with 1 when a benchmark regressed against the baseline')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds a single benchmark may run')
+    args = parser.parse_args(argv)
+    params = {
+        'rows': args.rows,
+        'columns': args.columns,
+        'schema_columns': args.schema_columns,
+        'type_mix': args.type_mix,
+        'mismatch_rate': args.mismatch_rate,
+        'batch_size': args.batch_size,
+        'repeat': args.repeat
+    }
+    results = run_benchmarks(args.only or list(BENCHMARKS), params, args.timeout)
+    print(pd.DataFrame(results).to_string(index=False))
+    report = {'params': params, 'benchmarks': {result['benchmark']: result for result in results}}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if any('error' in result for result in results):
+        return 1
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print("Warning: the baseline was recorded with different parameters.")
+        regressions = check_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import pandas as pd
+
+from checksum import (
+    get_mssql_column_types, get_snowflake_column_types, resolve_column_pairs, canonical_spec,
+    mssql_canonical, snowflake_canonical, mssql_hash32, snowflake_hash32, concat_expressions
+)
+
+# Hierarchical bucketed diff between an MSSQL and a Snowflake table.
+# Rows are placed in buckets by the 32 bit hash of their canonical key, the same on both sides.
+# At depth d a row sits in bucket hash % fanout**d, so every bucket splits into fanout child
+# buckets at the next depth. Both sides return one (count, hash sum) row per bucket, only the
+# buckets that differ are split further, and rows are fetched only for small differing buckets.
+# Transfer therefore grows with the number of differences and not with the table size.
+# Nothing in here touches Streamlit.
+
+DEFAULT_FANOUT = 16
+DEFAULT_LEAF_ROWS = 1000
+
+# Function to describe how one side renders its key and its compared columns
+def build_side(conn, table_name, key_expressions, value_expressions, hash32):
+    return {
+        'conn': conn,
+        'table': table_name,
+        'key_expressions': key_expressions,
+        'value_expressions': value_expressions,
+        'key_hash': hash32(concat_expressions(key_expressions)),
+        'row_hash': hash32(concat_expressions(key_expressions + value_expressions))
+    }
+
+# Function to build the canonical key and value expressions of both sides
+def build_sides(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name,
+                mssql_key_columns, snowflake_key_columns, mssql_columns, snowflake_columns):
+    mssql_types = get_mssql_column_types(mssql_conn, mssql_table_name)
+    snowflake_types = get_snowflake_column_types(snowflake_conn, snow_table_name)
+    if not mssql_key_columns or len(mssql_key_columns) != len(snowflake_key_columns):
+        raise ValueError("Select the same number of key columns (at least one) on both sides.")
+    mssql_columns, snowflake_columns = resolve_column_pairs(mssql_types, snowflake_types, mssql_columns, snowflake_columns)
+    value_pairs = [
+        (src_col, tgt_col) for src_col, tgt_col in zip(mssql_columns, snowflake_columns)
+        if src_col not in mssql_key_columns
+    ]
+    expressions = {'mssql_key': [], 'snowflake_key': [], 'mssql_value': [], 'snowflake_value': []}
+    for kind, pairs in (('key', zip(mssql_key_columns, snowflake_key_columns)), ('value', value_pairs)):
+        for src_col, tgt_col in pairs:
+            spec = canonical_spec(mssql_types[src_col], snowflake_types[tgt_col])
+            expressions['mssql_' + kind].append(mssql_canonical(src_col, spec))
+            expressions['snowflake_' + kind].append(snowflake_canonical(tgt_col, snowflake_types[tgt_col], spec))
+    mssql_side = build_side(mssql_conn, mssql_table_name, expressions['mssql_key'], expressions['mssql_value'], mssql_hash32)
+    snowflake_side = build_side(snowflake_conn, snow_table_name, expressions['snowflake_key'], expressions['snowflake_value'], snowflake_hash32)
+    return mssql_side, snowflake_side, [pair[0] for pair in value_pairs], [pair[1] for pair in value_pairs]
+
+# Function to build the WHERE clause that keeps the rows of the given buckets
+def bucket_filter(side, modulus, bucket_ids):
+    if bucket_ids is None:
+        return ''
+    id_list = ', '.join(str(int(bucket)) for bucket in sorted(bucket_ids))
+    return f" WHERE {side['key_hash']} % {modulus} IN ({id_list})"
+
+# Function to fetch {bucket: (row count, hash sum)} for the child buckets of the given parents
+def fetch_bucket_hashes(side, modulus, parent_modulus, parent_ids):
+    bucket = f"{side['key_hash']} % {modulus}"
+    query = (
+        f"SELECT {bucket} AS BUCKET, COUNT(*) AS ROW_COUNT, SUM({side['row_hash']}) AS BUCKET_HASH "
+        f"FROM {side['table']}{bucket_filter(side, parent_modulus, parent_ids)} GROUP BY {bucket}"
+    )
+    cursor = side['conn'].cursor()
+    try:
+        cursor.execute(query)
+        return {int(row[0]): (int(row[1]), int(row[2] or 0)) for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+# Function to fetch the canonical key and values of the rows in the given buckets as {key: values}
+def fetch_bucket_rows(side, modulus, bucket_ids):
+    return fetch_canonical_rows(side, bucket_filter(side, modulus, bucket_ids))
+
+# Function to fetch the canonical key and values of the rows matching a WHERE clause as {key: values}
+def fetch_canonical_rows(side, where_clause):
+    key_count = len(side['key_expressions'])
+    select_list = ', '.join(side['key_expressions'] + side['value_expressions'])
+    query = f"SELECT {select_list} FROM {side['table']}{where_clause}"
+    cursor = side['conn'].cursor()
+    try:
+        cursor.execute(query)
+        return {tuple(row[:key_count]): tuple(row[key_count:]) for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+# Function to walk down the bucket tree and return the differing leaf buckets as {modulus: [bucket ids]}
+def find_differing_buckets(mssql_side, snowflake_side, fanout, leaf_rows, stats):
+    leaves = {}
+    parent_modulus, parent_ids = 1, None
+    while parent_ids is None or parent_ids:
+        modulus = parent_modulus * fanout
+        source_buckets = fetch_bucket_hashes(mssql_side, modulus, parent_modulus, parent_ids)
+        target_buckets = fetch_bucket_hashes(snowflake_side, modulus, parent_modulus, parent_ids)
+        stats['queries'] += 2
+        stats['buckets_compared'] += len(set(source_buckets) | set(target_buckets))
+        next_ids = []
+        for bucket in set(source_buckets) | set(target_buckets):
+            source_bucket = source_buckets.get(bucket, (0, 0))
+            target_bucket = target_buckets.get(bucket, (0, 0))
+            if source_bucket == target_bucket:
+                continue
+            # A 32 bit hash cannot be split any further once the modulus passes 2**32
+            if max(source_bucket[0], target_bucket[0]) <= leaf_rows or modulus >= 2 ** 32:
+                leaves.setdefault(modulus, []).append(bucket)
+            else:
+                next_ids.append(bucket)
+        stats['depth'] += 1
+        parent_modulus, parent_ids = modulus, next_ids
+    return leaves
+
+# Function to diff two tables by key, drilling down only into the buckets whose hashes differ.
+# Returns the differing rows (one row per differing key) and transfer statistics.
+def bucket_diff(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name,
+                mssql_key_columns, snowflake_key_columns, mssql_columns=None, snowflake_columns=None,
+                fanout=DEFAULT_FANOUT, leaf_rows=DEFAULT_LEAF_ROWS):
+    if fanout < 2:
+        raise ValueError("The bucket fanout must be at least 2.")
+    mssql_side, snowflake_side, value_columns, _ = build_sides(
+        mssql_conn, snowflake_conn, mssql_table_name, snow_table_name,
+        mssql_key_columns, snowflake_key_columns, mssql_columns, snowflake_columns)
+    stats = {'queries': 0, 'buckets_compared': 0, 'depth': 0, 'leaf_buckets': 0, 'rows_fetched': 0}
+    leaves = find_differing_buckets(mssql_side, snowflake_side, fanout, leaf_rows, stats)
+    differences = []
+    for modulus, bucket_ids in leaves.items():
+        source_rows = fetch_bucket_rows(mssql_side, modulus, bucket_ids)
+        target_rows = fetch_bucket_rows(snowflake_side, modulus, bucket_ids)
+        stats['queries'] += 2
+        stats['leaf_buckets'] += len(bucket_ids)
+        stats['rows_fetched'] += len(source_rows) + len(target_rows)
+        differences.extend(diff_rows(source_rows, target_rows, value_columns))
+    return differences_frame(differences), stats
+
+# Function to compare two {key: canonical values} maps, one entry per differing key
+def diff_rows(source_rows, target_rows, value_columns):
+    differences = []
+    for key in source_rows.keys() | target_rows.keys():
+        source_values = source_rows.get(key)
+        target_values = target_rows.get(key)
+        if source_values == target_values:
+            continue
+        if target_values is None:
+            status, columns = 'source_only', []
+        elif source_values is None:
+            status, columns = 'target_only', []
+        else:
+            status = 'mismatched'
+            columns = [col for col, src, tgt in zip(value_columns, source_values, target_values) if src != tgt]
+        differences.append({
+            'key': ', '.join(key),
+            'status': status,
+            'columns': ', '.join(columns),
+            'source_values': source_values,
+            'target_values': target_values
+        })
+    return differences
+
+# Function to build the differences frame, sorted by key
+def differences_frame(differences):
+    differences_df = pd.DataFrame(differences, columns=['key', 'status', 'columns', 'source_values', 'target_values'])
+    return differences_df.sort_values('key', ignore_index=True)
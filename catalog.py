@@ -0,0 +1,116 @@
+import threading
+import time
+
+from connections import pool
+from extract import snowflake_quote
+
+# Cached table catalogs for the table pickers in app_v7.py.
+# Table lists are keyed by connection, schema and name prefix and kept for a configurable
+# number of seconds. The prefix and a row limit are applied by the database, so a huge schema
+# is never listed in full. The cache lives at module level and is shared by all sessions.
+# Nothing in here touches Streamlit.
+
+DEFAULT_TTL = 300
+# Upper bound on the number of table names held by the cache across all entries
+DEFAULT_MAX_NAMES = 200000
+# Upper bound on the number of names a single listing returns
+DEFAULT_LIST_LIMIT = 5000
+
+# Function to escape a prefix for an MSSQL LIKE pattern (backslash is the escape character)
+def like_prefix(prefix):
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+# Function to list MSSQL base tables, filtered on the server by schema and name prefix
+def list_mssql_tables(mssql_conn, schema=None, prefix='', limit=DEFAULT_LIST_LIMIT):
+    query = f"SELECT TOP ({int(limit)}) TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'"
+    params = []
+    if schema:
+        query += " AND TABLE_SCHEMA = ?"
+        params.append(schema)
+    if prefix:
+        query += " AND TABLE_NAME LIKE ? ESCAPE '\\'"
+        params.append(like_prefix(prefix))
+    query += " ORDER BY TABLE_NAME"
+    cursor = mssql_conn.cursor()
+    try:
+        cursor.execute(query, *params)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+# Function to quote a schema name, optionally qualified with its database, for SHOW TABLES.
+# Unquoted parts are upper cased like Snowflake resolves them, quoted parts keep their case.
+def quote_snowflake_schema(schema):
+    parts = []
+    for part in schema.split('.'):
+        part = part.strip()
+        if len(part) > 1 and part.startswith('"') and part.endswith('"'):
+            part = part[1:-1].replace('""', '"')
+        else:
+            part = part.upper()
+        parts.append(snowflake_quote(part))
+    return '.'.join(parts)
+
+# Function to list Snowflake tables, filtered on the server by schema and name prefix
+def list_snowflake_tables(snowflake_conn, schema=None, prefix='', limit=DEFAULT_LIST_LIMIT):
+    query = "SHOW TABLES"
+    if prefix:
+        # SHOW TABLES has no ESCAPE clause, so _ and % in the prefix act as wildcards on the
+        # server and the exact prefix is checked below
+        query += " LIKE '" + prefix.replace("'", "''") + "%'"
+    if schema:
+        query += f" IN SCHEMA {quote_snowflake_schema(schema)}"
+    query += f" LIMIT {int(limit)}"
+    cursor = snowflake_conn.cursor()
+    try:
+        cursor.execute(query)
+        names = [row[1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    return [name for name in names if name.upper().startswith(prefix.upper())]
+
+LISTERS = {
+    'mssql': list_mssql_tables,
+    'snowflake': list_snowflake_tables
+}
+
+class CatalogCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_names=DEFAULT_MAX_NAMES):
+        self.ttl = ttl
+        self.max_names = max_names
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    # Return the cached table names, listing them again when missing, expired or refreshed
+    def get(self, kind, conn, schema=None, prefix='', limit=DEFAULT_LIST_LIMIT, refresh=False):
+        key = (kind, pool.key_of(conn), schema or '', prefix, limit)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None and not refresh and now - entry['loaded'] <= self.ttl:
+                # Re-inserting keeps the dict in least recently used order
+                self.entries[key] = entry
+                return entry['names']
+        names = LISTERS[kind](conn, schema, prefix, limit)
+        with self.lock:
+            self.entries[key] = {'names': names, 'loaded': now}
+            while sum(len(entry['names']) for entry in self.entries.values()) > self.max_names and len(self.entries) > 1:
+                self.entries.pop(next(iter(self.entries)))
+        return names
+
+    # Drop every cached listing of a connection, or everything when no connection is given
+    def invalidate(self, conn=None):
+        with self.lock:
+            if conn is None:
+                self.entries.clear()
+                return
+            conn_key = pool.key_of(conn)
+            for key in [key for key in self.entries if key[1] == conn_key]:
+                del self.entries[key]
+
+catalog_cache = CatalogCache()
+
+# Function to get the table names of a connection through the shared catalog cache
+def get_table_names(kind, conn, schema=None, prefix='', limit=DEFAULT_LIST_LIMIT, refresh=False):
+    return catalog_cache.get(kind, conn, schema, prefix, limit, refresh)
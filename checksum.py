@@ -0,0 +1,221 @@
+import pandas as pd
+
+from extract import mssql_quote, snowflake_quote, split_mssql_name
+
+# Checksum validation pushed down to MSSQL and Snowflake.
+# Each side turns every selected column into the same canonical text, hashes it with MD5 and
+# sums the first 32 bits of the hash over all rows. MD5 is used because it is the one hash both
+# engines compute identically (CHECKSUM_AGG and HASH_AGG use different algorithms). Only one row
+# of aggregates per table crosses the network. Nothing in here touches Streamlit.
+
+# Written in place of NULL so that NULLs still change the fingerprint
+NULL_TOKEN = '<NULL>'
+
+# Separator used when hashing a whole row
+ROW_SEPARATOR = '|'
+
+# Scale used when float columns are compared as decimals
+FLOAT_SCALE = 6
+
+MSSQL_CATEGORIES = {
+    'tinyint': 'integer', 'smallint': 'integer', 'int': 'integer', 'bigint': 'integer',
+    'decimal': 'decimal', 'numeric': 'decimal', 'money': 'decimal', 'smallmoney': 'decimal',
+    'float': 'float', 'real': 'float',
+    'bit': 'boolean',
+    'date': 'date',
+    'datetime': 'timestamp', 'datetime2': 'timestamp', 'smalldatetime': 'timestamp', 'datetimeoffset': 'timestamp'
+}
+
+SNOWFLAKE_CATEGORIES = {
+    'NUMBER': 'decimal', 'DECIMAL': 'decimal', 'NUMERIC': 'decimal',
+    'INT': 'integer', 'INTEGER': 'integer', 'BIGINT': 'integer', 'SMALLINT': 'integer', 'TINYINT': 'integer',
+    'FLOAT': 'float', 'FLOAT4': 'float', 'FLOAT8': 'float', 'DOUBLE': 'float', 'REAL': 'float',
+    'BOOLEAN': 'boolean',
+    'DATE': 'date',
+    'DATETIME': 'timestamp', 'TIMESTAMP': 'timestamp', 'TIMESTAMP_NTZ': 'timestamp',
+    'TIMESTAMP_LTZ': 'timestamp', 'TIMESTAMP_TZ': 'timestamp'
+}
+
+NUMERIC_CATEGORIES = ('integer', 'decimal', 'float')
+
+# Function to build the query for the column types of an MSSQL table and its parameters.
+# An unqualified name is looked up in the default schema, the way the SELECT resolves it.
+def mssql_column_types_query(mssql_table_name):
+    database, schema, table = split_mssql_name(mssql_table_name)
+    information_schema = f"{mssql_quote(database)}.INFORMATION_SCHEMA" if database else "INFORMATION_SCHEMA"
+    query = (f"SELECT COLUMN_NAME, DATA_TYPE, NUMERIC_SCALE FROM {information_schema}.COLUMNS "
+             "WHERE TABLE_SCHEMA = COALESCE(?, SCHEMA_NAME()) AND TABLE_NAME = ? ORDER BY ORDINAL_POSITION")
+    return query, [schema, table]
+
+# Function to fetch the column types of an MSSQL table as {column: (category, scale)}
+def get_mssql_column_types(mssql_conn, mssql_table_name):
+    query, params = mssql_column_types_query(mssql_table_name)
+    cursor = mssql_conn.cursor()
+    try:
+        cursor.execute(query, *params)
+        return {
+            name: (MSSQL_CATEGORIES.get(str(data_type).lower(), 'string'), int(scale or 0))
+            for name, data_type, scale in cursor.fetchall()
+        }
+    finally:
+        cursor.close()
+
+# Function to parse a Snowflake DESC TABLE type such as NUMBER(10,2) into (category, scale)
+def parse_snowflake_type(data_type):
+    base = data_type.split('(')[0].strip().upper()
+    category = SNOWFLAKE_CATEGORIES.get(base, 'string')
+    scale = 0
+    if '(' in data_type and ',' in data_type:
+        scale = int(data_type.split(',')[1].rstrip(') '))
+    if category == 'decimal' and scale == 0:
+        category = 'integer'
+    return category, scale
+
+# Function to fetch the column types of a Snowflake table as {column: (category, scale)}
+def get_snowflake_column_types(snowflake_conn, snow_table_name):
+    cursor = snowflake_conn.cursor()
+    try:
+        cursor.execute(f"DESC TABLE {snow_table_name}")
+        return {row[0]: parse_snowflake_type(row[1]) for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+# Function to decide how a column pair is rendered as text on both sides.
+# Numbers are compared as decimals with the larger of the two scales.
+def canonical_spec(mssql_type, snowflake_type):
+    (src_category, src_scale), (tgt_category, tgt_scale) = mssql_type, snowflake_type
+    if src_category in NUMERIC_CATEGORIES and tgt_category in NUMERIC_CATEGORIES:
+        if 'float' in (src_category, tgt_category):
+            return 'decimal', FLOAT_SCALE
+        return 'decimal', max(src_scale, tgt_scale)
+    if 'boolean' in (src_category, tgt_category) and {src_category, tgt_category} <= {'boolean', 'integer'}:
+        return 'boolean', 0
+    if src_category == tgt_category:
+        return src_category, 0
+    return 'string', 0
+
+# Function to render an MSSQL expression as canonical text, NULL stays NULL
+def mssql_text(expr, spec):
+    category, scale = spec
+    if category == 'decimal':
+        return f"CONVERT(VARCHAR(60), CAST({expr} AS DECIMAL(38, {scale})))"
+    if category == 'boolean':
+        return f"CONVERT(VARCHAR(1), CAST({expr} AS INT))"
+    if category == 'date':
+        return f"CONVERT(VARCHAR(10), {expr}, 23)"
+    if category == 'timestamp':
+        return f"CONVERT(VARCHAR(26), CAST({expr} AS DATETIME2(6)), 121)"
+    # The UTF-8 collation (SQL Server 2019+) makes HASHBYTES see the same bytes as Snowflake
+    return f"RTRIM(CAST(CAST({expr} AS NVARCHAR(MAX)) COLLATE Latin1_General_100_BIN2_UTF8 AS VARCHAR(MAX)))"
+
+# Function to build the canonical MSSQL text expression of a column. COALESCE takes the type of
+# its widest argument, ISNULL would cut the placeholder down to the VARCHAR(1) of a boolean.
+def mssql_canonical(column, spec):
+    return f"COALESCE({mssql_text(mssql_quote(column), spec)}, '{NULL_TOKEN}')"
+
+# Function to render a Snowflake expression as canonical text, NULL stays NULL
+def snowflake_text(expr, column_type, spec):
+    category, scale = spec
+    if category == 'decimal':
+        return f"TO_VARCHAR(CAST({expr} AS NUMBER(38, {scale})))"
+    if category == 'boolean' and column_type[0] == 'boolean':
+        # IFF would turn NULL into '0', CASE keeps it NULL like the MSSQL side
+        return f"CASE WHEN {expr} THEN '1' WHEN NOT {expr} THEN '0' END"
+    if category == 'boolean':
+        return f"TO_VARCHAR(CAST({expr} AS INT))"
+    if category == 'date':
+        return f"TO_VARCHAR({expr}, 'YYYY-MM-DD')"
+    if category == 'timestamp':
+        return f"TO_VARCHAR({expr}, 'YYYY-MM-DD HH24:MI:SS.FF6')"
+    return f"RTRIM(TO_VARCHAR({expr}))"
+
+# Function to build the canonical Snowflake text expression of a column
+def snowflake_canonical(column, column_type, spec):
+    return f"COALESCE({snowflake_text(snowflake_quote(column), column_type, spec)}, '{NULL_TOKEN}')"
+
+# Hash of a canonical expression reduced to an unsigned 32 bit number, the same on both sides
+def mssql_hash32(expr):
+    return f"CAST(CONVERT(BINARY(4), HASHBYTES('MD5', {expr})) AS BIGINT)"
+
+def snowflake_hash32(expr):
+    return f"TO_NUMBER(LEFT(MD5({expr}), 8), 'XXXXXXXX')"
+
+# Function to build the single aggregate query of one side.
+# Returns the row count, then per column its non null count and hash sum, then the row hash sum.
+def checksum_query(table_name, columns, expressions, quote, hash32):
+    select_list = ["COUNT(*) AS ROW_COUNT"]
+    for idx, (column, expr) in enumerate(zip(columns, expressions)):
+        select_list.append(f"COUNT({quote(column)}) AS NON_NULL_{idx}")
+        select_list.append(f"SUM({hash32(expr)}) AS CHECKSUM_{idx}")
+    select_list.append(f"SUM({hash32(concat_expressions(expressions))}) AS ROW_CHECKSUM")
+    return f"SELECT {', '.join(select_list)} FROM {table_name}"
+
+# Function to join the canonical expressions of a row, CONCAT_WS is the same on both sides
+def concat_expressions(expressions):
+    if len(expressions) == 1:
+        return expressions[0]
+    return f"CONCAT_WS('{ROW_SEPARATOR}', {', '.join(expressions)})"
+
+# Function to build the MSSQL and Snowflake checksum queries for a list of column pairs
+def build_checksum_queries(mssql_table_name, snow_table_name, mssql_columns, snowflake_columns, mssql_types, snowflake_types):
+    mssql_expressions = []
+    snowflake_expressions = []
+    for src_col, tgt_col in zip(mssql_columns, snowflake_columns):
+        spec = canonical_spec(mssql_types[src_col], snowflake_types[tgt_col])
+        mssql_expressions.append(mssql_canonical(src_col, spec))
+        snowflake_expressions.append(snowflake_canonical(tgt_col, snowflake_types[tgt_col], spec))
+    mssql_query = checksum_query(mssql_table_name, mssql_columns, mssql_expressions, mssql_quote, mssql_hash32)
+    snowflake_query = checksum_query(snow_table_name, snowflake_columns, snowflake_expressions, snowflake_quote, snowflake_hash32)
+    return mssql_query, snowflake_query
+
+# Function to run one aggregate query and return its single row
+def fetch_one(conn, query):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        return list(cursor.fetchone())
+    finally:
+        cursor.close()
+
+# Function to compare the fingerprints of both sides, one result row per column pair plus
+# a whole row entry that also carries the row counts
+def compare_checksums(mssql_row, snowflake_row, mssql_columns, snowflake_columns):
+    def as_int(value):
+        return int(value) if value is not None else 0
+    labels = list(zip(mssql_columns, snowflake_columns)) + [('(whole row)', '(whole row)')]
+    count_positions = [1 + 2 * idx for idx in range(len(mssql_columns))] + [0]
+    checksum_positions = [2 + 2 * idx for idx in range(len(mssql_columns))] + [len(mssql_row) - 1]
+    results_df = pd.DataFrame({
+        'source_column': [src_col for src_col, _ in labels],
+        'target_column': [tgt_col for _, tgt_col in labels],
+        'source_count': [as_int(mssql_row[pos]) for pos in count_positions],
+        'target_count': [as_int(snowflake_row[pos]) for pos in count_positions],
+        'source_checksum': [as_int(mssql_row[pos]) for pos in checksum_positions],
+        'target_checksum': [as_int(snowflake_row[pos]) for pos in checksum_positions]
+    })
+    results_df['match'] = (
+        (results_df['source_count'] == results_df['target_count'])
+        & (results_df['source_checksum'] == results_df['target_checksum'])
+    )
+    return results_df
+
+# Function to check the selected column pairs. Without a selection the pairs default to the
+# columns the two tables share by (case insensitive) name.
+def resolve_column_pairs(mssql_types, snowflake_types, mssql_columns=None, snowflake_columns=None):
+    if not mssql_columns:
+        snowflake_by_name = {name.upper(): name for name in snowflake_types}
+        mssql_columns = [name for name in mssql_types if name.upper() in snowflake_by_name]
+        snowflake_columns = [snowflake_by_name[name.upper()] for name in mssql_columns]
+    if not mssql_columns or len(mssql_columns) != len(snowflake_columns):
+        raise ValueError("Select the same number of columns (at least one) on both sides.")
+    return list(mssql_columns), list(snowflake_columns)
+
+# Function to validate two tables by checksum
+def validate_checksums(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name, mssql_columns=None, snowflake_columns=None):
+    mssql_types = get_mssql_column_types(mssql_conn, mssql_table_name)
+    snowflake_types = get_snowflake_column_types(snowflake_conn, snow_table_name)
+    mssql_columns, snowflake_columns = resolve_column_pairs(mssql_types, snowflake_types, mssql_columns, snowflake_columns)
+    mssql_query, snowflake_query = build_checksum_queries(mssql_table_name, snow_table_name, mssql_columns, snowflake_columns, mssql_types, snowflake_types)
+    mssql_row = fetch_one(mssql_conn, mssql_query)
+    snowflake_row = fetch_one(snowflake_conn, snowflake_query)
+    return compare_checksums(mssql_row, snowflake_row, mssql_columns, snowflake_columns)
@@ -0,0 +1,413 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from normalize import normalize_column, normalize_key_column
+from timing import span
+
+# Comparison helpers used by the validation steps in app_v7.py.
+# Nothing in here touches Streamlit, so the same code can run outside the app.
+
+# Reported as the actual value when the target has fewer rows than the source
+MISSING_VALUE = "Index out of range"
+
+# Default number of mismatching cells kept as examples, the counters always cover every cell
+DEFAULT_MAX_EXAMPLES = 10000
+
+# Columns of the per cell result frames
+RESULT_COLUMNS = ['row_index', 'source_column', 'target_column', 'source_value', 'target_value', 'match']
+
+# Column added to the frames of a key comparison with the normalized key of the row
+KEY_COLUMN = '__key'
+# Separator between the parts of a compound key, the parts are split again for display
+KEY_SEPARATOR = '\x1f'
+
+# Column kinds (as reported by pandas infer_dtype) where two equal values of the same kind
+# always normalize the same, so equal cells can be accepted without converting them to text
+RAW_EQUALITY_KINDS = {'string', 'integer', 'boolean', 'floating', 'decimal', 'date', 'datetime', 'bytes'}
+
+# Decimal.compare_total is zero only for equal values with the same exponent (1.5 vs 1.50)
+same_decimal_repr = np.frompyfunc(lambda a, b: a is None or a.compare_total(b) == 0, 2, 1)
+
+# Function to work out the kind of values held in a column
+def column_kind(values):
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == 'datetime':
+        first_value = next((value for value in values if value is not None), None)
+        # Aware timestamps can be equal but print different offsets
+        if getattr(first_value, 'tzinfo', None) is not None:
+            return 'datetime-tz'
+    return kind
+
+# Function to build the mismatch mask for one pair of aligned columns.
+# Columns of the same plain kind are compared as values first and only the differing cells
+# are normalized. Everything else is normalized and compared as whole Arrow arrays.
+def column_mismatch_mask(src_values, tgt_values):
+    src_kind = column_kind(src_values)
+    tgt_kind = column_kind(tgt_values)
+    if src_kind == tgt_kind and src_kind in RAW_EQUALITY_KINDS:
+        mismatch = ~np.asarray(src_values == tgt_values, dtype=bool)
+        recheck = mismatch.copy()
+        if src_kind == 'floating':
+            # 0.0 and -0.0 compare equal but print differently
+            recheck |= np.asarray(src_values == 0, dtype=bool)
+        elif src_kind == 'decimal':
+            equal = np.flatnonzero(~mismatch)
+            recheck[equal] = ~np.asarray(same_decimal_repr(src_values[equal], tgt_values[equal]), dtype=bool)
+        differing = np.flatnonzero(recheck)
+        if len(differing):
+            expected = normalize_column(src_values[differing])
+            actual = normalize_column(tgt_values[differing])
+            mismatch[differing] = pc.invert(pc.equal(expected, actual)).to_numpy(zero_copy_only=False)
+        return mismatch
+    expected = normalize_column(src_values)
+    actual = normalize_column(tgt_values)
+    return pc.invert(pc.equal(expected, actual)).to_numpy(zero_copy_only=False)
+
+# Function to compare column pairs of two frames in bulk, one operation per column.
+# Rows are aligned by position and pairs are given as column positions. Returns one boolean
+# mismatch mask per pair. With pad_missing the source rows that have no target row count as
+# mismatches, otherwise the comparison stops at the shorter side like zip() does.
+def compare_columns(source_df, target_df, source_indices, target_indices, pad_missing=False):
+    with span('compare', rows=len(source_df)):
+        row_count = len(source_df) if pad_missing else min(len(source_df), len(target_df))
+        target_rows = min(row_count, len(target_df))
+        comparisons = []
+        for src_idx, tgt_idx in zip(source_indices, target_indices):
+            if target_rows:
+                src_values = source_df.iloc[:target_rows, src_idx].to_numpy(dtype=object)
+                tgt_values = target_df.iloc[:target_rows, tgt_idx].to_numpy(dtype=object)
+                mismatch = column_mismatch_mask(src_values, tgt_values)
+            else:
+                mismatch = np.zeros(0, dtype=bool)
+            if target_rows < row_count:
+                mismatch = np.concatenate([mismatch, np.ones(row_count - target_rows, dtype=bool)])
+            comparisons.append({
+                'source_index': src_idx,
+                'target_index': tgt_idx,
+                'mismatch': mismatch
+            })
+        return comparisons, row_count
+
+# Function to lay the column comparisons out as one result row per compared cell,
+# in the same row by row order the per cell loops produced
+def comparisons_to_frame(source_df, target_df, comparisons, row_count, source_labels, target_labels):
+    with span('compare'):
+        if not comparisons:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        target_rows = min(row_count, len(target_df))
+        expected_values = []
+        actual_values = []
+        for comparison in comparisons:
+            expected = normalize_column(source_df.iloc[:row_count, comparison['source_index']].to_numpy(dtype=object))
+            expected_values.append(expected.to_numpy(zero_copy_only=False))
+            actual = np.full(row_count, MISSING_VALUE, dtype=object)
+            if target_rows:
+                actual[:target_rows] = normalize_column(target_df.iloc[:target_rows, comparison['target_index']].to_numpy(dtype=object)).to_numpy(zero_copy_only=False)
+            actual_values.append(actual)
+        column_count = len(comparisons)
+        return pd.DataFrame({
+            'row_index': np.repeat(np.arange(row_count), column_count),
+            'source_column': np.tile(np.array(source_labels, dtype=object), row_count),
+            'target_column': np.tile(np.array(target_labels, dtype=object), row_count),
+            'source_value': np.column_stack(expected_values).ravel(),
+            'target_value': np.column_stack(actual_values).ravel(),
+            'match': ~np.column_stack([c['mismatch'] for c in comparisons]).ravel()
+        })
+
+# Function to turn fetched rows into a frame that keeps the driver values untouched
+def rows_to_frame(rows, column_names):
+    return pd.DataFrame(rows, columns=column_names, dtype=object)
+
+# Function to list only the mismatching cells of a comparison, one row per cell.
+# Values are normalized for the mismatching rows only. row_offset is added to the row index.
+def mismatches_to_frame(source_df, target_df, comparisons, source_labels, target_labels, row_offset=0):
+    with span('compare'):
+        frames = []
+        for comparison, src_label, tgt_label in zip(comparisons, source_labels, target_labels):
+            rows = np.flatnonzero(comparison['mismatch'])
+            if not len(rows):
+                continue
+            target_rows = rows[rows < len(target_df)]
+            actual = np.full(len(rows), MISSING_VALUE, dtype=object)
+            actual[:len(target_rows)] = normalize_column(target_df.iloc[target_rows, comparison['target_index']].to_numpy(dtype=object)).to_numpy(zero_copy_only=False)
+            frames.append(pd.DataFrame({
+                'row_index': rows + row_offset,
+                'source_column': src_label,
+                'target_column': tgt_label,
+                'source_value': normalize_column(source_df.iloc[rows, comparison['source_index']].to_numpy(dtype=object)).to_numpy(zero_copy_only=False),
+                'target_value': actual,
+                'match': False
+            }))
+        if not frames:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values(['row_index'], kind='stable', ignore_index=True)
+
+# Mismatch only results of a row order validation.
+# Holds per column counters plus the mismatching cells as columnar arrays (row key, column
+# position, source value, target value), at most max_examples of them. Matching cells are only
+# counted, so memory follows the number of differences and not rows x columns.
+class CompactResults:
+    def __init__(self, source_labels, target_labels, max_examples=DEFAULT_MAX_EXAMPLES):
+        self.source_labels = list(source_labels)
+        self.target_labels = list(target_labels)
+        self.max_examples = max_examples
+        self.rows_compared = 0
+        self.mismatch_counts = np.zeros(len(self.source_labels), dtype=np.int64)
+        self.retained = 0
+        self.examples = {'row_key': [], 'column': [], 'source_value': [], 'target_value': []}
+
+    # Count the mismatches of one set of column comparisons and keep examples while there is
+    # room. Row keys default to the row positions, continuing from the rows already added.
+    def add(self, source_df, target_df, comparisons, row_count, row_keys=None):
+        with span('compare'):
+            for position, comparison in enumerate(comparisons):
+                rows = np.flatnonzero(comparison['mismatch'])
+                self.mismatch_counts[position] += len(rows)
+                rows = rows[:max(self.max_examples - self.retained, 0)]
+                if not len(rows):
+                    continue
+                # Only the retained cells are normalized for display
+                target_rows = rows[rows < len(target_df)]
+                actual = np.full(len(rows), MISSING_VALUE, dtype=object)
+                actual[:len(target_rows)] = normalize_column(target_df.iloc[target_rows, comparison['target_index']].to_numpy(dtype=object)).to_numpy(zero_copy_only=False)
+                self.examples['row_key'].append(rows + self.rows_compared if row_keys is None else np.asarray(row_keys, dtype=object)[rows])
+                self.examples['column'].append(np.full(len(rows), position, dtype=np.int32))
+                self.examples['source_value'].append(normalize_column(source_df.iloc[rows, comparison['source_index']].to_numpy(dtype=object)).to_numpy(zero_copy_only=False))
+                self.examples['target_value'].append(actual)
+                self.retained += len(rows)
+            self.rows_compared += row_count
+
+    @property
+    def truncated(self):
+        return int(self.mismatch_counts.sum()) > self.retained
+
+    # Per column counters
+    def summary_frame(self):
+        return pd.DataFrame({
+            'source_column': self.source_labels,
+            'target_column': self.target_labels,
+            'rows_compared': self.rows_compared,
+            'matches': self.rows_compared - self.mismatch_counts,
+            'mismatches': self.mismatch_counts
+        })
+
+    # The retained mismatching cells, in the layout of the other result frames
+    def examples_frame(self):
+        if not self.retained:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        columns = np.concatenate(self.examples['column'])
+        examples_df = pd.DataFrame({
+            'row_index': np.concatenate(self.examples['row_key']),
+            'source_column': np.array(self.source_labels, dtype=object)[columns],
+            'target_column': np.array(self.target_labels, dtype=object)[columns],
+            'source_value': np.concatenate(self.examples['source_value']),
+            'target_value': np.concatenate(self.examples['target_value']),
+            'match': False
+        })
+        return examples_df.sort_values(['row_index'], kind='stable', ignore_index=True)
+
+    def to_dict(self):
+        return {
+            'rows_compared': self.rows_compared,
+            'summary': self.summary_frame(),
+            'mismatches': self.examples_frame(),
+            'truncated': self.truncated
+        }
+
+# Function to turn key texts back into a frame with one column per key column
+def keys_frame(keys, key_columns):
+    return pd.DataFrame([key.split(KEY_SEPARATOR) if len(key_columns) > 1 else [key] for key in keys], columns=key_columns)
+
+# Function to merge the results of all partitions, examples are ordered by key
+def merge_partition_results(partition_results, source_labels, target_labels, key_columns, max_examples):
+    totals = CompactResults(source_labels, target_labels, max_examples)
+    merged = {'matched_rows': 0, 'mismatched_rows': 0, 'source_only_rows': 0, 'target_only_rows': 0, 'duplicate_keys': 0}
+    examples, source_only, target_only, duplicates = [], [], [], []
+    for result in partition_results:
+        for counter in merged:
+            merged[counter] += result[counter]
+        totals.mismatch_counts += result['mismatch_counts']
+        examples.append(result['examples'])
+        source_only.extend(result['source_only'])
+        target_only.extend(result['target_only'])
+        duplicates.extend(result['duplicates'])
+    totals.rows_compared = merged['matched_rows'] + merged['mismatched_rows']
+    examples = [frame for frame in examples if not frame.empty]
+    if examples:
+        mismatches_df = pd.concat(examples, ignore_index=True).sort_values('row_index', kind='stable', ignore_index=True).head(max_examples)
+    else:
+        mismatches_df = pd.DataFrame(columns=RESULT_COLUMNS)
+    mismatches_df = mismatches_df.rename(columns={'row_index': 'key'})
+    mismatches_df['key'] = mismatches_df['key'].astype(str).str.replace(KEY_SEPARATOR, ', ', regex=False)
+    duplicates_df = pd.DataFrame(sorted(duplicates)[:max_examples], columns=['key', 'side'])
+    duplicates_df['key'] = duplicates_df['key'].str.replace(KEY_SEPARATOR, ', ', regex=False)
+    merged.update({
+        'rows_compared': totals.rows_compared,
+        'summary': totals.summary_frame(),
+        'mismatches': mismatches_df,
+        'source_only': keys_frame(sorted(source_only)[:max_examples], key_columns),
+        'target_only': keys_frame(sorted(target_only)[:max_examples], key_columns),
+        'duplicates': duplicates_df,
+        'truncated': int(totals.mismatch_counts.sum()) > len(mismatches_df)
+                     or merged['source_only_rows'] > max_examples or merged['target_only_rows'] > max_examples
+    })
+    return merged
+
+# Function to turn one fetched batch into a frame. Batches are either lists of rows or Arrow
+# tables; Arrow columns are converted column by column and keep integers, decimals, dates and
+# timestamps as the same Python values the row drivers return.
+def batch_to_frame(batch, column_names):
+    with span('convert', rows=len(batch)):
+        if isinstance(batch, pa.Table):
+            frame = batch.to_pandas(integer_object_nulls=True, date_as_object=True, timestamp_as_object=True)
+            frame.columns = column_names
+            return frame
+        return rows_to_frame(batch, column_names)
+
+# Function to build the normalized key text of every row of a frame from the positions of its key
+# columns. Keys are matched exactly, only surrounding blanks are dropped.
+def frame_keys(frame, key_positions):
+    parts = [normalize_key_column(frame.iloc[:, position].to_numpy(dtype=object)) for position in key_positions]
+    if len(parts) == 1:
+        return parts[0]
+    return pc.binary_join_element_wise(*parts, KEY_SEPARATOR)
+
+# Function to read a stream of batches into one frame with the key column appended
+def keyed_frame(batches, column_names, key_positions):
+    frames = [batch_to_frame(batch, column_names) for batch in batches]
+    if not frames:
+        frame = rows_to_frame([], column_names)
+    elif len(frames) == 1:
+        frame = frames[0]
+    else:
+        # Object columns keep the values of every batch as they are, 1 stays 1 next to 2.5
+        frame = pd.concat([frame.astype(object) for frame in frames], ignore_index=True)
+    frame[KEY_COLUMN] = frame_keys(frame, key_positions).to_numpy(zero_copy_only=False)
+    return frame
+
+# Function to list the column pairs compared by value as (source, target, source position,
+# target position), key pairs are matched instead
+def value_column_pairs(source_column_names, target_column_names, source_key_columns, target_key_columns):
+    return [
+        (src_col, tgt_col, position, position)
+        for position, (src_col, tgt_col) in enumerate(zip(source_column_names, target_column_names))
+        if not (src_col in source_key_columns and tgt_col in target_key_columns)
+    ]
+
+# Function to compare two frames that carry the key column.
+# Duplicate keys keep their first row. Returns counters, the per
+# column mismatch counts and at most max_examples examples of each kind.
+def compare_keyed_frames(source_df, target_df, value_pairs, max_examples):
+    source_duplicated = source_df[KEY_COLUMN].duplicated().to_numpy()
+    target_duplicated = target_df[KEY_COLUMN].duplicated().to_numpy()
+    duplicates = [(key, 'source') for key in source_df[KEY_COLUMN][source_duplicated]] + [(key, 'target') for key in target_df[KEY_COLUMN][target_duplicated]]
+    source_df = source_df[~source_duplicated]
+    target_df = target_df[~target_duplicated]
+
+    positions = pd.Index(target_df[KEY_COLUMN]).get_indexer(source_df[KEY_COLUMN])
+    found = positions >= 0
+    target_unmatched = np.ones(len(target_df), dtype=bool)
+    target_unmatched[positions[found]] = False
+    source_aligned = source_df[found].reset_index(drop=True)
+    target_aligned = target_df.iloc[positions[found]].reset_index(drop=True)
+
+    results = CompactResults([src_col for src_col, _, _, _ in value_pairs], [tgt_col for _, tgt_col, _, _ in value_pairs], max_examples)
+    comparisons, row_count = compare_columns(source_aligned, target_aligned, [pair[2] for pair in value_pairs], [pair[3] for pair in value_pairs])
+    results.add(source_aligned, target_aligned, comparisons, row_count, row_keys=source_aligned[KEY_COLUMN].to_numpy(dtype=object))
+    mismatched_rows = int(np.any([comparison['mismatch'] for comparison in comparisons], axis=0).sum()) if comparisons and row_count else 0
+    source_only = source_df[KEY_COLUMN][~found]
+    target_only = target_df[KEY_COLUMN][target_unmatched]
+    return {
+        'matched_rows': row_count - mismatched_rows,
+        'mismatched_rows': mismatched_rows,
+        'mismatch_counts': results.mismatch_counts,
+        'examples': results.examples_frame(),
+        'source_only_rows': len(source_only),
+        'source_only': list(source_only[:max_examples]),
+        'target_only_rows': len(target_only),
+        'target_only': list(target_only[:max_examples]),
+        'duplicate_keys': len(duplicates),
+        'duplicates': duplicates[:max_examples]
+    }
+
+# Function to validate data between MSSQL and Snowflake by key columns instead of row order.
+# The batches are lists of rows or Arrow tables like for validate_data_batches. Both sides are
+# aligned on their normalized key and the other columns are compared pairwise by position, column
+# by column. Only counters, the per column mismatch counts and at most max_examples examples of
+# each kind are kept.
+def validate_data_by_key(source_batches, target_batches, source_column_names, target_column_names,
+                         source_key_columns, target_key_columns, max_examples=DEFAULT_MAX_EXAMPLES):
+    if len(source_key_columns) == 0 or len(source_key_columns) != len(target_key_columns):
+        raise ValueError("Select the same number of key columns (at least one) on both sides.")
+    source_column_names, target_column_names = list(source_column_names), list(target_column_names)
+    value_pairs = value_column_pairs(source_column_names, target_column_names, source_key_columns, target_key_columns)
+    source_df = keyed_frame(source_batches, source_column_names, [source_column_names.index(col) for col in source_key_columns])
+    target_df = keyed_frame(target_batches, target_column_names, [target_column_names.index(col) for col in target_key_columns])
+    results = compare_keyed_frames(source_df, target_df, value_pairs, max_examples)
+    return merge_partition_results([results], [pair[0] for pair in value_pairs], [pair[1] for pair in value_pairs],
+                                   list(source_key_columns), max_examples)
+
+# Function to cut two streams of frames into chunks of equal length, aligned by position.
+# Like zip() it stops when either stream runs out.
+def align_batches(source_frames, target_frames):
+    source_frames = iter(source_frames)
+    target_frames = iter(target_frames)
+    source_df = target_df = None
+    while True:
+        while source_df is None or not len(source_df):
+            source_df = next(source_frames, None)
+            if source_df is None:
+                return
+        while target_df is None or not len(target_df):
+            target_df = next(target_frames, None)
+            if target_df is None:
+                return
+        chunk_size = min(len(source_df), len(target_df))
+        yield source_df.iloc[:chunk_size], target_df.iloc[:chunk_size]
+        source_df = source_df.iloc[chunk_size:]
+        target_df = target_df.iloc[chunk_size:]
+
+# Function to pass a stream of batches through while counting its rows in counter[0].
+# With a row limit the stream ends after that many rows.
+def count_batch_rows(batches, counter, row_limit=None):
+    for batch in batches:
+        if row_limit and counter[0] + len(batch) >= row_limit:
+            batch = batch[:row_limit - counter[0]]
+            counter[0] += len(batch)
+            yield batch
+            return
+        counter[0] += len(batch)
+        yield batch
+
+# Function to validate data by row order while the batches are still arriving.
+# Each aligned chunk is compared and dropped, only the per column counters and at most
+# max_examples mismatching cells are kept, so memory depends on the batch size and the number of
+# differences and not on the table size. The rows of the longer side that have no partner are
+# not compared but are counted: source_rows and target_rows differ when a side has extra rows.
+# row_limit compares only the first rows of both sides, like a LIMIT on the target query.
+def validate_data_batches(source_batches, target_batches, source_column_names, target_column_names, max_examples=DEFAULT_MAX_EXAMPLES, row_limit=None):
+    column_positions = range(len(source_column_names))
+    results = CompactResults(source_column_names, target_column_names, max_examples)
+    source_rows, target_rows = [0], [0]
+    source_batches = count_batch_rows(source_batches, source_rows, row_limit)
+    target_batches = count_batch_rows(target_batches, target_rows, row_limit)
+    source_frames = (batch_to_frame(batch, source_column_names) for batch in source_batches)
+    target_frames = (batch_to_frame(batch, target_column_names) for batch in target_batches)
+    for source_df, target_df in align_batches(source_frames, target_frames):
+        comparisons, row_count = compare_columns(source_df, target_df, column_positions, column_positions)
+        results.add(source_df, target_df, comparisons, row_count)
+    # Count what is left of the longer side without converting it
+    for _ in source_batches:
+        pass
+    for _ in target_batches:
+        pass
+    validated = results.to_dict()
+    validated.update({'source_rows': source_rows[0], 'target_rows': target_rows[0]})
+    return validated
+
+# Function to tell whether row order results found no difference: no mismatching cell and the
+# same number of rows on both sides
+def row_order_matched(results):
+    return int(results['summary']['mismatches'].sum()) == 0 and results['source_rows'] == results['target_rows']
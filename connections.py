@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+import time
+
+# Connection handling shared by app_v7.py and anything else that needs a database connection.
+# The pool lives at module level, so it survives Streamlit reruns and is shared by every
+# session in the process. A connection is checked out by one caller at a time and comes back
+# with checkin(), pyodbc connections must not be used by two threads at once. Only idle
+# connections are ever evicted. The drivers are imported when a connection is first opened.
+# Nothing in here touches Streamlit.
+
+# Seconds a pooled connection may sit unused before it is closed
+IDLE_TIMEOUT = 30 * 60
+# Connections unused for longer than this are health checked before they are handed out again
+HEALTH_CHECK_AFTER = 60
+# Maximum number of idle pooled connections, the least recently returned one is closed first
+MAX_POOL_SIZE = 8
+
+# Function to open a Snowflake connection from a config dict
+def open_snowflake(config):
+    import snowflake.connector
+    return snowflake.connector.connect(
+        user=config.get('user'),
+        password=config.get('password'),
+        account=config.get('account'),
+        role=config.get('role'),
+        warehouse=config.get('warehouse'),
+        database=config.get('database'),
+        schema=config.get('schema')
+    )
+
+# Function to open an MSSQL connection from a config dict
+def open_mssql(config):
+    import pyodbc
+    connection_string = (
+        f'DRIVER={{ODBC Driver 17 for SQL Server}};'
+        f'SERVER={config.get("server")};'
+        f'DATABASE={config.get("database")};'
+    )
+    if config.get('trusted_connection'):
+        connection_string += 'Trusted_Connection=yes;'
+    connection_string += f'UID={config.get("uid")};PWD={config.get("password")}'
+    return pyodbc.connect(connection_string)
+
+# Function to read the Snowflake connection details saved in credentials.env
+def snowflake_env_config():
+    return {
+        'user': os.getenv("SNOWFLAKE_USER"),
+        'password': os.getenv("SNOWFLAKE_PASSWORD"),
+        'account': os.getenv("SNOWFLAKE_ACCOUNT"),
+        'role': os.getenv("SNOWFLAKE_ROLE"),
+        'warehouse': os.getenv("SNOWFLAKE_WAREHOUSE"),
+        'database': os.getenv("SNOWFLAKE_DATABASE"),
+        'schema': os.getenv("SNOWFLAKE_SCHEMA")
+    }
+
+# Function to read the MSSQL connection details saved in credentials.env
+def mssql_env_config():
+    return {
+        'server': os.getenv("MSSQL_SERVER"),
+        'database': os.getenv("MSSQL_DATABASE"),
+        'uid': os.getenv("MSSQL_USER"),
+        'password': os.getenv("MSSQL_PASSWORD"),
+        'trusted_connection': 'yes'
+    }
+
+OPENERS = {
+    'snowflake': open_snowflake,
+    'mssql': open_mssql
+}
+
+# Function to build the pool key of a connection config. The password is hashed with the
+# rest of the config so it is never kept as a plain dict key.
+def pool_key(kind, config):
+    config_items = sorted((key, str(value)) for key, value in config.items())
+    return kind, hashlib.sha256(repr(config_items).encode()).hexdigest()
+
+# Function to check that a connection still answers
+def is_healthy(conn):
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
+
+# Function to close a connection, ignoring errors from connections that are already dead
+def close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+class ConnectionPool:
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, health_check_after=HEALTH_CHECK_AFTER, max_size=MAX_POOL_SIZE):
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.max_size = max_size
+        # Idle entries, least recently returned first
+        self.idle = []
+        # Checked out entries by id() of their connection
+        self.checked_out = {}
+        self.lock = threading.Lock()
+
+    # Hand out a connection for a config that nobody else is using. An idle one is reused when
+    # it still answers, otherwise a new one is opened.
+    def checkout(self, kind, config):
+        key = pool_key(kind, config)
+        while True:
+            with self.lock:
+                expired = self.evict_idle()
+                entry = next((entry for entry in reversed(self.idle) if entry['key'] == key), None)
+                if entry is not None:
+                    self.idle.remove(entry)
+                    self.checked_out[id(entry['conn'])] = entry
+            for old_entry in expired:
+                close_quietly(old_entry['conn'])
+            if entry is None:
+                break
+            # The health check runs without the lock, the entry is already ours
+            now = time.monotonic()
+            if now - entry['last_used'] <= self.health_check_after or is_healthy(entry['conn']):
+                entry['last_used'] = now
+                return entry['conn']
+            self.discard(entry['conn'])
+        conn = OPENERS[kind](config)
+        with self.lock:
+            self.checked_out[id(conn)] = {'key': key, 'conn': conn, 'last_used': time.monotonic()}
+        return conn
+
+    # Give a checked out connection back to the pool, connections opened elsewhere are ignored
+    def checkin(self, conn):
+        with self.lock:
+            entry = self.checked_out.pop(id(conn), None)
+            if entry is None:
+                return
+            entry['last_used'] = time.monotonic()
+            self.idle.append(entry)
+            overflow = self.idle[:max(0, len(self.idle) - self.max_size)]
+            del self.idle[:len(overflow)]
+        for old_entry in overflow:
+            close_quietly(old_entry['conn'])
+
+    # Remove the idle entries that have not been used for idle_timeout seconds and return them
+    # for closing (lock held by caller)
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [entry for entry in self.idle if entry['last_used'] < cutoff]
+        self.idle = [entry for entry in self.idle if entry['last_used'] >= cutoff]
+        return expired
+
+    # Return the pool key of a pooled connection, or its id for connections opened elsewhere
+    def key_of(self, conn):
+        with self.lock:
+            entry = self.checked_out.get(id(conn)) or next((entry for entry in self.idle if entry['conn'] is conn), None)
+        if entry is not None:
+            return entry['key']
+        return 'unpooled', id(conn)
+
+    # Drop a checked out connection instead of returning it, e.g. after it failed mid query
+    def discard(self, conn):
+        with self.lock:
+            self.checked_out.pop(id(conn), None)
+        close_quietly(conn)
+
+    # Close the idle connections, the checked out ones are closed by discard() or come back
+    # with checkin() and wait for the idle timeout
+    def close_all(self):
+        with self.lock:
+            entries, self.idle = self.idle, []
+        for entry in entries:
+            close_quietly(entry['conn'])
+
+pool = ConnectionPool()
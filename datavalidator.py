@@ -0,0 +1,357 @@
+import argparse
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+import toml
+from dotenv import load_dotenv
+
+from bucket_diff import DEFAULT_FANOUT, DEFAULT_LEAF_ROWS, bucket_diff
+from checksum import validate_checksums
+from compare import DEFAULT_MAX_EXAMPLES, row_order_matched, validate_data_batches, validate_data_by_key
+from connections import mssql_env_config, pool, snowflake_env_config
+from external_diff import DEFAULT_MEMORY_LIMIT, validate_data_external
+from extract import DEFAULT_BATCH_SIZE, get_mssql_columns, get_snowflake_columns, iter_mssql_batches, iter_snowflake_arrow_batches
+from incremental import DEFAULT_STATE_FILE, WatermarkStore, advance_window, plan_window, window_batches, window_is_empty
+from metadata import validate_schema_bulk
+from normalize import configure as configure_normalization
+from parallel_compare import validate_data_parallel
+from profiling import DEFAULT_DISTINCT_TOLERANCE, validate_profiles
+from sampling import DEFAULT_CONFIDENCE, validate_sample
+from table_stats import validate_table_sizes
+from timing import configure_log as configure_timing_log, span, timed_run
+from orchestrator import DEFAULT_MSSQL_WORKERS, DEFAULT_SNOWFLAKE_WORKERS, make_job, run_jobs
+
+# Headless batch runner, for cron and other schedulers:
+#
+#     python -m datavalidator run config.toml --output results.json
+#
+# Jobs are read from the [[jobs]] array of the config file, connections come from
+# credentials.env like in the app (or from [mssql] / [snowflake] sections of the config file).
+# Results and timings are written as JSON. The exit code is 0 when everything matched, 1 when
+# differences were found and 2 when a job failed. Nothing in here imports Streamlit.
+#
+# Job types and their keys:
+#   data         source_table, target_table, [source_columns, target_columns],
+#                [source_key_columns, target_key_columns], [row_limit],
+#                [watermark_column, target_watermark_column] to only check rows past the
+#                watermark of the last matching run (state in [incremental] state_file);
+#                key based jobs are compared on [cli] processes (or --processes) cores, or with
+#                out_of_core = true by external sort within [external_diff] memory_mb
+#   checksum     source_table, target_table, [source_columns, target_columns]
+#   profile      source_table, target_table, [source_columns, target_columns, distinct_tolerance]
+#   schema       [source_schema, target_schema, tables, attributes]
+#   bucket_diff  source_table, target_table, source_key_columns, target_key_columns,
+#                [source_columns, target_columns, fanout, leaf_rows]
+#   sample       source_table, target_table, source_key_columns, target_key_columns,
+#                [source_columns, target_columns, fraction or target_rows, confidence]
+#   sizes        [source_schema, target_schema, tables], row counts from catalog statistics
+
+EXIT_MATCH = 0
+EXIT_DIFFERENCES = 1
+EXIT_ERROR = 2
+
+# Function to turn a data frame into JSON ready records
+def frame_records(frame, limit=None):
+    if limit is not None:
+        frame = frame.head(limit)
+    return json.loads(frame.to_json(orient='records', date_format='iso', default_handler=str))
+
+# Function to fetch a whole table for a key based data job
+def fetch_for_key_job(job, mssql_conn, snowflake_conn, batch_size):
+    source_columns = job.get('source_columns') or get_mssql_columns(mssql_conn, job['source_table'])
+    target_columns = job.get('target_columns') or get_snowflake_columns(snowflake_conn, job['target_table'])
+    source_batches = iter_mssql_batches(mssql_conn, job['source_table'], batch_size, source_columns)
+    target_batches = iter_snowflake_arrow_batches(snowflake_conn, job['target_table'], job.get('row_limit'), target_columns)
+    return source_columns, target_columns, source_batches, target_batches
+
+# Function to run a data job that matches rows by key columns
+def run_key_job(job, mssql_conn, snowflake_conn, settings):
+    source_columns, target_columns, source_batches, target_batches = fetch_for_key_job(job, mssql_conn, snowflake_conn, settings['batch_size'])
+    if job.get('out_of_core'):
+        external_results = validate_data_external(source_batches, target_batches, source_columns, target_columns,
+                                                  job['source_key_columns'], job['target_key_columns'],
+                                                  settings['memory_limit'], settings['max_examples'], settings['spill_directory'])
+        return merged_job_details(external_results, settings)
+    if settings['processes'] > 1:
+        parallel_results = validate_data_parallel(source_batches, target_batches, source_columns, target_columns,
+                                                  job['source_key_columns'], job['target_key_columns'],
+                                                  settings['processes'], None, settings['max_examples'])
+        return merged_job_details(parallel_results, settings)
+    with span('compare'):
+        key_results = validate_data_by_key(source_batches, target_batches, source_columns, target_columns,
+                                           job['source_key_columns'], job['target_key_columns'], settings['max_examples'])
+    return merged_job_details(key_results, settings)
+
+# Function to describe the results of a key based data job
+def merged_job_details(merged_results, settings):
+    differences = merged_results['mismatched_rows'] + merged_results['source_only_rows'] + merged_results['target_only_rows']
+    return differences == 0, {
+        'matched_rows': merged_results['matched_rows'],
+        'mismatched_rows': merged_results['mismatched_rows'],
+        'source_only_rows': merged_results['source_only_rows'],
+        'target_only_rows': merged_results['target_only_rows'],
+        'duplicate_keys': merged_results['duplicate_keys'],
+        'mismatches': frame_records(merged_results['mismatches'], settings['max_examples']),
+        'source_only': frame_records(merged_results['source_only'], settings['max_examples']),
+        'target_only': frame_records(merged_results['target_only'], settings['max_examples'])
+    }
+
+# Function to run a data job on the rows past the stored watermark.
+# Rows are matched by key when key columns are given, otherwise in watermark order.
+def run_incremental_job(job, mssql_conn, snowflake_conn, settings):
+    store = WatermarkStore(settings['state_file'])
+    window = plan_window(store, mssql_conn, job['source_table'], job['target_table'],
+                         job['watermark_column'], job.get('target_watermark_column', job['watermark_column']), settings['full'])
+    details = {'watermark_from': window['last'], 'watermark_to': window['upper']}
+    if window_is_empty(window):
+        details['rows_compared'] = 0
+        return True, details
+    source_columns = job.get('source_columns') or get_mssql_columns(mssql_conn, job['source_table'])
+    target_columns = job.get('target_columns') or get_snowflake_columns(snowflake_conn, job['target_table'])
+    source_batches, target_batches = window_batches(mssql_conn, snowflake_conn, window, source_columns, target_columns,
+                                                    settings['batch_size'], ordered=not job.get('source_key_columns'))
+    if job.get('source_key_columns'):
+        with span('compare'):
+            key_results = validate_data_by_key(source_batches, target_batches, source_columns, target_columns,
+                                               job['source_key_columns'], job['target_key_columns'], settings['max_examples'])
+        matched, key_details = merged_job_details(key_results, settings)
+        rows_compared = key_results['rows_compared'] + key_results['source_only_rows'] + key_results['target_only_rows']
+        details.update(key_details)
+    else:
+        results = validate_data_batches(source_batches, target_batches, source_columns, target_columns, settings['max_examples'])
+        matched, row_details = data_job_details(results)
+        rows_compared = int(results['rows_compared'])
+        details.update(row_details)
+    if matched:
+        advance_window(store, window, rows_compared)
+    return matched, details
+
+# Function to describe the row order results of a data job, a side with extra rows is a difference
+def data_job_details(results):
+    mismatch_count = int(results['summary']['mismatches'].sum())
+    return row_order_matched(results), {
+        'rows_compared': int(results['rows_compared']),
+        'source_rows': int(results['source_rows']),
+        'target_rows': int(results['target_rows']),
+        'mismatch_count': mismatch_count,
+        'truncated': bool(results['truncated']),
+        'summary': frame_records(results['summary']),
+        'mismatches': frame_records(results['mismatches'])
+    }
+
+# Function to run a checksum job
+def run_checksum_job(job, mssql_conn, snowflake_conn, settings):
+    checksum_df = validate_checksums(mssql_conn, snowflake_conn, job['source_table'], job['target_table'],
+                                     job.get('source_columns'), job.get('target_columns'))
+    return bool(checksum_df['match'].all()), {'checksums': frame_records(checksum_df)}
+
+# Function to run a column profile job
+def run_profile_job(job, mssql_conn, snowflake_conn, settings):
+    profile_df = validate_profiles(mssql_conn, snowflake_conn, job['source_table'], job['target_table'],
+                                   job.get('source_columns'), job.get('target_columns'),
+                                   job.get('distinct_tolerance', DEFAULT_DISTINCT_TOLERANCE))
+    return bool(profile_df['match'].all()), {'profile': frame_records(profile_df)}
+
+# Function to run a bulk schema job
+def run_schema_job(job, mssql_conn, snowflake_conn, settings):
+    summary_df, differences_df = validate_schema_bulk(mssql_conn, snowflake_conn, job.get('source_schema'), job.get('target_schema'),
+                                                      job.get('tables'), job.get('attributes'))
+    return bool((summary_df['status'] == 'match').all()), {
+        'tables': frame_records(summary_df),
+        'differences': frame_records(differences_df, settings['max_examples'])
+    }
+
+# Function to run a bucketed hash diff job
+def run_bucket_diff_job(job, mssql_conn, snowflake_conn, settings):
+    differences_df, stats = bucket_diff(mssql_conn, snowflake_conn, job['source_table'], job['target_table'],
+                                        job['source_key_columns'], job['target_key_columns'],
+                                        job.get('source_columns'), job.get('target_columns'),
+                                        job.get('fanout', DEFAULT_FANOUT), job.get('leaf_rows', DEFAULT_LEAF_ROWS))
+    return differences_df.empty, {
+        'difference_count': len(differences_df),
+        'stats': stats,
+        'differences': frame_records(differences_df, settings['max_examples'])
+    }
+
+# Function to run a row count pre-check from catalog statistics
+def run_sizes_job(job, mssql_conn, snowflake_conn, settings):
+    sizes_df = validate_table_sizes(mssql_conn, snowflake_conn, job.get('source_schema'), job.get('target_schema'), job.get('tables'))
+    return bool((sizes_df['status'] == 'match').all()), {'tables': frame_records(sizes_df)}
+
+# Function to run a deterministic sample job
+def run_sample_job(job, mssql_conn, snowflake_conn, settings):
+    sample_results = validate_sample(mssql_conn, snowflake_conn, job['source_table'], job['target_table'],
+                                     job['source_key_columns'], job['target_key_columns'],
+                                     job.get('source_columns'), job.get('target_columns'),
+                                     job.get('fraction'), job.get('target_rows'), job.get('confidence', DEFAULT_CONFIDENCE))
+    differences_df = sample_results['differences']
+    return differences_df.empty, {
+        'fraction': sample_results['fraction'],
+        'source_rows': sample_results['source_rows'],
+        'target_rows': sample_results['target_rows'],
+        'difference_count': len(differences_df),
+        'estimates': frame_records(sample_results['estimates']),
+        'differences': frame_records(differences_df, settings['max_examples'])
+    }
+
+JOB_RUNNERS = {
+    'checksum': run_checksum_job,
+    'profile': run_profile_job,
+    'schema': run_schema_job,
+    'bucket_diff': run_bucket_diff_job,
+    'sample': run_sample_job,
+    'sizes': run_sizes_job
+}
+
+# Function to tell whether a job is a full table row order data job, those run in parallel
+def is_row_order_job(job):
+    return job.get('type', 'data') == 'data' and not job.get('source_key_columns') and not job.get('watermark_column')
+
+# Function to pick the runner of a job that is not run by the orchestrator
+def job_runner(job):
+    if job.get('type', 'data') != 'data':
+        return JOB_RUNNERS[job['type']]
+    return run_incremental_job if job.get('watermark_column') else run_key_job
+
+# Function to name a job in the results, unnamed jobs are numbered from 1
+def job_name(job, idx):
+    return job.get('name') or f"job {idx + 1}"
+
+# Function to build the result entry of one job
+def job_result(name, job, started, matched=None, details=None, error=None, timings=None):
+    result = {
+        'name': name,
+        'type': job.get('type', 'data'),
+        'status': 'error' if error is not None else ('match' if matched else 'mismatch'),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    if timings:
+        result['timings'] = {phase: round(seconds, 3) for phase, seconds in timings.items()}
+    if error is not None:
+        result['error'] = f"{type(error).__name__}: {error}"
+    if details:
+        result.update(details)
+    return result
+
+# Function to check out a pooled connection to both databases for the duration of one job
+@contextmanager
+def connect_pair(mssql_config, snowflake_config):
+    with span('connect'):
+        mssql_conn = pool.checkout('mssql', mssql_config)
+    try:
+        with span('connect'):
+            snowflake_conn = pool.checkout('snowflake', snowflake_config)
+        try:
+            yield mssql_conn, snowflake_conn
+        finally:
+            pool.checkin(snowflake_conn)
+    finally:
+        pool.checkin(mssql_conn)
+
+# Function to run every job of a config and return the result entries.
+# Row order data jobs go through the parallel orchestrator, everything else runs in turn on
+# pooled connections.
+def run_all(jobs, mssql_config, snowflake_config, settings):
+    results = []
+    row_order_jobs = [(idx, job) for idx, job in enumerate(jobs) if is_row_order_job(job)]
+    other_jobs = [(idx, job) for idx, job in enumerate(jobs) if not is_row_order_job(job)]
+    if row_order_jobs:
+        started = time.perf_counter()
+        orchestrated = [make_job(job['source_table'], job['target_table'], job.get('source_columns'), job.get('target_columns'), job.get('row_limit')) for _, job in row_order_jobs]
+        for position, _, job_results in run_jobs(orchestrated, mssql_config, snowflake_config, settings['mssql_workers'], settings['snowflake_workers'],
+                                                 settings['batch_size'], None, settings['max_examples']):
+            idx, job = row_order_jobs[position]
+            if 'error' in job_results:
+                results.append(job_result(job_name(job, idx), job, started, error=job_results['error']))
+            else:
+                matched, details = data_job_details(job_results)
+                results.append(job_result(job_name(job, idx), job, started, matched, details, timings=job_results['timings']))
+    for idx, job in other_jobs:
+        started = time.perf_counter()
+        with timed_run(job_name(job, idx)) as timer:
+            try:
+                with connect_pair(mssql_config, snowflake_config) as (mssql_conn, snowflake_conn):
+                    matched, details = job_runner(job)(job, mssql_conn, snowflake_conn, settings)
+            except Exception as e:
+                matched, details, error = None, None, e
+            else:
+                error = None
+        phases = {row['phase']: row['seconds'] for row in timer.to_dict()['phases']}
+        results.append(job_result(job_name(job, idx), job, started, matched, details, error, phases))
+    return results
+
+# Function to pick the exit code of a run
+def exit_code(results):
+    if any(result['status'] == 'error' for result in results):
+        return EXIT_ERROR
+    if any(result['status'] == 'mismatch' for result in results):
+        return EXIT_DIFFERENCES
+    return EXIT_MATCH
+
+def run_command(args):
+    config = toml.load(args.config)
+    load_dotenv("credentials.env")
+    configure_normalization(config.get('normalization', {}))
+    configure_timing_log(args.timings_log or config.get('timing', {}).get('log_file'))
+    jobs = [dict(job, name=job_name(job, idx)) for idx, job in enumerate(config.get('jobs', []))]
+    if args.job:
+        jobs = [job for job in jobs if job['name'] in args.job]
+    unknown_types = sorted({job.get('type', 'data') for job in jobs} - set(JOB_RUNNERS) - {'data'})
+    if unknown_types:
+        print(f"Unknown job type: {', '.join(unknown_types)}", file=sys.stderr)
+        return EXIT_ERROR
+    cli_settings = config.get('cli', {})
+    settings = {
+        'max_examples': config.get('results', {}).get('max_examples', DEFAULT_MAX_EXAMPLES),
+        'state_file': config.get('incremental', {}).get('state_file', DEFAULT_STATE_FILE),
+        'full': args.full,
+        'batch_size': cli_settings.get('batch_size', DEFAULT_BATCH_SIZE),
+        'mssql_workers': args.mssql_workers or cli_settings.get('mssql_workers', DEFAULT_MSSQL_WORKERS),
+        'snowflake_workers': args.snowflake_workers or cli_settings.get('snowflake_workers', DEFAULT_SNOWFLAKE_WORKERS),
+        'processes': args.processes or cli_settings.get('processes', 1),
+        'memory_limit': config.get('external_diff', {}).get('memory_mb', DEFAULT_MEMORY_LIMIT // 1024 ** 2) * 1024 ** 2,
+        'spill_directory': config.get('external_diff', {}).get('directory')
+    }
+    mssql_config = config.get('mssql') or mssql_env_config()
+    snowflake_config = config.get('snowflake') or snowflake_env_config()
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    started = time.perf_counter()
+    try:
+        results = run_all(jobs, mssql_config, snowflake_config, settings)
+    finally:
+        pool.close_all()
+    report = {
+        'config': args.config,
+        'started_at': started_at,
+        'seconds': round(time.perf_counter() - started, 3),
+        'jobs': results
+    }
+    report['exit_code'] = exit_code(results)
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return report['exit_code']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='datavalidator', description='Run MSSQL to Snowflake validations without the Streamlit app.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the jobs of a config file')
+    run_parser.add_argument('config', nargs='?', default='config.toml', help='TOML file with [[jobs]] (default: config.toml)')
+    run_parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    run_parser.add_argument('--job', action='append', help='only run the job with this name (repeatable)')
+    run_parser.add_argument('--full', action='store_true', help='validate incremental jobs from the start instead of the stored watermark')
+    run_parser.add_argument('--timings-log', help='append the timing spans as JSON lines to this file')
+    run_parser.add_argument('--mssql-workers', type=int, help='concurrent MSSQL queries for data jobs')
+    run_parser.add_argument('--snowflake-workers', type=int, help='concurrent Snowflake queries for data jobs')
+    run_parser.add_argument('--processes', type=int, help='compare key based data jobs on this many processes')
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run_command(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from compare import DEFAULT_MAX_EXAMPLES, KEY_COLUMN, compare_keyed_frames, merge_partition_results, value_column_pairs
+from parallel_compare import conform_table, empty_keyed_frame, keyed_table, table_to_frame, unified_schema, unify_tables
+from timing import span
+
+# Key based validation of tables larger than memory, by external sort and merge join.
+# Each side is read batch by batch and cut into runs of at most half the memory limit, counting
+# the sort index; every run is sorted by its normalized key and spilled to disk as an Arrow IPC
+# file, one slice at a time. The other half covers bringing batches of differing column types to
+# one schema. The runs of a side are then merged k ways, and the two sorted sides are merge joined
+# key range by key range. Only one record batch per open run, plus the key range being compared,
+# is in memory at a time. When a side has more runs than the limit lets us open at once, runs are
+# first merged into longer runs. The limit covers the Arrow data of the diff; the batch being
+# fetched and the Python objects of the compared key range come on top. Nothing in here touches
+# Streamlit.
+
+DEFAULT_MEMORY_LIMIT = 1024 ** 3
+# Share of the memory limit one unsorted run may take, bringing it to one schema may copy it
+RUN_SHARE = 2
+# Bytes per row the sort of a run takes next to the run, for the sort indices
+SORT_INDEX_BYTES = 16
+# Rows per record batch of a spilled run, the unit read back during the merge
+RUN_BATCH_ROWS = 10000
+# Memory of a record batch once it is converted and compared, relative to its Arrow size
+MERGE_OVERHEAD = 4
+
+# Function to sort buffered tables by key and write them as a run file. The rows are sorted
+# through an index and taken a slice at a time, so the sorted run is never a second copy.
+def write_run(tables, directory, prefix, number):
+    table = pa.concat_tables(unify_tables(tables))
+    order = pc.sort_indices(table, [(KEY_COLUMN, 'ascending')])
+    path = os.path.join(directory, f"{prefix}_run_{number}.arrow")
+    with pa.ipc.new_file(path, table.schema) as writer:
+        for start in range(0, len(order), RUN_BATCH_ROWS):
+            writer.write_table(table.take(order[start:start + RUN_BATCH_ROWS]))
+    return path
+
+# Function to read the schema of a run file
+def run_schema(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+# Function to read a run file back one record batch at a time, brought to the schema of its side
+def iter_run(path, schema):
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for idx in range(reader.num_record_batches):
+            yield conform_table(pa.Table.from_batches([reader.get_batch(idx)]), schema)
+
+# Function to cut a stream of fetched batches into sorted runs on disk.
+# Returns the run paths and the largest Arrow size of a row seen.
+def spill_runs(batches, column_names, key_columns, run_bytes, directory, prefix):
+    key_positions = [column_names.index(col) for col in key_columns]
+    paths = []
+    buffered = []
+    buffered_bytes = 0
+    row_bytes = 1
+    for batch in batches:
+        with span('convert', rows=len(batch)):
+            table = keyed_table(batch, column_names, key_positions)
+            if table.num_rows:
+                row_bytes = max(row_bytes, table.nbytes // table.num_rows)
+        table_bytes = table.nbytes + table.num_rows * SORT_INDEX_BYTES
+        # The run is written before the batch would take it over the limit
+        if buffered and buffered_bytes + table_bytes > run_bytes:
+            with span('convert', rows=sum(table.num_rows for table in buffered)):
+                paths.append(write_run(buffered, directory, prefix, len(paths)))
+            buffered, buffered_bytes = [], 0
+        buffered.append(table)
+        buffered_bytes += table_bytes
+    if buffered:
+        with span('convert', rows=sum(table.num_rows for table in buffered)):
+            paths.append(write_run(buffered, directory, prefix, len(paths)))
+    return paths, row_bytes
+
+# Function to walk several key sorted streams of tables in step. Yields one table per stream
+# holding the rows of the same key range, ranges follow each other in key order. A key never
+# spans two ranges, so all rows of a key are compared together.
+def merge_key_ranges(streams):
+    streams = [iter(stream) for stream in streams]
+    buffers = [None] * len(streams)
+    open_streams = set(range(len(streams)))
+
+    # Append the next non empty table of a stream to its buffer, False when the stream ended
+    def extend(idx):
+        while True:
+            table = next(streams[idx], None)
+            if table is None:
+                open_streams.discard(idx)
+                return False
+            if table.num_rows:
+                buffers[idx] = table if buffers[idx] is None or not buffers[idx].num_rows else pa.concat_tables([buffers[idx], table])
+                return True
+
+    for idx in range(len(streams)):
+        extend(idx)
+    while True:
+        # Every open stream has rows buffered, its last buffered key bounds the safe range
+        last_keys = [buffers[idx].column(KEY_COLUMN)[-1].as_py() for idx in open_streams]
+        if not last_keys:
+            if any(buffer is not None and buffer.num_rows for buffer in buffers):
+                yield buffers
+            return
+        bound = min(last_keys)
+        counts = [0 if buffer is None else pc.sum(pc.less(buffer.column(KEY_COLUMN), bound)).as_py() or 0 for buffer in buffers]
+        if not any(counts):
+            # Every buffered key is at least the bound, read on where the bound key may continue
+            for idx in list(open_streams):
+                if buffers[idx].column(KEY_COLUMN)[-1].as_py() == bound:
+                    extend(idx)
+            continue
+        yield [None if buffer is None else buffer.slice(0, count) for buffer, count in zip(buffers, counts)]
+        buffers = [None if buffer is None else buffer.slice(count) for buffer, count in zip(buffers, counts)]
+        for idx in list(open_streams):
+            if not buffers[idx].num_rows:
+                extend(idx)
+
+# Function to merge the runs of one side into a single key sorted stream of tables
+def iter_sorted(run_paths, schema):
+    for pieces in merge_key_ranges([iter_run(path, schema) for path in run_paths]):
+        pieces = [piece for piece in pieces if piece is not None and piece.num_rows]
+        if pieces:
+            yield pa.concat_tables(pieces).sort_by(KEY_COLUMN)
+
+# Function to merge runs into fewer, longer runs until at most fan_in are left
+def reduce_runs(run_paths, fan_in, directory, prefix, schema):
+    passes = 0
+    while len(run_paths) > fan_in:
+        passes += 1
+        merged = []
+        for start in range(0, len(run_paths), fan_in):
+            group = run_paths[start:start + fan_in]
+            path = os.path.join(directory, f"{prefix}_pass_{passes}_{len(merged)}.arrow")
+            writer = None
+            try:
+                for table in iter_sorted(group, schema):
+                    if writer is None:
+                        writer = pa.ipc.new_file(path, table.schema)
+                    writer.write_table(table, max_chunksize=RUN_BATCH_ROWS)
+            finally:
+                if writer is not None:
+                    writer.close()
+            for old_path in group:
+                os.remove(old_path)
+            if writer is not None:
+                merged.append(path)
+        run_paths = merged
+    return run_paths, passes
+
+# Function to add the results of one key range to the running totals, keeping at most
+# max_examples examples of each kind. Ranges arrive in key order, so the lowest keys are kept.
+def add_range_results(totals, results, max_examples):
+    if totals is None:
+        return results
+    for counter in ('matched_rows', 'mismatched_rows', 'source_only_rows', 'target_only_rows', 'duplicate_keys'):
+        totals[counter] += results[counter]
+    totals['mismatch_counts'] = totals['mismatch_counts'] + results['mismatch_counts']
+    if len(totals['examples']) < max_examples and not results['examples'].empty:
+        examples = [frame for frame in (totals['examples'], results['examples']) if not frame.empty]
+        totals['examples'] = pd.concat(examples, ignore_index=True).head(max_examples)
+    for kind in ('source_only', 'target_only', 'duplicates'):
+        totals[kind] = totals[kind] + results[kind][:max(0, max_examples - len(totals[kind]))]
+    return totals
+
+# Function to validate data by key columns within a memory limit (bytes), however large the
+# tables are. The batches are lists of rows or Arrow tables like for validate_data_batches.
+def validate_data_external(source_batches, target_batches, source_column_names, target_column_names,
+                           source_key_columns, target_key_columns, memory_limit=DEFAULT_MEMORY_LIMIT,
+                           max_examples=DEFAULT_MAX_EXAMPLES, directory=None):
+    if len(source_key_columns) == 0 or len(source_key_columns) != len(target_key_columns):
+        raise ValueError("Select the same number of key columns (at least one) on both sides.")
+    source_column_names, target_column_names = list(source_column_names), list(target_column_names)
+    value_pairs = value_column_pairs(source_column_names, target_column_names, source_key_columns, target_key_columns)
+    run_bytes = memory_limit // RUN_SHARE
+    with tempfile.TemporaryDirectory(prefix='datavalidator_', dir=directory) as temp_dir:
+        source_runs, source_row_bytes = spill_runs(source_batches, source_column_names, source_key_columns, run_bytes, temp_dir, 'source')
+        target_runs, target_row_bytes = spill_runs(target_batches, target_column_names, target_key_columns, run_bytes, temp_dir, 'target')
+        stats = {'source_runs': len(source_runs), 'target_runs': len(target_runs)}
+        # Both sides are merged at the same time, each open run holds one record batch
+        batch_bytes = max(source_row_bytes, target_row_bytes) * RUN_BATCH_ROWS * MERGE_OVERHEAD
+        fan_in = max(2, memory_limit // (2 * batch_bytes))
+        # Runs of one side may have been written with different column types
+        source_schema = unified_schema([run_schema(path) for path in source_runs])
+        target_schema = unified_schema([run_schema(path) for path in target_runs])
+        source_runs, source_passes = reduce_runs(source_runs, fan_in, temp_dir, 'source', source_schema)
+        target_runs, target_passes = reduce_runs(target_runs, fan_in, temp_dir, 'target', target_schema)
+        stats['merge_passes'] = max(source_passes, target_passes)
+        totals = None
+        with span('compare'):
+            for source_table, target_table in merge_key_ranges([iter_sorted(source_runs, source_schema), iter_sorted(target_runs, target_schema)]):
+                source_df = empty_keyed_frame(source_column_names) if source_table is None else table_to_frame(source_table, source_column_names)
+                target_df = empty_keyed_frame(target_column_names) if target_table is None else table_to_frame(target_table, target_column_names)
+                totals = add_range_results(totals, compare_keyed_frames(source_df, target_df, value_pairs, max_examples), max_examples)
+    merged = merge_partition_results([totals] if totals is not None else [], [pair[0] for pair in value_pairs], [pair[1] for pair in value_pairs],
+                                     list(source_key_columns), max_examples)
+    merged.update(stats)
+    return merged
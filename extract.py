@@ -0,0 +1,99 @@
+from timing import span
+
+# Extraction helpers used by app_v7.py for reading large tables.
+# Nothing in here touches Streamlit, errors are raised to the caller.
+
+DEFAULT_BATCH_SIZE = 50000
+
+# Function to quote a column name for MSSQL
+def mssql_quote(column_name):
+    return '[' + column_name.replace(']', ']]') + ']'
+
+# Function to split a possibly qualified MSSQL table name into database, schema and table,
+# brackets and double quotes around the parts are removed
+def split_mssql_name(mssql_table_name):
+    parts = []
+    for part in mssql_table_name.split('.'):
+        part = part.strip()
+        if part.startswith('[') and part.endswith(']'):
+            part = part[1:-1].replace(']]', ']')
+        elif part.startswith('"') and part.endswith('"'):
+            part = part[1:-1].replace('""', '"')
+        parts.append(part)
+    parts = [None] * (3 - len(parts)) + parts[-3:]
+    return parts[0], parts[1], parts[2]
+
+# Function to fetch the column names of an MSSQL table without reading any rows
+def get_mssql_columns(mssql_conn, mssql_table_name):
+    with span('metadata fetch'):
+        cursor = mssql_conn.cursor()
+        try:
+            cursor.execute(f"SELECT TOP 0 * FROM {mssql_table_name}")
+            return [desc[0] for desc in cursor.description]
+        finally:
+            cursor.close()
+
+# Function to stream MSSQL table data with fetchmany, one batch of rows at a time.
+# Only the requested columns are selected. At most batch_size rows are held in memory.
+# filter_clause (WHERE / ORDER BY with ? placeholders) and its params are appended to the query.
+def iter_mssql_batches(mssql_conn, mssql_table_name, batch_size=DEFAULT_BATCH_SIZE, columns=None, filter_clause='', params=()):
+    cursor = mssql_conn.cursor()
+    try:
+        cursor.arraysize = batch_size
+        projection = ', '.join(mssql_quote(col) for col in columns) if columns else '*'
+        with span('data fetch'):
+            cursor.execute(f"SELECT {projection} FROM {mssql_table_name}{filter_clause}", *params)
+        while True:
+            with span('data fetch') as record:
+                rows = cursor.fetchmany(batch_size)
+                record['rows'] = len(rows)
+            if not rows:
+                break
+            with span('convert', rows=len(rows)):
+                rows = [tuple(row) for row in rows]
+            yield rows
+    finally:
+        cursor.close()
+
+# Function to quote a column name for Snowflake
+def snowflake_quote(column_name):
+    return '"' + column_name.replace('"', '""') + '"'
+
+# Function to build a SELECT over the given columns with an optional row limit (None or 0 means no limit)
+def snowflake_select(snow_table_name, columns=None, row_limit=None, filter_clause=''):
+    projection = ', '.join(snowflake_quote(col) for col in columns) if columns else '*'
+    query = f"SELECT {projection} FROM {snow_table_name}{filter_clause}"
+    if row_limit:
+        query += f" LIMIT {int(row_limit)}"
+    return query
+
+# Function to fetch the column names of a Snowflake table without reading any rows
+def get_snowflake_columns(snowflake_conn, snow_table_name):
+    with span('metadata fetch'):
+        cursor = snowflake_conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {snow_table_name} LIMIT 0")
+            return [desc[0] for desc in cursor.description]
+        finally:
+            cursor.close()
+
+# Function to stream Snowflake table data as Arrow tables straight from the result batches,
+# without building Python tuples. Only the requested columns are selected.
+# filter_clause (WHERE / ORDER BY with %s placeholders) and its params are appended to the query.
+def iter_snowflake_arrow_batches(snowflake_conn, snow_table_name, row_limit=None, columns=None, filter_clause='', params=()):
+    cursor = snowflake_conn.cursor()
+    try:
+        with span('data fetch'):
+            cursor.execute(snowflake_select(snow_table_name, columns, row_limit, filter_clause), params or None)
+            batches = cursor.fetch_arrow_batches()
+        while True:
+            with span('data fetch') as record:
+                batch = next(batches, None)
+                if batch is not None:
+                    record['rows'] = batch.num_rows
+                    record['bytes'] = batch.nbytes
+            if batch is None:
+                break
+            yield batch
+    finally:
+        cursor.close()
@@ -0,0 +1,151 @@
+import datetime
+import decimal
+import json
+import os
+import threading
+import time
+
+from extract import DEFAULT_BATCH_SIZE, iter_mssql_batches, iter_snowflake_arrow_batches, mssql_quote, snowflake_quote
+from timing import span
+
+# Incremental validation of the rows added or changed since the last validated run.
+# A watermark column (an increasing id or an updated_at timestamp) is chosen per table pair.
+# Each run reads the current MAX(watermark) from MSSQL and validates only the window
+# last < watermark <= max on both sides, with the bounds bound as query parameters. When the
+# window matches, max is stored as the new last value in a local JSON state file, so the next
+# run starts where this one stopped. A window with differences is not advanced and is checked
+# again on the next run. Nothing in here touches Streamlit.
+
+DEFAULT_STATE_FILE = 'validation_state.json'
+
+# Function to build the state key of a table pair
+def pair_key(source_table, target_table):
+    return f"{source_table} -> {target_table}"
+
+# Function to store a watermark value as JSON, keeping its type
+def encode_watermark(value):
+    if isinstance(value, datetime.datetime):
+        return {'type': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'type': 'date', 'value': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'type': 'decimal', 'value': str(value)}
+    return {'type': type(value).__name__, 'value': value}
+
+# Function to read back a watermark value stored by encode_watermark
+def decode_watermark(stored):
+    if stored['type'] == 'datetime':
+        return datetime.datetime.fromisoformat(stored['value'])
+    if stored['type'] == 'date':
+        return datetime.date.fromisoformat(stored['value'])
+    if stored['type'] == 'decimal':
+        return decimal.Decimal(stored['value'])
+    return stored['value']
+
+class WatermarkStore:
+    def __init__(self, path=DEFAULT_STATE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    # Write to a temporary file first so a crash never leaves a half written state file
+    def save(self, state):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def get(self, key):
+        with self.lock:
+            return self.load().get(key)
+
+    def set(self, key, entry):
+        with self.lock:
+            state = self.load()
+            state[key] = entry
+            self.save(state)
+
+    def reset(self, key):
+        with self.lock:
+            state = self.load()
+            if state.pop(key, None) is not None:
+                self.save(state)
+
+# Function to read the highest watermark value of an MSSQL table
+def mssql_max_watermark(mssql_conn, mssql_table_name, watermark_column):
+    with span('metadata fetch'):
+        cursor = mssql_conn.cursor()
+        try:
+            cursor.execute(f"SELECT MAX({mssql_quote(watermark_column)}) FROM {mssql_table_name}")
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+# Function to plan the window of the next run of a table pair.
+# The stored last value is only used when it was taken on the same watermark column.
+def plan_window(store, mssql_conn, source_table, target_table, source_watermark, target_watermark, full=False):
+    key = pair_key(source_table, target_table)
+    entry = store.get(key)
+    last = None
+    if entry and not full and entry['source_watermark'] == source_watermark and entry['target_watermark'] == target_watermark:
+        last = decode_watermark(entry['last'])
+    upper = mssql_max_watermark(mssql_conn, source_table, source_watermark)
+    return {
+        'key': key,
+        'source_table': source_table,
+        'target_table': target_table,
+        'source_watermark': source_watermark,
+        'target_watermark': target_watermark,
+        'last': last,
+        'upper': upper,
+        'previous_run': entry.get('validated_at') if entry else None
+    }
+
+# Function to tell whether a window has no rows to validate
+def window_is_empty(window):
+    return window['upper'] is None or (window['last'] is not None and window['upper'] <= window['last'])
+
+# Function to build the WHERE (and ORDER BY for row order matching) clause of one side.
+# The tie breakers follow the watermark in the ORDER BY, so rows sharing a watermark value
+# come in the same order on both sides.
+def window_clause(quoted_column, placeholder, window, ordered, tie_breakers=()):
+    conditions = [f"{quoted_column} <= {placeholder}"]
+    params = [window['upper']]
+    if window['last'] is not None:
+        conditions.insert(0, f"{quoted_column} > {placeholder}")
+        params.insert(0, window['last'])
+    clause = " WHERE " + " AND ".join(conditions)
+    if ordered:
+        clause += " ORDER BY " + ", ".join([quoted_column] + list(tie_breakers))
+    return clause, params
+
+# Function to stream the rows of a window from both sides.
+# ordered sorts both sides by the watermark and then by the other selected columns, pair by
+# pair, which row order matching needs. Without selected columns only the watermark orders.
+def window_batches(mssql_conn, snowflake_conn, window, source_columns, target_columns, batch_size=DEFAULT_BATCH_SIZE, ordered=False):
+    column_pairs = [
+        (source_column, target_column) for source_column, target_column in zip(source_columns or [], target_columns or [])
+        if source_column != window['source_watermark'] and target_column != window['target_watermark']
+    ]
+    source_clause, source_params = window_clause(mssql_quote(window['source_watermark']), '?', window, ordered,
+                                                 [mssql_quote(pair[0]) for pair in column_pairs])
+    target_clause, target_params = window_clause(snowflake_quote(window['target_watermark']), '%s', window, ordered,
+                                                 [snowflake_quote(pair[1]) for pair in column_pairs])
+    source_batches = iter_mssql_batches(mssql_conn, window['source_table'], batch_size, source_columns, source_clause, source_params)
+    target_batches = iter_snowflake_arrow_batches(snowflake_conn, window['target_table'], None, target_columns, target_clause, target_params)
+    return source_batches, target_batches
+
+# Function to store the upper bound of a validated window as the next starting point
+def advance_window(store, window, rows_validated):
+    store.set(window['key'], {
+        'source_watermark': window['source_watermark'],
+        'target_watermark': window['target_watermark'],
+        'last': encode_watermark(window['upper']),
+        'rows_validated': rows_validated,
+        'validated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    })
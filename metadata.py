@@ -0,0 +1,202 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+
+from compare import compare_columns, mismatches_to_frame, rows_to_frame
+from normalize import column_to_text
+
+# Schema validation helpers used by app_v7.py.
+# Columns are matched by normalized name, so a different column order on either side does not
+# produce false mismatches. For whole schemas or long table lists the column metadata is read
+# with one INFORMATION_SCHEMA.COLUMNS query per side instead of one query per table, grouped by
+# table in memory and validated for every table pair in one pass. Both engines expose the same
+# ANSI column names, so the same projection is selected on both sides.
+# Nothing in here touches Streamlit.
+
+# Columns of the frame listing the attributes that differ between matched columns
+DIFFERENCE_COLUMNS = ['column_name', 'source_column', 'target_column', 'source_value', 'target_value']
+
+# Function to normalize column names for matching, case, surrounding blanks and quote
+# characters are ignored
+def normalize_names(values):
+    text = pc.utf8_lower(pc.utf8_trim_whitespace(column_to_text(values)))
+    return pc.utf8_trim(text, characters='"[]`').to_numpy(zero_copy_only=False)
+
+# Function to index the rows of a metadata frame by normalized column name, the first row of a
+# repeated name wins
+def name_index(metadata_df, name_index_position):
+    names = metadata_df.iloc[:, name_index_position].to_numpy(dtype=object)
+    index_df = pd.DataFrame({'key': normalize_names(names), 'name': names, 'row': np.arange(len(metadata_df))})
+    duplicates = index_df.loc[index_df['key'].duplicated(), 'name'].tolist()
+    return index_df.drop_duplicates('key'), duplicates
+
+# Function to validate schema metadata by column name instead of by row position.
+# Both sides are indexed by normalized column name and merged, then the selected attribute
+# pairs of the matched columns are compared in bulk. Returns the matched column count, the
+# columns missing from the target, the extra target columns, the differing attributes and
+# the names repeated on either side.
+def validate_schema_by_name(source_df, target_df, source_name_position, target_name_position, source_indices, target_indices, source_labels, target_labels):
+    source_index, source_duplicates = name_index(source_df, source_name_position)
+    target_index, target_duplicates = name_index(target_df, target_name_position)
+    merged = source_index.merge(target_index, on='key', how='outer', suffixes=('_source', '_target'), indicator=True, sort=False)
+    matched = merged[merged['_merge'] == 'both']
+    aligned_source = source_df.iloc[matched['row_source'].to_numpy(dtype=np.int64)].reset_index(drop=True)
+    aligned_target = target_df.iloc[matched['row_target'].to_numpy(dtype=np.int64)].reset_index(drop=True)
+    comparisons, _ = compare_columns(aligned_source, aligned_target, source_indices, target_indices)
+    differences_df = mismatches_to_frame(aligned_source, aligned_target, comparisons, source_labels, target_labels)
+    differences_df.insert(0, 'column_name', matched['name_source'].to_numpy()[differences_df['row_index'].to_numpy(dtype=np.int64)])
+    return {
+        'matched': len(matched),
+        'missing': merged.loc[merged['_merge'] == 'left_only', 'name_source'].tolist(),
+        'extra': merged.loc[merged['_merge'] == 'right_only', 'name_target'].tolist(),
+        'differences': differences_df[DIFFERENCE_COLUMNS],
+        'duplicates': source_duplicates + target_duplicates
+    }
+
+# Metadata attributes selected on both sides, TABLE_SCHEMA and TABLE_NAME must stay first
+METADATA_COLUMNS = [
+    'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME', 'ORDINAL_POSITION', 'DATA_TYPE', 'IS_NULLABLE',
+    'CHARACTER_MAXIMUM_LENGTH', 'NUMERIC_PRECISION', 'NUMERIC_SCALE'
+]
+
+# Position of the column name in METADATA_COLUMNS, columns are matched by it
+COLUMN_NAME_POSITION = 2
+
+# Attributes compared when none are selected
+DEFAULT_ATTRIBUTES = ['DATA_TYPE', 'IS_NULLABLE']
+
+# SQL Server accepts at most 2100 parameters per statement, longer table lists are split
+MSSQL_MAX_PARAMS = 2000
+
+SUMMARY_COLUMNS = ['source_table', 'target_table', 'status', 'source_columns', 'target_columns', 'missing_columns', 'extra_columns', 'mismatches']
+
+# Function to build the bulk metadata query of one side.
+# placeholder is the parameter marker of the driver ('?' for pyodbc, '%s' for Snowflake).
+def metadata_query(placeholder, schema=None, table_count=0):
+    query = f"SELECT {', '.join(METADATA_COLUMNS)} FROM INFORMATION_SCHEMA.COLUMNS WHERE 1 = 1"
+    if schema:
+        query += f" AND UPPER(TABLE_SCHEMA) = UPPER({placeholder})"
+    if table_count:
+        query += f" AND UPPER(TABLE_NAME) IN ({', '.join(['UPPER(' + placeholder + ')'] * table_count)})"
+    return query + " ORDER BY TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION"
+
+# Function to group metadata rows by (schema, table), keeping the ordinal order of each table.
+# Tables of the same name in different schemas stay apart.
+def group_by_table(rows):
+    metadata = {}
+    for row in rows:
+        metadata.setdefault((row[0], row[1]), []).append(list(row))
+    return metadata
+
+# Function to name the (schema, table) keys of one side for display as {key: name}. A table is
+# named by its table name, unless the side has a table of the same name in another schema; then
+# both are qualified with their schema.
+def table_labels(keys):
+    counts = Counter(table.upper() for _, table in keys)
+    return {(schema, table): (f"{schema}.{table}" if counts[table.upper()] > 1 else table) for schema, table in keys}
+
+# Function to fetch the column metadata of a whole MSSQL schema, or of a list of tables, as
+# {(schema, table): rows}
+def get_mssql_schema_metadata(mssql_conn, schema=None, tables=None):
+    tables = list(tables or [])
+    chunks = [tables[start:start + MSSQL_MAX_PARAMS] for start in range(0, len(tables), MSSQL_MAX_PARAMS)] or [[]]
+    cursor = mssql_conn.cursor()
+    try:
+        rows = []
+        for chunk in chunks:
+            params = ([schema] if schema else []) + chunk
+            cursor.execute(metadata_query('?', schema, len(chunk)), *params)
+            rows.extend(cursor.fetchall())
+    finally:
+        cursor.close()
+    return group_by_table(rows)
+
+# Function to fetch the column metadata of a whole Snowflake schema, or of a list of tables, as
+# {(schema, table): rows}. INFORMATION_SCHEMA covers the database of the connection.
+def get_snowflake_schema_metadata(snowflake_conn, schema=None, tables=None):
+    tables = list(tables or [])
+    params = ([schema] if schema else []) + tables
+    cursor = snowflake_conn.cursor()
+    try:
+        cursor.execute(metadata_query('%s', schema, len(tables)), params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return group_by_table(rows)
+
+# Function to pair the (schema, table) keys of both sides by case insensitive name. A table pairs
+# with the table of the same name in its mapped schema: schema_map maps MSSQL schemas to
+# Snowflake schemas, other schemas map to the schema of the same name. A table left over then
+# pairs on its bare name when no other left over table of either side has that name, so
+# dbo.Orders still pairs with PUBLIC.ORDERS. Returns the pairs plus the keys only found on one side.
+def pair_tables(mssql_keys, snowflake_keys, schema_map=None):
+    schema_map = {schema.upper(): target.upper() for schema, target in (schema_map or {}).items()}
+    snowflake_by_name = {(schema.upper(), table.upper()): (schema, table) for schema, table in snowflake_keys}
+    pairs = []
+    for schema, table in mssql_keys:
+        match = snowflake_by_name.get((schema_map.get(schema.upper(), schema.upper()), table.upper()))
+        if match is not None:
+            pairs.append(((schema, table), match))
+    mssql_left = [key for key in mssql_keys if key not in {pair[0] for pair in pairs}]
+    snowflake_left = [key for key in snowflake_keys if key not in {pair[1] for pair in pairs}]
+    mssql_counts = Counter(table.upper() for _, table in mssql_left)
+    snowflake_counts = Counter(table.upper() for _, table in snowflake_left)
+    snowflake_by_table = {table.upper(): (schema, table) for schema, table in snowflake_left if snowflake_counts[table.upper()] == 1}
+    for schema, table in mssql_left:
+        if mssql_counts[table.upper()] == 1 and table.upper() in snowflake_by_table:
+            pairs.append(((schema, table), snowflake_by_table[table.upper()]))
+    paired_mssql = {pair[0] for pair in pairs}
+    paired_snowflake = {pair[1] for pair in pairs}
+    mssql_only = [key for key in mssql_keys if key not in paired_mssql]
+    snowflake_only = [key for key in snowflake_keys if key not in paired_snowflake]
+    return pairs, mssql_only, snowflake_only
+
+# Function to build the schema map of a run over one MSSQL and one Snowflake schema
+def schema_map_of(mssql_schema, snowflake_schema):
+    return {mssql_schema: snowflake_schema} if mssql_schema and snowflake_schema else None
+
+# Function to validate the column metadata of every table pair in one pass.
+# Tables are paired with pair_tables, columns are matched by name. Returns a summary with one
+# row per table and a frame with every differing attribute and every missing or extra column.
+def validate_schemas(mssql_metadata, snowflake_metadata, attributes=None, schema_map=None):
+    attributes = [attribute for attribute in (attributes or DEFAULT_ATTRIBUTES) if attribute != 'COLUMN_NAME']
+    indices = [METADATA_COLUMNS.index(attribute) for attribute in attributes]
+    mssql_tables = table_labels(mssql_metadata)
+    snowflake_tables = table_labels(snowflake_metadata)
+    pairs, mssql_only, snowflake_only = pair_tables(sorted(mssql_metadata), sorted(snowflake_metadata), schema_map)
+    summary = []
+    difference_frames = []
+    for src_key, tgt_key in pairs:
+        src_table, tgt_table = mssql_tables[src_key], snowflake_tables[tgt_key]
+        source_df = rows_to_frame(mssql_metadata[src_key], METADATA_COLUMNS)
+        target_df = rows_to_frame(snowflake_metadata[tgt_key], METADATA_COLUMNS)
+        results = validate_schema_by_name(source_df, target_df, COLUMN_NAME_POSITION, COLUMN_NAME_POSITION, indices, indices, attributes, attributes)
+        differences_df = pd.concat([
+            results['differences'],
+            pd.DataFrame({'column_name': results['missing'], 'source_column': 'COLUMN_NAME', 'target_column': 'COLUMN_NAME', 'source_value': results['missing'], 'target_value': 'missing in Snowflake'}),
+            pd.DataFrame({'column_name': results['extra'], 'source_column': 'COLUMN_NAME', 'target_column': 'COLUMN_NAME', 'source_value': 'missing in MSSQL', 'target_value': results['extra']})
+        ], ignore_index=True)
+        if len(differences_df):
+            differences_df.insert(0, 'target_table', tgt_table)
+            differences_df.insert(0, 'source_table', src_table)
+            difference_frames.append(differences_df)
+        summary.append([src_table, tgt_table, 'mismatch' if len(differences_df) else 'match', len(source_df), len(target_df),
+                        len(results['missing']), len(results['extra']), len(results['differences'])])
+    for key in mssql_only:
+        summary.append([mssql_tables[key], None, 'missing in Snowflake', len(mssql_metadata[key]), 0, 0, 0, 0])
+    for key in snowflake_only:
+        summary.append([None, snowflake_tables[key], 'missing in MSSQL', 0, len(snowflake_metadata[key]), 0, 0, 0])
+    summary_df = pd.DataFrame(summary, columns=SUMMARY_COLUMNS)
+    if difference_frames:
+        differences_df = pd.concat(difference_frames, ignore_index=True)
+    else:
+        differences_df = pd.DataFrame(columns=['source_table', 'target_table'] + DIFFERENCE_COLUMNS)
+    return summary_df, differences_df
+
+# Function to fetch both sides in bulk and validate every table pair
+def validate_schema_bulk(mssql_conn, snowflake_conn, mssql_schema=None, snowflake_schema=None, tables=None, attributes=None):
+    mssql_metadata = get_mssql_schema_metadata(mssql_conn, mssql_schema, tables)
+    snowflake_metadata = get_snowflake_schema_metadata(snowflake_conn, snowflake_schema, tables)
+    return validate_schemas(mssql_metadata, snowflake_metadata, attributes, schema_map_of(mssql_schema, snowflake_schema))
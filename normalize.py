@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from timing import span
+
+# Value normalization shared by every comparison.
+# A cell is compared as the lower cased text before its first '(' (so VARCHAR(10) equals varchar),
+# then mapped through the value rules (yes -> y, true -> 1, ...). The rules are compiled once into
+# Arrow lookup arrays and can be changed from the [normalization] section of config.toml.
+# Low cardinality columns such as data types and Y/N flags are normalized once per distinct value.
+# Nothing in here touches Streamlit.
+
+DEFAULT_VALUE_RULES = {
+    "no": "n",
+    "yes": "y",
+    "true": "1",
+    "false": "0",
+    "numeric": "number"
+}
+
+# Number of leading values looked at to decide whether a column is low cardinality
+MEMO_SAMPLE_SIZE = 1024
+# A column is normalized per distinct value when the sample has at most this share of distinct values
+MEMO_MAX_DISTINCT_RATIO = 0.5
+# Bound on the number of single values remembered by normalize_value
+MAX_CACHED_VALUES = 100000
+
+class NormalizationRules:
+    def __init__(self, value_rules=None, strip_precision=True, lowercase=True):
+        self.value_rules = {str(key).lower() if lowercase else str(key): str(value) for key, value in (DEFAULT_VALUE_RULES if value_rules is None else value_rules).items()}
+        self.strip_precision = strip_precision
+        self.lowercase = lowercase
+        self.rule_keys = pa.array(list(self.value_rules), type=pa.string())
+        self.rule_values = pa.array(list(self.value_rules.values()), type=pa.string())
+        self.cache = {}
+
+    # Normalize one text value, results are remembered
+    def normalize_text_value(self, value_str):
+        normalized_value = self.cache.get(value_str)
+        if normalized_value is None:
+            normalized_value = value_str
+            if self.strip_precision:
+                normalized_value = normalized_value.split('(')[0]
+            if self.lowercase:
+                normalized_value = normalized_value.lower()
+            normalized_value = self.value_rules.get(normalized_value, normalized_value)
+            if len(self.cache) >= MAX_CACHED_VALUES:
+                self.cache.clear()
+            self.cache[value_str] = normalized_value
+        return normalized_value
+
+    # Normalize a whole Arrow string array, the value rules are applied in one lookup
+    def normalize_text(self, text):
+        if self.strip_precision:
+            text = pc.replace_substring_regex(text, pattern=r"(?s)\(.*", replacement="")
+        if self.lowercase:
+            text = pc.utf8_lower(text)
+        if len(self.rule_keys):
+            positions = pc.index_in(text, value_set=self.rule_keys)
+            text = pc.coalesce(pc.take(self.rule_values, positions), text)
+        return text
+
+rules = NormalizationRules()
+
+# Function to replace the normalization rules from the [normalization] section of config.toml.
+# The value rules are added to the defaults unless replace_default_values is set.
+def configure(settings):
+    global rules
+    value_rules = {} if settings.get('replace_default_values') else dict(DEFAULT_VALUE_RULES)
+    value_rules.update(settings.get('values', {}))
+    rules = NormalizationRules(value_rules, settings.get('strip_precision', True), settings.get('lowercase', True))
+    return rules
+
+def normalize_value(value):
+    value_str = str(value).lower()
+    return rules.value_rules.get(value_str, value_str)
+
+def strip_precision(data_type):
+        return data_type.split('(')[0] if '(' in data_type else data_type
+
+# Function to convert a whole column to text, matching str(value) for every cell.
+# String and integer columns are converted by Arrow, anything else falls back to str().
+def column_to_text(values):
+    values = np.asarray(values, dtype=object)
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    text = None
+    try:
+        if kind in ('string', 'empty'):
+            text = pa.array(values, type=pa.string())
+        elif kind in ('integer', 'boolean'):
+            text = pc.cast(pa.array(values), pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        text = None
+    if text is None:
+        text = pa.array([str(value) for value in values], type=pa.string())
+    return pc.fill_null(text, "None")
+
+# Function to check on a sample whether a text column has few distinct values
+def is_low_cardinality(text):
+    sample = text.slice(0, MEMO_SAMPLE_SIZE)
+    return len(sample) > 1 and len(pc.unique(sample)) <= len(sample) * MEMO_MAX_DISTINCT_RATIO
+
+# Function to normalize a whole column at once.
+# Gives the same result as rules.normalize_text_value(str(value)) on every cell. Low cardinality columns are
+# dictionary encoded and only their distinct values are normalized.
+def normalize_column(values):
+    with span('normalize', rows=len(values)):
+        text = column_to_text(values)
+        if is_low_cardinality(text):
+            encoded = pc.dictionary_encode(text)
+            return pc.take(rules.normalize_text(encoded.dictionary), encoded.indices)
+        return rules.normalize_text(text)
+
+# Function to normalize a whole key column. Keys are matched exactly, only surrounding blanks are
+# dropped, so keys such as ABC(1) and abc(2) stay apart
+def normalize_key_column(values):
+    with span('normalize', rows=len(values)):
+        return pc.utf8_trim_whitespace(column_to_text(values))
+
+# Function to normalize a pandas Series, the bulk variant for callers working with frames
+def normalize_series(series):
+    return pd.Series(normalize_column(series.to_numpy(dtype=object)).to_numpy(zero_copy_only=False), index=series.index, name=series.name, dtype=object)
@@ -0,0 +1,219 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from compare import DEFAULT_MAX_EXAMPLES, validate_data_batches
+from connections import OPENERS, close_quietly
+from extract import DEFAULT_BATCH_SIZE, get_mssql_columns, get_snowflake_columns, iter_mssql_batches, iter_snowflake_arrow_batches
+from timing import current_span
+
+# Runs many table validations at once.
+# MSSQL and Snowflake extractions run in two separate thread pools, so the size of each pool is
+# the number of queries that database sees at the same time. Both sides of a job stream their
+# batches through small bounded queues into a comparison thread, which compares them as they
+# arrive, so a job holds a few batches and never a whole table. Results are handed back as soon
+# as a job finishes, so a batch of tables takes about as long as its slowest tables. Jobs start
+# in the same order in every pool, so the oldest unfinished job always has both of its sides
+# and its comparison running. Nothing in here touches Streamlit.
+
+# Default number of concurrent queries per database
+DEFAULT_MSSQL_WORKERS = 4
+DEFAULT_SNOWFLAKE_WORKERS = 4
+
+# Batches a side may fetch ahead of its comparison
+QUEUE_BATCHES = 2
+# Seconds between two checks whether the other end of a stream gave up
+POLL_SECONDS = 0.5
+
+# Marks the end of the batches of a side
+END_OF_STREAM = object()
+
+# Each worker thread opens its own connection, pyodbc connections must not be shared between
+# threads. The connections are closed when the run ends.
+class WorkerConnections:
+    def __init__(self, kind, config):
+        self.kind = kind
+        self.config = config
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = OPENERS[self.kind](self.config)
+            self.local.conn = conn
+            with self.lock:
+                self.opened.append(conn)
+        return conn
+
+    def close_all(self):
+        with self.lock:
+            opened, self.opened = self.opened, []
+        for conn in opened:
+            close_quietly(conn)
+
+# One side of a job on its way from the fetching thread to the comparison thread: the column
+# names, then the batches, then END_OF_STREAM, or an exception instead. Either end can close
+# the stream, the other end then stops waiting.
+class SideStream:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self.closed = threading.Event()
+        self.fetch_seconds = 0.0
+        # Time the fetching side waited for room and the comparison waited for a batch
+        self.put_seconds = 0.0
+        self.get_seconds = 0.0
+
+    # Hand over one item, False when the stream was closed meanwhile
+    def put(self, item):
+        started = time.perf_counter()
+        try:
+            while not self.closed.is_set():
+                try:
+                    self.queue.put(item, timeout=POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.put_seconds += time.perf_counter() - started
+
+    # Take the next item, raising the error of the fetching side
+    def get(self):
+        started = time.perf_counter()
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=POLL_SECONDS)
+                    break
+                except queue.Empty:
+                    if self.closed.is_set():
+                        raise RuntimeError("The run was stopped.")
+        finally:
+            self.get_seconds += time.perf_counter() - started
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    # Read the batches up to the end of the stream
+    def batches(self):
+        while True:
+            item = self.get()
+            if item is END_OF_STREAM:
+                return
+            yield item
+
+    def close(self):
+        self.closed.set()
+
+# Function to submit a task that records its spans on the timed run of the caller. Each task
+# runs in its own copy of the caller's context; tasks run side by side, so their spans are not
+# nested in the caller's span.
+def submit_in_context(executor, fn, *args):
+    context = contextvars.copy_context()
+    context.run(current_span.set, None)
+    return executor.submit(context.run, fn, *args)
+
+# Function to build a job, columns default to all columns of the table and the row limit of
+# the job overrides the one of the run
+def make_job(source_table, target_table, source_columns=None, target_columns=None, row_limit=None):
+    return {
+        'source_table': source_table,
+        'target_table': target_table,
+        'source_columns': list(source_columns) if source_columns else None,
+        'target_columns': list(target_columns) if target_columns else None,
+        'row_limit': row_limit
+    }
+
+# Function to start fetching one MSSQL table, returns the column names and the batch generator
+def fetch_mssql(connections, table_name, columns, batch_size):
+    mssql_conn = connections.get()
+    columns = columns or get_mssql_columns(mssql_conn, table_name)
+    return columns, iter_mssql_batches(mssql_conn, table_name, batch_size, columns)
+
+# Function to start fetching one Snowflake table, returns the column names and the Arrow batch generator
+def fetch_snowflake(connections, table_name, columns, row_limit):
+    snowflake_conn = connections.get()
+    columns = columns or get_snowflake_columns(snowflake_conn, table_name)
+    return columns, iter_snowflake_arrow_batches(snowflake_conn, table_name, row_limit, columns)
+
+# Function to fetch one side of a job into its stream. The time spent waiting for the
+# comparison to take a batch is not counted as fetch time.
+def stream_side(stream, fetch, *args):
+    started = time.perf_counter()
+    batches = None
+    try:
+        columns, batches = fetch(*args)
+        finished = stream.put(columns) and all(stream.put(batch) for batch in batches)
+    except Exception as e:
+        stream.fetch_seconds = time.perf_counter() - started
+        stream.put(e)
+        return
+    finally:
+        if batches is not None:
+            batches.close()
+    stream.fetch_seconds = time.perf_counter() - started - stream.put_seconds
+    if finished:
+        stream.put(END_OF_STREAM)
+
+# Function to compare the two sides of a job while they are being fetched
+def compare_job(job, source, target, max_examples=DEFAULT_MAX_EXAMPLES, row_limit=None):
+    started = time.perf_counter()
+    try:
+        source_columns = source.get()
+        target_columns = target.get()
+        if len(source_columns) != len(target_columns):
+            raise ValueError(f"{job['source_table']} has {len(source_columns)} columns and {job['target_table']} has {len(target_columns)}, select the columns to compare.")
+        results = validate_data_batches(source.batches(), target.batches(), source_columns, target_columns, max_examples, row_limit)
+    finally:
+        # Stops a side that is still fetching rows the comparison no longer needs
+        source.close()
+        target.close()
+    results['timings'] = {
+        'mssql_fetch': source.fetch_seconds,
+        'snowflake_fetch': target.fetch_seconds,
+        'compare': time.perf_counter() - started - source.get_seconds - target.get_seconds
+    }
+    return results
+
+# Function to run a list of validation jobs and yield (job index, job, results) as each job
+# finishes. A failing job yields its exception in results['error'] and does not stop the others.
+def run_jobs(jobs, mssql_config, snowflake_config, mssql_workers=DEFAULT_MSSQL_WORKERS,
+             snowflake_workers=DEFAULT_SNOWFLAKE_WORKERS, batch_size=DEFAULT_BATCH_SIZE, row_limit=None,
+             max_examples=DEFAULT_MAX_EXAMPLES):
+    mssql_connections = WorkerConnections('mssql', mssql_config)
+    snowflake_connections = WorkerConnections('snowflake', snowflake_config)
+    mssql_pool = ThreadPoolExecutor(max_workers=mssql_workers, thread_name_prefix='mssql')
+    snowflake_pool = ThreadPoolExecutor(max_workers=snowflake_workers, thread_name_prefix='snowflake')
+    # At most this many jobs fetch at the same time, each of them needs its comparison running
+    compare_pool = ThreadPoolExecutor(max_workers=max(mssql_workers, snowflake_workers), thread_name_prefix='compare')
+    streams = []
+    try:
+        futures = {}
+        for idx, job in enumerate(jobs):
+            source, target = SideStream(), SideStream()
+            streams.extend([source, target])
+            job_limit = job.get('row_limit') or row_limit
+            submit_in_context(mssql_pool, stream_side, source, fetch_mssql, mssql_connections, job['source_table'], job['source_columns'], batch_size)
+            submit_in_context(snowflake_pool, stream_side, target, fetch_snowflake, snowflake_connections, job['target_table'], job['target_columns'], job_limit)
+            futures[submit_in_context(compare_pool, compare_job, job, source, target, max_examples, job_limit)] = idx
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                results = {'error': e}
+            yield idx, jobs[idx], results
+    finally:
+        # Jobs that have not started are dropped when the caller stops early, running ones stop
+        # at their next batch
+        for stream in streams:
+            stream.close()
+        compare_pool.shutdown(wait=True, cancel_futures=True)
+        mssql_pool.shutdown(wait=True, cancel_futures=True)
+        snowflake_pool.shutdown(wait=True, cancel_futures=True)
+        mssql_connections.close_all()
+        snowflake_connections.close_all()
@@ -0,0 +1,192 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import normalize
+from compare import DEFAULT_MAX_EXAMPLES, KEY_COLUMN, batch_to_frame, compare_keyed_frames, frame_keys, merge_partition_results, value_column_pairs
+from timing import current_timer, span
+
+# Key based validation spread over several processes.
+# Both extracts are cut into partitions by a hash of their normalized key, so the rows of a key
+# always land in the same partition on both sides. The partitions are written as Arrow IPC files
+# to a temporary directory and each worker process memory maps its pair of files, compares it
+# with the bulk column comparison and sends back only its counters and mismatch examples. The
+# parent holds one fetched batch at a time, so memory follows the batch size and the partition
+# size. Batches of one side may come with different column types (an all NULL first batch, int
+# then float, decimals of different scales); each type gets its own files and the files of a
+# partition are brought to one schema when they are read. Nothing in here touches Streamlit.
+
+# Default number of worker processes
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Partitions per worker, more partitions than workers keep every core busy until the end
+PARTITIONS_PER_WORKER = 4
+
+# Function to tell whether typing a column would change the text of some of its values: Arrow
+# turns the ints among floats into floats and pads decimals to the largest scale
+def changes_text(values):
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == 'mixed-integer-float':
+        return True
+    if kind == 'decimal':
+        return len({value.as_tuple().exponent for value in values if value is not None}) > 1
+    return False
+
+# Function to turn one fetched batch into an Arrow table. Row batches are converted column by
+# column, a column Arrow can not type (mixed or driver specific values) is kept as text.
+def batch_to_arrow(batch, column_names):
+    if isinstance(batch, pa.Table):
+        return batch.rename_columns(column_names)
+    arrays = []
+    for position in range(len(column_names)):
+        values = [row[position] for row in batch]
+        try:
+            if changes_text(values):
+                raise pa.ArrowTypeError('values of mixed types')
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            arrays.append(pa.array([None if value is None else str(value) for value in values], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=column_names)
+
+# Function to build the normalized key text of every row of a table, the same text
+# validate_data_by_key matches on
+def key_text(table, key_positions):
+    return frame_keys(batch_to_frame(table.select(key_positions), [str(position) for position in key_positions]), range(len(key_positions)))
+
+# Function to turn one fetched batch into an Arrow table with the key column appended. The key
+# is built from the values of this batch, so it does not depend on the types of other batches.
+def keyed_table(batch, column_names, key_positions):
+    table = batch_to_arrow(batch, column_names)
+    return table.append_column(KEY_COLUMN, key_text(table, key_positions))
+
+# Function to choose the one type of a column that came in with several types. All NULL batches
+# take the type of the others; types that really differ become text, which is what the values
+# are compared as, so int and float or decimals of different scales keep their exact str() text.
+def unified_type(types):
+    types = {value_type for value_type in types if value_type != pa.null()}
+    if not types:
+        return pa.null()
+    if len(types) == 1:
+        return types.pop()
+    return pa.string()
+
+# Function to build the schema that the tables of one side can all be brought to
+def unified_schema(schemas):
+    return pa.schema([pa.field(fields[0].name, unified_type([field.type for field in fields])) for fields in zip(*schemas)])
+
+# Function to bring a table to a unified schema
+def conform_table(table, schema):
+    if table.schema == schema:
+        return table
+    columns = []
+    for column, field in zip(table.columns, schema):
+        if column.type == field.type:
+            columns.append(column)
+        elif field.type == pa.string():
+            columns.append(pa.array([None if value is None else str(value) for value in column.to_pylist()], type=pa.string()))
+        else:
+            columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+# Function to bring several tables of one side to a common schema
+def unify_tables(tables):
+    schema = unified_schema([table.schema for table in tables])
+    return [conform_table(table, schema) for table in tables]
+
+# Function to write a stream of batches to Arrow IPC files, one per partition and column types.
+# Returns the file paths of every partition, an empty list for a partition without rows.
+def partition_batches(batches, column_names, key_columns, partitions, directory, prefix):
+    key_positions = [column_names.index(col) for col in key_columns]
+    paths = [[] for _ in range(partitions)]
+    writers = {}
+    schemas = []
+    try:
+        for batch in batches:
+            with span('convert', rows=len(batch)):
+                table = keyed_table(batch, column_names, key_positions)
+                if table.schema not in schemas:
+                    schemas.append(table.schema)
+                segment = schemas.index(table.schema)
+                # hash_array is stable across processes and runs, unlike hash()
+                partition = (pd.util.hash_array(table.column(KEY_COLUMN).to_numpy()) % partitions).astype(np.int64)
+                order = np.argsort(partition, kind='stable')
+                table = table.take(order)
+                offsets = np.concatenate([[0], np.cumsum(np.bincount(partition, minlength=partitions))])
+                for idx in range(partitions):
+                    if offsets[idx] == offsets[idx + 1]:
+                        continue
+                    if (idx, segment) not in writers:
+                        paths[idx].append(os.path.join(directory, f"{prefix}_{idx}_{segment}.arrow"))
+                        writers[(idx, segment)] = pa.ipc.new_file(paths[idx][-1], table.schema)
+                    writers[(idx, segment)].write_table(table.slice(offsets[idx], offsets[idx + 1] - offsets[idx]))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths
+
+# Function to set up a worker process: the normalization rules of the parent and no timed run
+def init_worker(value_rules, strip_precision, lowercase):
+    normalize.rules = normalize.NormalizationRules(value_rules, strip_precision, lowercase)
+    current_timer.set(None)
+
+# Function to turn a table with the key column into a frame, keeping the driver values
+def table_to_frame(table, column_names):
+    frame = table.to_pandas(integer_object_nulls=True, date_as_object=True, timestamp_as_object=True)
+    frame.columns = list(column_names) + [KEY_COLUMN]
+    return frame
+
+# Function to build a frame without rows for a side that has none
+def empty_keyed_frame(column_names):
+    return pd.DataFrame(columns=list(column_names) + [KEY_COLUMN], dtype=object)
+
+# Function to read the files of one partition through a memory map, an empty frame when the
+# partition has no rows on this side
+def read_partition(paths, column_names):
+    if not paths:
+        return empty_keyed_frame(column_names)
+    tables = []
+    for path in paths:
+        with pa.memory_map(path) as source:
+            tables.append(pa.ipc.open_file(source).read_all())
+    return table_to_frame(pa.concat_tables(unify_tables(tables)), column_names)
+
+# Function to compare one pair of partitions in a worker process
+def compare_partition(source_paths, target_paths, source_column_names, target_column_names, value_pairs, max_examples):
+    source_df = read_partition(source_paths, source_column_names)
+    target_df = read_partition(target_paths, target_column_names)
+    return compare_keyed_frames(source_df, target_df, value_pairs, max_examples)
+
+# Function to validate data by key columns on several cores. The batches are lists of rows or
+# Arrow tables like for validate_data_batches. Key columns are matched, the other columns are
+# compared pairwise by position like validate_data_by_key does.
+def validate_data_parallel(source_batches, target_batches, source_column_names, target_column_names,
+                           source_key_columns, target_key_columns, workers=None, partitions=None,
+                           max_examples=DEFAULT_MAX_EXAMPLES, directory=None):
+    if len(source_key_columns) == 0 or len(source_key_columns) != len(target_key_columns):
+        raise ValueError("Select the same number of key columns (at least one) on both sides.")
+    source_column_names, target_column_names = list(source_column_names), list(target_column_names)
+    value_pairs = value_column_pairs(source_column_names, target_column_names, source_key_columns, target_key_columns)
+    workers = workers or DEFAULT_WORKERS
+    partitions = partitions or workers * PARTITIONS_PER_WORKER
+    with tempfile.TemporaryDirectory(prefix='datavalidator_', dir=directory) as temp_dir:
+        source_paths = partition_batches(source_batches, source_column_names, source_key_columns, partitions, temp_dir, 'source')
+        target_paths = partition_batches(target_batches, target_column_names, target_key_columns, partitions, temp_dir, 'target')
+        rules = normalize.rules
+        with span('compare'):
+            # Spawned workers, a forked copy of a multi threaded parent (Streamlit, the connector
+            # threads) can inherit a held lock and hang
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker,
+                                     initargs=(rules.value_rules, rules.strip_precision, rules.lowercase)) as executor:
+                futures = [
+                    executor.submit(compare_partition, source_partition, target_partition, source_column_names, target_column_names, value_pairs, max_examples)
+                    for source_partition, target_partition in zip(source_paths, target_paths)
+                    if source_partition or target_partition
+                ]
+                partition_results = [future.result() for future in futures]
+    merged = merge_partition_results(partition_results, [pair[0] for pair in value_pairs], [pair[1] for pair in value_pairs], list(source_key_columns), max_examples)
+    merged.update({'workers': workers, 'partitions': partitions})
+    return merged
@@ -0,0 +1,93 @@
+import pandas as pd
+
+from checksum import (
+    get_mssql_column_types, get_snowflake_column_types, resolve_column_pairs, canonical_spec,
+    mssql_text, snowflake_text, mssql_hash32, snowflake_hash32, fetch_one
+)
+from extract import mssql_quote, snowflake_quote
+from timing import span
+
+# Column profile validation pushed down to MSSQL and Snowflake.
+# One aggregate query per side returns, for every selected column, its non null count, min,
+# max, sum (numeric and boolean columns) and approximate distinct count. Values are rendered as
+# the same canonical text the checksum uses, so min, max and sum compare exactly; strings are
+# ordered by their UTF-8 bytes on both sides. The distinct counts are HyperLogLog estimates
+# from two different engines and are compared with a relative tolerance. No rows are moved.
+# Nothing in here touches Streamlit.
+
+# Relative difference allowed between the two approximate distinct counts
+DEFAULT_DISTINCT_TOLERANCE = 0.05
+
+PROFILE_METRICS = ['non_null', 'min', 'max', 'sum', 'approx_distinct']
+SUMMABLE_CATEGORIES = ('decimal', 'boolean')
+
+# Function to build the profile aggregates of one column from its canonical text function.
+# Decimal min and max are taken on the numbers, everything else on the text, which sorts the
+# same as the values for dates, timestamps and booleans.
+def profile_expressions(column, spec, text, number_type, hash32):
+    category, scale = spec
+    value = text(column)
+    if category == 'decimal':
+        minimum, maximum = text(f"MIN({column})"), text(f"MAX({column})")
+        total = text(f"SUM(CAST({column} AS {number_type}(38, {scale})))")
+    else:
+        minimum, maximum = f"MIN({value})", f"MAX({value})"
+        total = f"SUM(CAST({value} AS INT))" if category == 'boolean' else 'NULL'
+    return [f"COUNT({column})", minimum, maximum, total, f"APPROX_COUNT_DISTINCT({hash32(value)})"]
+
+# Function to build the MSSQL and Snowflake profile queries for a list of column pairs
+def build_profile_queries(mssql_table_name, snow_table_name, mssql_columns, snowflake_columns, mssql_types, snowflake_types):
+    mssql_select = ["COUNT(*)"]
+    snowflake_select = ["COUNT(*)"]
+    specs = []
+    for src_col, tgt_col in zip(mssql_columns, snowflake_columns):
+        spec = canonical_spec(mssql_types[src_col], snowflake_types[tgt_col])
+        specs.append(spec)
+        mssql_select.extend(profile_expressions(mssql_quote(src_col), spec, lambda expr: mssql_text(expr, spec), 'DECIMAL', mssql_hash32))
+        snowflake_select.extend(profile_expressions(snowflake_quote(tgt_col), spec, lambda expr: snowflake_text(expr, snowflake_types[tgt_col], spec), 'NUMBER', snowflake_hash32))
+    mssql_query = f"SELECT {', '.join(mssql_select)} FROM {mssql_table_name}"
+    snowflake_query = f"SELECT {', '.join(snowflake_select)} FROM {snow_table_name}"
+    return mssql_query, snowflake_query, specs
+
+# Function to tell whether two approximate distinct counts agree within the tolerance
+def distinct_counts_agree(source_count, target_count, tolerance):
+    return abs(source_count - target_count) <= tolerance * max(source_count, target_count, 1)
+
+# Function to put the two profiles side by side, one row per column and metric
+def compare_profiles(mssql_row, snowflake_row, mssql_columns, snowflake_columns, specs, distinct_tolerance=DEFAULT_DISTINCT_TOLERANCE):
+    def as_int(value):
+        return int(value) if value is not None else 0
+    rows = [['(table)', '(table)', 'row_count', as_int(mssql_row[0]), as_int(snowflake_row[0])]]
+    for idx, (src_col, tgt_col, spec) in enumerate(zip(mssql_columns, snowflake_columns, specs)):
+        offset = 1 + idx * len(PROFILE_METRICS)
+        for position, metric in enumerate(PROFILE_METRICS):
+            if metric == 'sum' and spec[0] not in SUMMABLE_CATEGORIES:
+                continue
+            source_value, target_value = mssql_row[offset + position], snowflake_row[offset + position]
+            if metric in ('non_null', 'approx_distinct'):
+                source_value, target_value = as_int(source_value), as_int(target_value)
+            elif metric == 'sum' and spec[0] == 'boolean':
+                source_value, target_value = as_int(source_value), as_int(target_value)
+            rows.append([src_col, tgt_col, metric, source_value, target_value])
+    profile_df = pd.DataFrame(rows, columns=['source_column', 'target_column', 'metric', 'source_value', 'target_value'])
+    profile_df['match'] = [
+        distinct_counts_agree(src, tgt, distinct_tolerance) if metric == 'approx_distinct' else src == tgt
+        for metric, src, tgt in zip(profile_df['metric'], profile_df['source_value'], profile_df['target_value'])
+    ]
+    return profile_df
+
+# Function to validate two tables by column profile. Without a selection the columns default
+# to the ones the two tables share by name.
+def validate_profiles(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name, mssql_columns=None, snowflake_columns=None,
+                      distinct_tolerance=DEFAULT_DISTINCT_TOLERANCE):
+    with span('metadata fetch'):
+        mssql_types = get_mssql_column_types(mssql_conn, mssql_table_name)
+        snowflake_types = get_snowflake_column_types(snowflake_conn, snow_table_name)
+    mssql_columns, snowflake_columns = resolve_column_pairs(mssql_types, snowflake_types, mssql_columns, snowflake_columns)
+    mssql_query, snowflake_query, specs = build_profile_queries(mssql_table_name, snow_table_name, mssql_columns, snowflake_columns, mssql_types, snowflake_types)
+    with span('data fetch', rows=1):
+        mssql_row = fetch_one(mssql_conn, mssql_query)
+    with span('data fetch', rows=1):
+        snowflake_row = fetch_one(snowflake_conn, snowflake_query)
+    with span('compare'):
+        return compare_profiles(mssql_row, snowflake_row, mssql_columns, snowflake_columns, specs, distinct_tolerance)
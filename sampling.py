@@ -0,0 +1,102 @@
+import math
+from statistics import NormalDist
+
+import pandas as pd
+
+from bucket_diff import build_sides, diff_rows, differences_frame, fetch_canonical_rows
+
+# Deterministic sampled validation of an MSSQL and a Snowflake table.
+# A row is in the sample when the 32 bit hash of its canonical key, the same hash the checksum
+# and bucket diff use, falls below a threshold: hash % SAMPLE_MODULUS < threshold. Both databases
+# evaluate the predicate themselves, so they return the same keys and a run with the same
+# fraction always checks the same rows. The sampled rows are compared by key and the mismatch
+# rates are reported with confidence intervals. Nothing in here touches Streamlit.
+
+# Granularity of the sample fraction (one in a million)
+SAMPLE_MODULUS = 1000000
+
+DEFAULT_SAMPLE_FRACTION = 0.01
+DEFAULT_CONFIDENCE = 0.95
+
+ESTIMATE_COLUMNS = ['check', 'sampled_rows', 'differences', 'rate', 'ci_low', 'ci_high', 'estimated_rows']
+
+# Function to turn a sample fraction into the hash threshold, at least one bucket is kept
+def sample_threshold(fraction):
+    if not 0 < fraction <= 1:
+        raise ValueError("The sample fraction must be above 0 and at most 1.")
+    return max(1, min(SAMPLE_MODULUS, round(fraction * SAMPLE_MODULUS)))
+
+# Function to build the WHERE clause that keeps the sampled rows of one side
+def sample_filter(side, threshold):
+    return f" WHERE {side['key_hash']} % {SAMPLE_MODULUS} < {threshold}"
+
+# Function to count the rows of a table
+def count_rows(conn, table_name):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        return int(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+# Function to compute the Wilson score interval of a proportion
+def wilson_interval(successes, trials, confidence=DEFAULT_CONFIDENCE):
+    if trials == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+# Function to build one estimate row, estimated_rows scales the rate to the whole table
+def estimate(check, differences, sampled_rows, table_rows, confidence):
+    ci_low, ci_high = wilson_interval(differences, sampled_rows, confidence)
+    rate = differences / sampled_rows if sampled_rows else 0.0
+    return [check, sampled_rows, differences, rate, ci_low, ci_high, round(rate * table_rows) if table_rows is not None else None]
+
+# Function to estimate the mismatch rates of the whole table from the sample differences.
+# Column rates are taken over the keys found on both sides, the row rates over all sampled keys.
+def estimate_rates(differences_df, source_rows, target_rows, value_columns, table_rows, confidence):
+    sampled_keys = len(source_rows.keys() | target_rows.keys())
+    common_keys = len(source_rows.keys() & target_rows.keys())
+    status_counts = differences_df['status'].value_counts()
+    mismatched = differences_df.loc[differences_df['status'] == 'mismatched', 'columns']
+    column_counts = mismatched.str.split(', ').explode().value_counts()
+    rows = [
+        estimate('any difference', len(differences_df), sampled_keys, table_rows, confidence),
+        estimate('missing in Snowflake', int(status_counts.get('source_only', 0)), sampled_keys, table_rows, confidence),
+        estimate('extra in Snowflake', int(status_counts.get('target_only', 0)), sampled_keys, table_rows, confidence),
+        estimate('mismatched values', int(status_counts.get('mismatched', 0)), common_keys, table_rows, confidence)
+    ]
+    for column in value_columns:
+        rows.append(estimate(f"column {column}", int(column_counts.get(column, 0)), common_keys, table_rows, confidence))
+    return pd.DataFrame(rows, columns=ESTIMATE_COLUMNS)
+
+# Function to validate a deterministic sample of two tables by key.
+# The sample is given as a fraction of the rows or as a target row count; the fraction for a
+# target row count comes from the Snowflake row count. Returns the sample size, the estimated
+# mismatch rates with their confidence intervals and the differing sampled rows.
+def validate_sample(mssql_conn, snowflake_conn, mssql_table_name, snow_table_name,
+                    mssql_key_columns, snowflake_key_columns, mssql_columns=None, snowflake_columns=None,
+                    fraction=None, target_rows=None, confidence=DEFAULT_CONFIDENCE):
+    mssql_side, snowflake_side, value_columns, _ = build_sides(
+        mssql_conn, snowflake_conn, mssql_table_name, snow_table_name,
+        mssql_key_columns, snowflake_key_columns, mssql_columns, snowflake_columns)
+    table_rows = None
+    if target_rows:
+        table_rows = count_rows(snowflake_conn, snow_table_name)
+        fraction = min(1.0, target_rows / table_rows) if table_rows else 1.0
+    threshold = sample_threshold(fraction or DEFAULT_SAMPLE_FRACTION)
+    source_rows = fetch_canonical_rows(mssql_side, sample_filter(mssql_side, threshold))
+    target_rows_sampled = fetch_canonical_rows(snowflake_side, sample_filter(snowflake_side, threshold))
+    differences_df = differences_frame(diff_rows(source_rows, target_rows_sampled, value_columns))
+    return {
+        'fraction': threshold / SAMPLE_MODULUS,
+        'source_rows': len(source_rows),
+        'target_rows': len(target_rows_sampled),
+        'table_rows': table_rows,
+        'estimates': estimate_rates(differences_df, source_rows, target_rows_sampled, value_columns, table_rows, confidence),
+        'differences': differences_df
+    }
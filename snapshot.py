@@ -0,0 +1,388 @@
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from connections import pool
+from extract import DEFAULT_BATCH_SIZE, mssql_quote, snowflake_select
+from parallel_compare import conform_table, unified_schema
+from timing import span
+
+# On disk Parquet snapshots of fetched extracts, so a validation can be repeated without
+# touching either database. A snapshot is keyed by connection, table, projection and predicate
+# and is kept for a configurable number of seconds; the least recently used snapshots are
+# removed when the directory grows past its size limit. Before a snapshot is used the table's
+# last modified time (and row count) is read again and a changed table is fetched anew. When
+# that version cannot be read, for example without the permission on the MSSQL usage stats,
+# only the TTL applies. The snapshot index is a JSON file next to the Parquet files and the
+# cache is shared by all sessions. Nothing in here touches Streamlit.
+
+DEFAULT_SNAPSHOT_DIR = '.snapshots'
+DEFAULT_SNAPSHOT_TTL = 24 * 3600
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+INDEX_FILE = 'index.json'
+
+# Arrow types for the Python types pyodbc reports in cursor.description
+MSSQL_ARROW_TYPES = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bytes: pa.binary(),
+    bytearray: pa.binary(),
+    datetime.datetime: pa.timestamp('us'),
+    datetime.date: pa.date32(),
+    datetime.time: pa.time64('us')
+}
+
+# Arrow types for the Snowflake type codes in cursor.description. NUMBER (FIXED, code 0) is
+# handled by snowflake_arrow_type, semi-structured values are kept as text.
+SNOWFLAKE_ARROW_TYPES = {
+    1: pa.float64(),
+    2: pa.string(),
+    3: pa.date32(),
+    4: pa.timestamp('ns'),
+    6: pa.timestamp('ns', tz='UTC'),
+    7: pa.timestamp('ns', tz='UTC'),
+    8: pa.timestamp('ns'),
+    11: pa.binary(),
+    12: pa.time64('ns'),
+    13: pa.bool_()
+}
+
+# Function to build the Arrow type of one MSSQL result column from its cursor description
+def mssql_arrow_type(description):
+    type_code, precision, scale = description[1], description[4], description[5]
+    if type_code is decimal.Decimal:
+        if precision and precision <= 38:
+            return pa.decimal128(precision, scale or 0)
+        return pa.string()
+    return MSSQL_ARROW_TYPES.get(type_code, pa.string())
+
+# Function to build the Arrow type of one Snowflake result column from its cursor description
+def snowflake_arrow_type(description):
+    type_code, precision, scale = description[1], description[4], description[5]
+    if type_code == 0:
+        if not scale:
+            return pa.int64()
+        return pa.decimal128(precision or 38, scale)
+    return SNOWFLAKE_ARROW_TYPES.get(type_code, pa.string())
+
+# Function to turn a batch of MSSQL rows into an Arrow table with the given schema.
+# Columns without an exact Arrow type (uniqueidentifier, sql_variant, ...) are kept as text.
+def mssql_rows_to_arrow(rows, schema):
+    arrays = []
+    for position, field in enumerate(schema):
+        values = [row[position] for row in rows]
+        if pa.types.is_string(field.type):
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+# Function to stream MSSQL table data as Arrow tables, typed from the cursor description
+def iter_mssql_arrow_batches(mssql_conn, mssql_table_name, batch_size=DEFAULT_BATCH_SIZE, columns=None, filter_clause='', params=()):
+    cursor = mssql_conn.cursor()
+    try:
+        cursor.arraysize = batch_size
+        projection = ', '.join(mssql_quote(col) for col in columns) if columns else '*'
+        with span('data fetch'):
+            cursor.execute(f"SELECT {projection} FROM {mssql_table_name}{filter_clause}", *params)
+        schema = pa.schema([(desc[0], mssql_arrow_type(desc)) for desc in cursor.description])
+        yielded = False
+        while True:
+            with span('data fetch') as record:
+                rows = cursor.fetchmany(batch_size)
+                record['rows'] = len(rows)
+            if not rows and yielded:
+                break
+            with span('convert', rows=len(rows)):
+                batch = mssql_rows_to_arrow(rows, schema)
+            yielded = True
+            yield batch
+            if not rows:
+                break
+    finally:
+        cursor.close()
+
+# Function to stream Snowflake table data as Arrow tables, an empty result still yields one
+# empty table, typed from the cursor description, so the snapshot knows the columns and types
+def iter_snowflake_snapshot_batches(snowflake_conn, snow_table_name, row_limit=None, columns=None, filter_clause='', params=()):
+    cursor = snowflake_conn.cursor()
+    try:
+        with span('data fetch'):
+            cursor.execute(snowflake_select(snow_table_name, columns, row_limit, filter_clause), params or None)
+            batches = cursor.fetch_arrow_batches()
+        description = cursor.description
+        yielded = False
+        while True:
+            with span('data fetch') as record:
+                batch = next(batches, None)
+                if batch is not None:
+                    record['rows'] = batch.num_rows
+                    record['bytes'] = batch.nbytes
+            if batch is None:
+                break
+            yielded = True
+            yield batch
+    finally:
+        cursor.close()
+    if not yielded:
+        yield pa.schema([(desc[0], snowflake_arrow_type(desc)) for desc in description]).empty_table()
+
+# Function to read the version of an MSSQL table: last data change and row count.
+# Returns None when the server does not let us read them.
+def mssql_table_version(mssql_conn, mssql_table_name):
+    query = """SELECT
+        (SELECT MAX(last_user_update) FROM sys.dm_db_index_usage_stats WHERE database_id = DB_ID() AND object_id = OBJECT_ID(?)),
+        (SELECT SUM(row_count) FROM sys.dm_db_partition_stats WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1))"""
+    with span('metadata fetch'):
+        try:
+            cursor = mssql_conn.cursor()
+            try:
+                cursor.execute(query, mssql_table_name, mssql_table_name)
+                last_update, row_count = cursor.fetchone()
+            finally:
+                cursor.close()
+        except Exception:
+            return None
+    if last_update is None and row_count is None:
+        return None
+    return f"{last_update}|{row_count}"
+
+# Function to split a possibly qualified Snowflake table name into database, schema and table,
+# unquoted parts are upper cased like Snowflake resolves them
+def split_snowflake_name(snow_table_name):
+    parts = []
+    for part in snow_table_name.split('.'):
+        part = part.strip()
+        parts.append(part[1:-1].replace('""', '"') if part.startswith('"') and part.endswith('"') else part.upper())
+    parts = [None] * (3 - len(parts)) + parts[-3:]
+    return parts[0], parts[1], parts[2]
+
+# Function to read the version of a Snowflake table: LAST_ALTERED and row count
+def snowflake_table_version(snowflake_conn, snow_table_name):
+    database, schema, table = split_snowflake_name(snow_table_name)
+    information_schema = f'"{database}".INFORMATION_SCHEMA' if database else 'INFORMATION_SCHEMA'
+    query = f"SELECT LAST_ALTERED, ROW_COUNT FROM {information_schema}.TABLES WHERE TABLE_NAME = %s AND TABLE_SCHEMA = COALESCE(%s, CURRENT_SCHEMA())"
+    with span('metadata fetch'):
+        try:
+            cursor = snowflake_conn.cursor()
+            try:
+                cursor.execute(query, (table, schema))
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+        except Exception:
+            return None
+    if row is None:
+        return None
+    return f"{row[0]}|{row[1]}"
+
+# Function to copy the Parquet file written so far to a new temporary file with a wider schema.
+# Returns the new path and its writer, still open for the rest of the batches.
+def widen_parquet(path, schema, prefix):
+    handle, widened_path = tempfile.mkstemp(prefix=prefix, suffix='.parquet.tmp', dir=os.path.dirname(path))
+    os.close(handle)
+    writer = pq.ParquetWriter(widened_path, schema)
+    try:
+        for record_batch in pq.ParquetFile(path).iter_batches():
+            writer.write_table(conform_table(pa.Table.from_batches([record_batch]), schema))
+    except BaseException:
+        writer.close()
+        os.remove(widened_path)
+        raise
+    os.remove(path)
+    return widened_path, writer
+
+# Function to build the snapshot key of an extract
+def snapshot_key(kind, conn, table_name, columns, row_limit, filter_clause, params):
+    parts = [kind, list(pool.key_of(conn)), table_name, columns or '*', row_limit or 0, filter_clause, [str(param) for param in params]]
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+class SnapshotCache:
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR, ttl=DEFAULT_SNAPSHOT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Open readers per snapshot path, and the paths dropped from the index while being read
+        self.readers = {}
+        self.orphans = set()
+
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def load_index(self):
+        if not os.path.exists(self.index_path()):
+            return {}
+        with open(self.index_path()) as f:
+            return json.load(f)
+
+    def save_index(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.index_path() + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(temp_path, self.index_path())
+
+    # Remove the file of an entry, a file that is being read is removed by its last reader
+    # (lock held by caller)
+    def remove_file(self, entry):
+        path = os.path.join(self.directory, entry['file'])
+        if path in self.readers:
+            self.orphans.add(path)
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # Mark a snapshot file as being read, so it is not removed under its reader
+    def acquire(self, path):
+        with self.lock:
+            self.readers[path] = self.readers.get(path, 0) + 1
+
+    def release(self, path):
+        with self.lock:
+            self.readers[path] -= 1
+            if self.readers[path]:
+                return
+            del self.readers[path]
+            if path in self.orphans:
+                self.orphans.discard(path)
+                self.remove_file({'file': os.path.basename(path)})
+
+    # Return the snapshot entry of a key when it is fresh and of the same table version
+    def lookup(self, key, version):
+        with self.lock:
+            index = self.load_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            expired = time.time() - entry['created'] > self.ttl
+            if expired or entry['version'] != version or not os.path.exists(os.path.join(self.directory, entry['file'])):
+                self.remove_file(index.pop(key))
+                self.save_index(index)
+                return None
+            entry['last_used'] = time.time()
+            self.save_index(index)
+        return dict(entry, path=os.path.join(self.directory, entry['file']))
+
+    # Write a stream of Arrow tables to a new snapshot and evict the least recently used
+    # snapshots beyond max_bytes. Every store writes its own uniquely named file, under a
+    # temporary name first, so two sessions storing the same key never write the same file.
+    # Batches of one extract may come with different column types (an all NULL batch, int
+    # then float); each batch is brought to the schema written so far, and when a batch needs
+    # a wider schema the rows written so far are copied to a file of the wider schema.
+    def store(self, key, version, batches, description):
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(prefix=key + '_', suffix='.parquet.tmp', dir=self.directory)
+        os.close(handle)
+        writer = None
+        schema = None
+        rows = 0
+        try:
+            for batch in batches:
+                if writer is None:
+                    schema = batch.schema
+                    writer = pq.ParquetWriter(temp_path, schema)
+                elif batch.schema != schema:
+                    widened = unified_schema([schema, batch.schema])
+                    if widened.types != schema.types:
+                        writer.close()
+                        writer = None
+                        temp_path, writer = widen_parquet(temp_path, widened, key + '_')
+                        schema = widened
+                    batch = conform_table(batch, schema)
+                writer.write_table(batch)
+                rows += batch.num_rows
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            os.remove(temp_path)
+            raise
+        if writer is not None:
+            writer.close()
+        file_name = os.path.basename(temp_path)[:-len('.tmp')]
+        os.replace(temp_path, os.path.join(self.directory, file_name))
+        now = time.time()
+        entry = {
+            'file': file_name,
+            'description': description,
+            'version': version,
+            'columns': pq.read_schema(os.path.join(self.directory, file_name)).names,
+            'rows': rows,
+            'bytes': os.path.getsize(os.path.join(self.directory, file_name)),
+            'created': now,
+            'last_used': now
+        }
+        with self.lock:
+            index = self.load_index()
+            replaced = index.get(key)
+            if replaced is not None and replaced['file'] != file_name:
+                self.remove_file(replaced)
+            index[key] = entry
+            total = sum(item['bytes'] for item in index.values())
+            for old_key in sorted(index, key=lambda item: index[item]['last_used']):
+                if total <= self.max_bytes or old_key == key:
+                    continue
+                total -= index[old_key]['bytes']
+                self.remove_file(index.pop(old_key))
+            self.save_index(index)
+        return dict(entry, path=os.path.join(self.directory, file_name))
+
+    # Remove every snapshot
+    def clear(self):
+        with self.lock:
+            for entry in self.load_index().values():
+                self.remove_file(entry)
+            self.save_index({})
+
+snapshot_cache = SnapshotCache()
+
+# Function to get an MSSQL extract from the snapshot cache, fetching and storing it when there
+# is no fresh snapshot. The returned entry has the Parquet path, columns and rows, and 'hit'.
+def get_mssql_snapshot(mssql_conn, mssql_table_name, columns=None, filter_clause='', params=(), batch_size=DEFAULT_BATCH_SIZE, refresh=False):
+    key = snapshot_key('mssql', mssql_conn, mssql_table_name, columns, None, filter_clause, params)
+    version = mssql_table_version(mssql_conn, mssql_table_name)
+    entry = None if refresh else snapshot_cache.lookup(key, version)
+    if entry is not None:
+        return dict(entry, hit=True)
+    batches = iter_mssql_arrow_batches(mssql_conn, mssql_table_name, batch_size, columns, filter_clause, params)
+    return dict(snapshot_cache.store(key, version, batches, f"mssql {mssql_table_name}"), hit=False)
+
+# Function to get a Snowflake extract from the snapshot cache, like get_mssql_snapshot
+def get_snowflake_snapshot(snowflake_conn, snow_table_name, columns=None, row_limit=None, filter_clause='', params=(), refresh=False):
+    key = snapshot_key('snowflake', snowflake_conn, snow_table_name, columns, row_limit, filter_clause, params)
+    version = snowflake_table_version(snowflake_conn, snow_table_name)
+    entry = None if refresh else snapshot_cache.lookup(key, version)
+    if entry is not None:
+        return dict(entry, hit=True)
+    batches = iter_snowflake_snapshot_batches(snowflake_conn, snow_table_name, row_limit, columns, filter_clause, params)
+    return dict(snapshot_cache.store(key, version, batches, f"snowflake {snow_table_name}"), hit=False)
+
+# Function to stream the selected columns of a snapshot as Arrow tables. The snapshot is not
+# evicted while it is being read.
+def iter_snapshot_batches(path, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+    snapshot_cache.acquire(path)
+    try:
+        record_batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)
+        while True:
+            with span('data fetch') as record:
+                record_batch = next(record_batches, None)
+                if record_batch is not None:
+                    record['rows'] = record_batch.num_rows
+                    record['bytes'] = record_batch.nbytes
+            if record_batch is None:
+                break
+            yield pa.Table.from_batches([record_batch])
+    finally:
+        snapshot_cache.release(path)
@@ -0,0 +1,43 @@
+from timing import span
+
+# Asynchronous Snowflake queries for app_v7.py.
+# A query is submitted with execute_async and only its query id is kept. The caller checks the
+# id once per rerun until the query finished, so it can show the status and elapsed time
+# meanwhile, cancel the query on the warehouse, or pick up the same query again after a rerun
+# instead of starting it anew. Nothing here waits on the query, a check returns at once. The
+# connector reports the query status (queued, running, resuming warehouse, ...) but no
+# percentage. Nothing in here touches Streamlit.
+
+# Seconds between two status checks of a running query
+POLL_INTERVAL = 1.0
+
+# Function to start a query and return its query id without waiting for it
+def submit_query(snowflake_conn, query, params=None):
+    cursor = snowflake_conn.cursor()
+    try:
+        cursor.execute_async(query, params)
+        return cursor.sfqid
+    finally:
+        cursor.close()
+
+# Function to check the status of a query once. Returns whether it is still running and the
+# status name, raises the query's error when it failed.
+def check_query(snowflake_conn, query_id):
+    with span('data fetch'):
+        status = snowflake_conn.get_query_status_throw_if_error(query_id)
+    return snowflake_conn.is_still_running(status), status.name
+
+# Function to open a cursor on the results of a finished query
+def fetch_query_results(snowflake_conn, query_id):
+    cursor = snowflake_conn.cursor()
+    cursor.get_results_from_sfqid(query_id)
+    return cursor
+
+# Function to cancel a running query on the warehouse
+def cancel_query(snowflake_conn, query_id):
+    cursor = snowflake_conn.cursor()
+    try:
+        cursor.execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (query_id,))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
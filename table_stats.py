@@ -0,0 +1,180 @@
+import pandas as pd
+
+from extract import split_mssql_name
+from metadata import MSSQL_MAX_PARAMS, pair_tables, schema_map_of, table_labels
+from snapshot import split_snowflake_name
+from timing import span
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Row counts and sizes of whole schemas read from catalog statistics instead of COUNT(*).
+# MSSQL reads sys.dm_db_partition_stats (falling back to sys.partitions, which has no sizes,
+# without VIEW DATABASE STATE) and Snowflake reads INFORMATION_SCHEMA.TABLES, one query per side
+# for a whole schema. Tables are keyed by (schema, table), so same-named tables of different
+# schemas stay apart. The counts are the ones the engines maintain for their optimizers and are
+# exact once no transaction is writing to the table. The data fetch uses them to size batches
+# and to warn before a pull that will not fit in memory. Nothing in here touches Streamlit.
+
+STATS_COLUMNS = ['source_table', 'target_table', 'status', 'source_rows', 'target_rows', 'row_difference', 'source_bytes', 'target_bytes']
+
+# Rough factor from stored bytes to the memory of the fetched Python rows. Snowflake stores
+# compressed columns, so its factor is larger.
+MEMORY_FACTORS = {'mssql': 3, 'snowflake': 10}
+# Memory one fetched batch should take
+TARGET_BATCH_BYTES = 64 * 1024 ** 2
+MIN_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 500000
+# Share of the available memory a single fetch may take before it is flagged
+MEMORY_HEADROOM = 0.5
+
+# Function to build the MSSQL statistics query, with or without the size columns. With
+# current_schema and no schema only the default schema of the user is read.
+def mssql_stats_query(schema=None, table_count=0, with_sizes=True, database=None, current_schema=False):
+    catalog = f"[{database.replace(']', ']]')}].sys" if database else 'sys'
+    if with_sizes:
+        query = ("SELECT s.name, t.name, SUM(CASE WHEN p.index_id IN (0, 1) THEN p.row_count ELSE 0 END), SUM(p.reserved_page_count) * 8192 "
+                 f"FROM {catalog}.tables t JOIN {catalog}.schemas s ON s.schema_id = t.schema_id "
+                 f"JOIN {catalog}.dm_db_partition_stats p ON p.object_id = t.object_id WHERE 1 = 1")
+    else:
+        query = ("SELECT s.name, t.name, SUM(CASE WHEN p.index_id IN (0, 1) THEN p.rows ELSE 0 END), NULL "
+                 f"FROM {catalog}.tables t JOIN {catalog}.schemas s ON s.schema_id = t.schema_id "
+                 f"JOIN {catalog}.partitions p ON p.object_id = t.object_id WHERE 1 = 1")
+    if schema:
+        query += " AND UPPER(s.name) = UPPER(?)"
+    elif current_schema:
+        query += " AND s.name = SCHEMA_NAME()"
+    if table_count:
+        query += f" AND UPPER(t.name) IN ({', '.join(['UPPER(?)'] * table_count)})"
+    return query + " GROUP BY s.name, t.name"
+
+# Function to turn statistics rows into {(schema, table): (rows, bytes)}
+def stats_by_table(rows):
+    return {(row[0], row[1]): (int(row[2] or 0), int(row[3]) if row[3] is not None else None) for row in rows}
+
+# Function to read the row counts and sizes of a whole MSSQL schema, or of a list of tables,
+# as {(schema, table): (rows, bytes)}. Sizes are None without the permission to read partition
+# stats.
+def get_mssql_table_stats(mssql_conn, schema=None, tables=None, database=None, current_schema=False):
+    tables = list(tables or [])
+    chunks = [tables[start:start + MSSQL_MAX_PARAMS] for start in range(0, len(tables), MSSQL_MAX_PARAMS)] or [[]]
+    with span('metadata fetch') as record:
+        cursor = mssql_conn.cursor()
+        try:
+            rows = []
+            for chunk in chunks:
+                params = ([schema] if schema else []) + chunk
+                try:
+                    cursor.execute(mssql_stats_query(schema, len(chunk), True, database, current_schema), *params)
+                except Exception:
+                    cursor.execute(mssql_stats_query(schema, len(chunk), False, database, current_schema), *params)
+                rows.extend(cursor.fetchall())
+        finally:
+            cursor.close()
+        record['rows'] = len(rows)
+    return stats_by_table(rows)
+
+# Function to read the row counts and sizes of a whole Snowflake schema, or of a list of tables,
+# as {(schema, table): (rows, bytes)}. Without a database INFORMATION_SCHEMA covers the one of
+# the connection, with current_schema and no schema only the schema of the connection is read.
+def get_snowflake_table_stats(snowflake_conn, schema=None, tables=None, database=None, current_schema=False):
+    tables = list(tables or [])
+    information_schema = f'"{database}".INFORMATION_SCHEMA' if database else 'INFORMATION_SCHEMA'
+    query = f"SELECT TABLE_SCHEMA, TABLE_NAME, ROW_COUNT, BYTES FROM {information_schema}.TABLES WHERE TABLE_TYPE = 'BASE TABLE'"
+    if schema:
+        query += " AND UPPER(TABLE_SCHEMA) = UPPER(%s)"
+    elif current_schema:
+        query += " AND TABLE_SCHEMA = CURRENT_SCHEMA()"
+    if tables:
+        query += f" AND UPPER(TABLE_NAME) IN ({', '.join(['UPPER(%s)'] * len(tables))})"
+    with span('metadata fetch') as record:
+        cursor = snowflake_conn.cursor()
+        try:
+            cursor.execute(query, ([schema] if schema else []) + tables)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        record['rows'] = len(rows)
+    return stats_by_table(rows)
+
+# Function to compare the statistics of both sides, one row per table. Tables are paired with
+# pair_tables and shown by name, qualified with their schema where a side has the name in several
+# schemas. Sizes are shown but not compared, the two engines store rows differently.
+def compare_table_stats(mssql_stats, snowflake_stats, schema_map=None):
+    mssql_tables = table_labels(mssql_stats)
+    snowflake_tables = table_labels(snowflake_stats)
+    pairs, mssql_only, snowflake_only = pair_tables(sorted(mssql_stats), sorted(snowflake_stats), schema_map)
+    rows = []
+    for src_key, tgt_key in pairs:
+        (source_rows, source_bytes), (target_rows, target_bytes) = mssql_stats[src_key], snowflake_stats[tgt_key]
+        status = 'match' if source_rows == target_rows else 'row count differs'
+        rows.append([mssql_tables[src_key], snowflake_tables[tgt_key], status, source_rows, target_rows, target_rows - source_rows, source_bytes, target_bytes])
+    for key in mssql_only:
+        source_rows, source_bytes = mssql_stats[key]
+        rows.append([mssql_tables[key], None, 'missing in Snowflake', source_rows, None, None, source_bytes, None])
+    for key in snowflake_only:
+        target_rows, target_bytes = snowflake_stats[key]
+        rows.append([None, snowflake_tables[key], 'missing in MSSQL', None, target_rows, None, None, target_bytes])
+    return pd.DataFrame(rows, columns=STATS_COLUMNS)
+
+# Function to compare the row counts of two schemas, or of a list of tables, from catalog statistics
+def validate_table_sizes(mssql_conn, snowflake_conn, mssql_schema=None, snowflake_schema=None, tables=None):
+    mssql_stats = get_mssql_table_stats(mssql_conn, mssql_schema, tables)
+    snowflake_stats = get_snowflake_table_stats(snowflake_conn, snowflake_schema, tables)
+    return compare_table_stats(mssql_stats, snowflake_stats, schema_map_of(mssql_schema, snowflake_schema))
+
+# Function to read the (rows, bytes) of one table, None when the catalog does not list it.
+# The table name may be qualified with its schema and database, an unqualified name is looked
+# up in the default schema of the connection.
+def get_table_size(kind, conn, table_name):
+    if kind == 'snowflake':
+        database, schema, table = split_snowflake_name(table_name)
+        stats = get_snowflake_table_stats(conn, schema, [table], database, current_schema=True)
+    else:
+        database, schema, table = split_mssql_name(table_name)
+        stats = get_mssql_table_stats(conn, schema, [table], database, current_schema=True)
+    return next(iter(stats.values()), None)
+
+# Function to estimate the memory a full fetch of a table takes, None when the size is unknown
+def estimate_fetch_bytes(kind, size):
+    if size is None or size[1] is None:
+        return None
+    return size[1] * MEMORY_FACTORS[kind]
+
+# Function to choose a fetch batch size that keeps one batch near TARGET_BATCH_BYTES
+def choose_batch_size(kind, size, default):
+    fetch_bytes = estimate_fetch_bytes(kind, size)
+    if fetch_bytes is None or not size[0]:
+        return default
+    row_bytes = max(1, fetch_bytes // size[0])
+    return int(min(MAX_BATCH_SIZE, max(MIN_BATCH_SIZE, TARGET_BATCH_BYTES // row_bytes)))
+
+# Function to tell whether a full fetch would take more than MEMORY_HEADROOM of the available
+# memory. Returns (estimated bytes, available bytes) when it would, None otherwise or when
+# either number is unknown (psutil is optional).
+def memory_warning(kind, size):
+    fetch_bytes = estimate_fetch_bytes(kind, size)
+    if fetch_bytes is None or psutil is None:
+        return None
+    available = psutil.virtual_memory().available
+    if fetch_bytes > available * MEMORY_HEADROOM:
+        return fetch_bytes, available
+    return None
+
+# Function to scale a table size down to the rows a row limit lets through
+def limit_size(size, row_limit):
+    if size is None or not row_limit or row_limit >= size[0]:
+        return size
+    return row_limit, None if size[1] is None else size[1] * row_limit // max(1, size[0])
+
+# Function to render a byte count for display
+def format_bytes(nbytes):
+    if nbytes is None:
+        return 'unknown size'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TB"
@@ -0,0 +1,29 @@
+import os
+import sys
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import decimal
+
+import pytest
+
+COLUMN_NAMES = ['id', 'amount', 'price', 'note']
+
+
+# Rows of both sides in batches whose column types change from batch to batch: an all NULL
+# first batch, int then float amounts and decimals of different scales. A few rows differ,
+# are missing on one side or have a duplicate key.
+@pytest.fixture
+def typed_batches():
+    source = [
+        [[idx, None, decimal.Decimal('1.50'), f'note {idx}'] for idx in range(0, 40)],
+        [[idx, idx, decimal.Decimal('2.1234'), f'note {idx}'] for idx in range(40, 80)],
+        [[idx, idx + 0.5, decimal.Decimal('3.1'), f'note {idx}'] for idx in range(80, 120)] + [[5, 5, decimal.Decimal('1.50'), 'again']],
+    ]
+    target_rows = [[f' {idx} ' if idx % 10 == 0 else idx, None, decimal.Decimal('1.50'), f'note {idx}'] for idx in range(1, 40)]
+    target_rows += [[idx, idx if idx != 45 else 46, decimal.Decimal('2.1234'), f'note {idx}'] for idx in range(40, 80)]
+    target_rows += [[idx, idx + 0.5, decimal.Decimal('3.1'), f'Note {idx}' if idx == 90 else f'note {idx}'] for idx in range(80, 125)]
+    target = [target_rows[start:start + 30] for start in range(0, len(target_rows), 30)]
+    return source, target, COLUMN_NAMES
@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+import time
+
+from benchmark import wait_for_result
+
+context = multiprocessing.get_context('fork')
+
+
+def send_result(results_queue):
+    results_queue.put({'benchmark': 'ok', 'rows': 1})
+
+
+def crash(results_queue):
+    os._exit(3)
+
+
+def hang(results_queue):
+    time.sleep(60)
+
+
+def run(target, timeout=30):
+    results_queue = context.Queue()
+    process = context.Process(target=target, args=(results_queue,))
+    process.start()
+    result = wait_for_result(target.__name__, process, results_queue, timeout)
+    process.join()
+    return result
+
+
+def test_result_of_a_finished_benchmark():
+    assert run(send_result) == {'benchmark': 'ok', 'rows': 1}
+
+
+def test_crashed_benchmark_is_reported_with_its_exit_code():
+    assert run(crash) == {'benchmark': 'crash', 'error': 'process exited with code 3 without a result'}
+
+
+def test_hanging_benchmark_is_stopped_at_the_timeout():
+    started = time.monotonic()
+    assert run(hang, timeout=0.5) == {'benchmark': 'hang', 'error': 'timed out after 0.5 seconds'}
+    assert time.monotonic() - started < 10
@@ -0,0 +1,38 @@
+from catalog import list_snowflake_tables, quote_snowflake_schema
+
+
+class RecordingCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query):
+        self.queries.append(query)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, rows):
+        self.cursor_ = RecordingCursor(rows)
+
+    def cursor(self):
+        return self.cursor_
+
+
+def test_schema_names_are_quoted():
+    assert quote_snowflake_schema('public') == '"PUBLIC"'
+    assert quote_snowflake_schema('sales_db.public') == '"SALES_DB"."PUBLIC"'
+    assert quote_snowflake_schema('"Mixed Case"') == '"Mixed Case"'
+    assert quote_snowflake_schema('x; DROP TABLE y') == '"X; DROP TABLE Y"'
+    assert quote_snowflake_schema('"a"" b"') == '"a"" b"'
+
+
+def test_show_tables_uses_the_quoted_schema():
+    conn = RecordingConnection([(None, 'ORDERS'), (None, 'ORDER_LINES'), (None, 'ORDERX')])
+    assert list_snowflake_tables(conn, 'public', 'ORDER_', 10) == ['ORDER_LINES']
+    assert conn.cursor_.queries == ["SHOW TABLES LIKE 'ORDER_%' IN SCHEMA \"PUBLIC\" LIMIT 10"]
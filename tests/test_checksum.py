@@ -0,0 +1,85 @@
+from checksum import (
+    NULL_TOKEN, build_checksum_queries, canonical_spec, compare_checksums, get_mssql_column_types,
+    mssql_column_types_query, parse_snowflake_type, snowflake_canonical, snowflake_text
+)
+from extract import split_mssql_name
+
+
+class RecordingCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, query, *params):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, rows):
+        self.cursor_ = RecordingCursor(rows)
+
+    def cursor(self):
+        return self.cursor_
+
+
+def test_snowflake_boolean_keeps_null():
+    expr = snowflake_text('"ACTIVE"', ('boolean', 0), ('boolean', 0))
+    assert expr == """CASE WHEN "ACTIVE" THEN '1' WHEN NOT "ACTIVE" THEN '0' END"""
+    assert 'IFF' not in expr
+    assert snowflake_canonical('ACTIVE', ('boolean', 0), ('boolean', 0)) == f"COALESCE({expr}, '{NULL_TOKEN}')"
+
+
+def test_snowflake_integer_flag_is_cast_for_a_bit_column():
+    assert canonical_spec(('boolean', 0), ('integer', 0)) == ('boolean', 0)
+    assert snowflake_text('"FLAG"', ('integer', 0), ('boolean', 0)) == 'TO_VARCHAR(CAST("FLAG" AS INT))'
+
+
+def test_numbers_use_the_larger_scale():
+    assert canonical_spec(('decimal', 2), parse_snowflake_type('NUMBER(18,4)')) == ('decimal', 4)
+    assert canonical_spec(('integer', 0), parse_snowflake_type('NUMBER(38,0)')) == ('decimal', 0)
+    assert canonical_spec(('float', 0), ('decimal', 2)) == ('decimal', 6)
+
+
+def test_checksum_queries_cover_every_column_and_the_row():
+    mssql_query, snowflake_query = build_checksum_queries(
+        'dbo.Orders', 'ORDERS', ['id', 'active'], ['ID', 'ACTIVE'],
+        {'id': ('integer', 0), 'active': ('boolean', 0)}, {'ID': ('integer', 0), 'ACTIVE': ('boolean', 0)})
+    assert mssql_query.startswith('SELECT COUNT(*) AS ROW_COUNT, COUNT([id]) AS NON_NULL_0')
+    assert mssql_query.endswith(' FROM dbo.Orders')
+    assert "COALESCE(CONVERT(VARCHAR(1), CAST([active] AS INT)), '<NULL>')" in mssql_query
+    assert 'ISNULL(' not in mssql_query
+    assert """CASE WHEN "ACTIVE" THEN '1' WHEN NOT "ACTIVE" THEN '0' END""" in snowflake_query
+    assert snowflake_query.count('AS CHECKSUM_') == 2 and 'ROW_CHECKSUM' in snowflake_query
+    assert "CONCAT_WS('|'" in mssql_query and "CONCAT_WS('|'" in snowflake_query
+
+
+def test_compare_checksums_flags_the_differing_column():
+    results = compare_checksums([3, 3, 10, 2, 5, 15], [3, 3, 10, 3, 6, 16], ['id', 'active'], ['ID', 'ACTIVE'])
+    assert results['match'].tolist() == [True, False, False]
+
+
+def test_split_mssql_name():
+    assert split_mssql_name('Orders') == (None, None, 'Orders')
+    assert split_mssql_name('dbo.Orders') == (None, 'dbo', 'Orders')
+    assert split_mssql_name('[Sales DB].[dbo].[Order]]s]') == ('Sales DB', 'dbo', 'Order]s')
+
+
+def test_column_types_are_looked_up_by_schema_and_table():
+    query, params = mssql_column_types_query('dbo.Orders')
+    assert 'TABLE_SCHEMA = COALESCE(?, SCHEMA_NAME()) AND TABLE_NAME = ?' in query
+    assert params == ['dbo', 'Orders']
+    assert mssql_column_types_query('Orders')[1] == [None, 'Orders']
+    assert mssql_column_types_query('Sales.dbo.Orders')[0].startswith('SELECT COLUMN_NAME, DATA_TYPE, NUMERIC_SCALE FROM [Sales].INFORMATION_SCHEMA.COLUMNS')
+
+
+def test_get_mssql_column_types_passes_the_split_name():
+    conn = RecordingConnection([('id', 'int', 0), ('amount', 'decimal', 2), ('name', 'nvarchar', None)])
+    types = get_mssql_column_types(conn, 'dbo.Orders')
+    assert types == {'id': ('integer', 0), 'amount': ('decimal', 2), 'name': ('string', 0)}
+    assert conn.cursor_.executed[0][1] == ('dbo', 'Orders')
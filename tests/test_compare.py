@@ -0,0 +1,85 @@
+import pyarrow as pa
+
+from compare import row_order_matched, validate_data_batches, validate_data_by_key
+from normalize import normalize_key_column
+
+
+def test_keys_keep_case_and_parentheses():
+    assert normalize_key_column(['ABC(1)', 'abc(2)']).to_pylist() == ['ABC(1)', 'abc(2)']
+
+
+def test_keys_are_trimmed_and_match_their_text():
+    values = ['ABC(1)', ' abc(2) ', None, 5, ' 42 ']
+    assert normalize_key_column(values).to_pylist() == [str(value).strip() for value in values]
+
+
+def test_keys_differing_in_case_do_not_collide():
+    source = [('ABC(1)', 'a'), ('abc(2)', 'b')]
+    target = [('abc(2)', 'b'), ('ABC(1)', 'a')]
+    results = validate_data_by_key([source], [target], ['id', 'v'], ['id', 'v'], ['id'], ['id'])
+    assert results['matched_rows'] == 2
+    assert results['duplicate_keys'] == 0
+    assert results['source_only_rows'] == results['target_only_rows'] == 0
+
+
+def test_key_results_are_counters_with_capped_examples():
+    source = [(idx, 'a', idx) for idx in range(20)] + [(idx, 'x', 0) for idx in range(100, 105)] + [(0, 'dup', 0)]
+    target = [(idx, 'b' if idx < 8 else 'a', idx) for idx in range(20)] + [(idx, 'y', 0) for idx in range(200, 203)]
+    results = validate_data_by_key([source], [target], ['id', 'v', 'w'], ['id', 'v', 'w'], ['id'], ['id'], max_examples=3)
+    assert (results['matched_rows'], results['mismatched_rows']) == (12, 8)
+    assert (results['source_only_rows'], results['target_only_rows'], results['duplicate_keys']) == (5, 3, 1)
+    assert results['summary']['mismatches'].tolist() == [8, 0]
+    assert len(results['mismatches']) == 3 and results['truncated']
+    assert results['source_only']['id'].tolist() == ['100', '101', '102']
+    assert results['target_only']['id'].tolist() == ['200', '201', '202']
+    assert results['duplicates']['side'].tolist() == ['source']
+
+
+def test_compound_keys_are_shown_per_column():
+    results = validate_data_by_key([[(1, 'a', 'x')]], [[(1, 'b', 'x')]], ['k1', 'k2', 'v'], ['k1', 'k2', 'v'], ['k1', 'k2'], ['k1', 'k2'])
+    assert results['source_only'].to_dict('records') == [{'k1': '1', 'k2': 'a'}]
+    assert results['target_only'].to_dict('records') == [{'k1': '1', 'k2': 'b'}]
+
+
+def test_batches_compare_across_uneven_batches():
+    source = [[(1, 'a'), (2, 'b')], [(3, 'c')], [(4, 'd'), (5, 'e'), (6, 'f')]]
+    target = [pa.table({'id': [1, 2, 3], 'v': ['a', 'B', 'c']}), pa.table({'id': [4, 5, 6], 'v': ['d', 'x', 'f']})]
+    results = validate_data_batches(source, target, ['id', 'v'], ['id', 'v'])
+    assert results['rows_compared'] == 6
+    assert results['source_rows'] == results['target_rows'] == 6
+    assert results['summary']['mismatches'].tolist() == [0, 1]
+    assert results['mismatches']['row_index'].tolist() == [4]
+    assert not row_order_matched(results)
+
+
+def test_batches_count_rows_the_target_is_missing():
+    source = [[(1, 'a'), (2, 'b')], [(3, 'c'), (4, 'd')]]
+    target = [[(1, 'a'), (2, 'b')]]
+    results = validate_data_batches(source, target, ['id', 'v'], ['id', 'v'])
+    assert results['rows_compared'] == 2
+    assert results['summary']['mismatches'].sum() == 0
+    assert (results['source_rows'], results['target_rows']) == (4, 2)
+    assert not row_order_matched(results)
+
+
+def test_batches_count_extra_target_rows():
+    results = validate_data_batches([[(1,)]], [[(1,)], [(2,), (3,)]], ['id'], ['id'])
+    assert (results['source_rows'], results['target_rows']) == (1, 3)
+    assert not row_order_matched(results)
+
+
+def test_batches_row_limit_applies_to_both_sides():
+    source = [[(idx,) for idx in range(5)], [(idx,) for idx in range(5, 10)]]
+    target = [pa.table({'id': list(range(3))})]
+    results = validate_data_batches(source, target, ['id'], ['id'], row_limit=3)
+    assert (results['source_rows'], results['target_rows'], results['rows_compared']) == (3, 3, 3)
+    assert row_order_matched(results)
+
+
+def test_key_comparison_across_batches_of_rows_and_arrow_tables():
+    source = [[(1, 'a'), (2, 'b')], pa.table({'id': [3, 4], 'v': ['c', None]})]
+    target = [pa.table({'id': [4, 3], 'v': [None, 'C']}), [(2, 'x'), (5, 'e')]]
+    results = validate_data_by_key(source, target, ['id', 'v'], ['id', 'v'], ['id'], ['id'])
+    assert (results['matched_rows'], results['mismatched_rows']) == (2, 1)
+    assert (results['source_only_rows'], results['target_only_rows']) == (1, 1)
+    assert results['mismatches'][['key', 'source_value', 'target_value']].values.tolist() == [['2', 'b', 'x']]
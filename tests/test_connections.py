@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+import connections
+from connections import ConnectionPool, pool_key
+
+
+class FakeConnection:
+    def __init__(self, config):
+        self.config = config
+        self.closed = False
+        self.healthy = True
+        self.users = 0
+
+    def cursor(self):
+        if not self.healthy:
+            raise RuntimeError('connection lost')
+        return FakeCursor()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def execute(self, query):
+        pass
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    opened = []
+
+    def open_fake(config):
+        conn = FakeConnection(config)
+        opened.append(conn)
+        return conn
+    monkeypatch.setitem(connections.OPENERS, 'mssql', open_fake)
+    monkeypatch.setitem(connections.OPENERS, 'snowflake', open_fake)
+    return opened
+
+
+CONFIG = {'server': 'db', 'uid': 'app', 'password': 'secret'}
+
+
+def test_checked_out_connection_is_not_handed_out_twice(opened):
+    pool = ConnectionPool()
+    first = pool.checkout('mssql', CONFIG)
+    second = pool.checkout('mssql', CONFIG)
+    assert first is not second
+    pool.checkin(first)
+    assert pool.checkout('mssql', CONFIG) is first
+    assert len(opened) == 2
+
+
+def test_configs_and_kinds_get_their_own_connections(opened):
+    pool = ConnectionPool()
+    conn = pool.checkout('mssql', CONFIG)
+    pool.checkin(conn)
+    assert pool.checkout('snowflake', CONFIG) is not conn
+    assert pool.checkout('mssql', dict(CONFIG, password='other')) is not conn
+    assert pool.checkout('mssql', CONFIG) is conn
+
+
+def test_unhealthy_idle_connection_is_replaced(opened):
+    pool = ConnectionPool(health_check_after=0)
+    conn = pool.checkout('mssql', CONFIG)
+    pool.checkin(conn)
+    conn.healthy = False
+    time.sleep(0.01)
+    replacement = pool.checkout('mssql', CONFIG)
+    assert replacement is not conn
+    assert conn.closed and not replacement.closed
+
+
+def test_idle_timeout_never_closes_a_checked_out_connection(opened):
+    pool = ConnectionPool(idle_timeout=0)
+    held = pool.checkout('mssql', CONFIG)
+    idle = pool.checkout('mssql', CONFIG)
+    pool.checkin(idle)
+    time.sleep(0.01)
+    pool.checkout('snowflake', CONFIG)
+    assert idle.closed
+    assert not held.closed
+
+
+def test_size_limit_only_closes_idle_connections(opened):
+    pool = ConnectionPool(max_size=1)
+    held = [pool.checkout('mssql', CONFIG) for _ in range(3)]
+    assert not any(conn.closed for conn in held)
+    for conn in held:
+        pool.checkin(conn)
+    assert [conn.closed for conn in held] == [True, True, False]
+
+
+def test_key_of_and_discard(opened):
+    pool = ConnectionPool()
+    conn = pool.checkout('mssql', CONFIG)
+    assert pool.key_of(conn) == pool_key('mssql', CONFIG)
+    pool.checkin(conn)
+    assert pool.key_of(conn) == pool_key('mssql', CONFIG)
+    stranger = FakeConnection(CONFIG)
+    assert pool.key_of(stranger) == ('unpooled', id(stranger))
+    conn = pool.checkout('mssql', CONFIG)
+    pool.discard(conn)
+    assert conn.closed
+    pool.checkin(conn)
+    assert pool.checkout('mssql', CONFIG) is not conn
+
+
+def test_concurrent_callers_never_share_a_connection(opened):
+    pool = ConnectionPool(health_check_after=0)
+    errors = []
+
+    def worker():
+        for _ in range(200):
+            conn = pool.checkout('mssql', CONFIG)
+            conn.users += 1
+            if conn.users != 1 or conn.closed:
+                errors.append(conn)
+            conn.users -= 1
+            pool.checkin(conn)
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(opened) <= 8
+
+
+def test_close_all_closes_idle_connections(opened):
+    pool = ConnectionPool()
+    idle = pool.checkout('mssql', CONFIG)
+    held = pool.checkout('mssql', CONFIG)
+    pool.checkin(idle)
+    pool.close_all()
+    assert idle.closed and not held.closed
@@ -0,0 +1,61 @@
+import pyarrow as pa
+
+import external_diff
+from compare import validate_data_by_key
+from external_diff import RUN_SHARE, SORT_INDEX_BYTES, validate_data_external
+
+
+def serial_counts(source, target, column_names):
+    results = validate_data_by_key(source, target, column_names, column_names, ['id'], ['id'], max_examples=100)
+    return result_counts(results)
+
+
+def result_counts(results):
+    return {counter: results[counter] for counter in ('matched_rows', 'mismatched_rows', 'source_only_rows', 'target_only_rows', 'duplicate_keys')}
+
+
+def test_small_memory_limits_give_the_serial_results(typed_batches, tmp_path):
+    source, target, column_names = typed_batches
+    expected = serial_counts(source, target, column_names)
+    for memory_limit in (4000, 20000, 10 ** 9):
+        results = validate_data_external(source, target, column_names, column_names, ['id'], ['id'],
+                                         memory_limit=memory_limit, directory=str(tmp_path))
+        assert result_counts(results) == expected
+    # The smallest limit spills every batch as its own run and needs a merge pass
+    results = validate_data_external(source, target, column_names, column_names, ['id'], ['id'], memory_limit=4000, directory=str(tmp_path))
+    assert results['source_runs'] == 3 and results['merge_passes'] >= 1
+
+
+def test_runs_with_different_column_types_are_merged(typed_batches, tmp_path, monkeypatch):
+    source, target, column_names = typed_batches
+    monkeypatch.setattr(external_diff, 'RUN_BATCH_ROWS', 7)
+    results = validate_data_external(source, target, column_names, column_names, ['id'], ['id'], memory_limit=4000, directory=str(tmp_path))
+    assert result_counts(results) == serial_counts(source, target, column_names)
+    assert results['mismatches']['key'].tolist() == ['45']
+    assert not list(tmp_path.iterdir())
+
+
+def test_runs_stay_within_the_memory_limit(tmp_path, monkeypatch):
+    column_names = ['id', 'value']
+    source = [[[idx, f'value {idx}'] for idx in range(start, start + 500)] for start in range(0, 5000, 500)]
+    memory_limit = 200000
+    run_sizes = []
+    write_run = external_diff.write_run
+
+    def recording_write_run(tables, directory, prefix, number):
+        run_sizes.append(sum(table.nbytes + table.num_rows * SORT_INDEX_BYTES for table in tables))
+        return write_run(tables, directory, prefix, number)
+    monkeypatch.setattr(external_diff, 'write_run', recording_write_run)
+    results = validate_data_external(source, source, column_names, column_names, ['id'], ['id'], memory_limit=memory_limit, directory=str(tmp_path))
+    assert results['matched_rows'] == 5000
+    assert len(run_sizes) > 2
+    assert max(run_sizes) <= memory_limit // RUN_SHARE
+
+
+def test_run_files_are_sorted_by_key(tmp_path):
+    column_names = ['id', 'value']
+    tables = [external_diff.keyed_table([[idx, 'x'] for idx in keys], column_names, [0]) for keys in ([5, 3, 9], [1, 7])]
+    path = external_diff.write_run(tables, str(tmp_path), 'source', 0)
+    with pa.memory_map(path) as run_file:
+        keys = pa.ipc.open_file(run_file).read_all().column(external_diff.KEY_COLUMN).to_pylist()
+    assert keys == sorted(keys) == ['1', '3', '5', '7', '9']
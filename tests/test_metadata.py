@@ -0,0 +1,56 @@
+from metadata import group_by_table, metadata_query, pair_tables, table_labels, validate_schemas
+
+
+def column(schema, table, name, position, data_type, nullable='YES'):
+    return (schema, table, name, position, data_type, nullable, None, None, None)
+
+
+def test_tables_of_the_same_name_in_two_schemas_stay_apart():
+    metadata = group_by_table([
+        column('dbo', 'Orders', 'id', 1, 'int'),
+        column('archive', 'Orders', 'id', 1, 'bigint'),
+        column('archive', 'Orders', 'note', 2, 'varchar')
+    ])
+    assert sorted(metadata) == [('archive', 'Orders'), ('dbo', 'Orders')]
+    assert len(metadata[('archive', 'Orders')]) == 2
+    assert table_labels(metadata) == {('archive', 'Orders'): 'archive.Orders', ('dbo', 'Orders'): 'dbo.Orders'}
+
+
+def test_unique_table_names_are_not_qualified():
+    assert table_labels([('dbo', 'Orders'), ('dbo', 'Lines')]) == {('dbo', 'Orders'): 'Orders', ('dbo', 'Lines'): 'Lines'}
+
+
+def test_validate_schemas_pairs_tables_by_schema_when_names_repeat():
+    mssql = group_by_table([
+        column('dbo', 'Orders', 'id', 1, 'int'),
+        column('archive', 'Orders', 'id', 1, 'bigint')
+    ])
+    snowflake = group_by_table([
+        column('DBO', 'ORDERS', 'ID', 1, 'int'),
+        column('ARCHIVE', 'ORDERS', 'ID', 1, 'bigint'),
+        column('ARCHIVE', 'ORDERS', 'NOTE', 2, 'varchar')
+    ])
+    summary_df, differences_df = validate_schemas(mssql, snowflake)
+    summary = {row.source_table: (row.status, row.extra_columns) for row in summary_df.itertuples()}
+    assert summary == {'archive.Orders': ('mismatch', 1), 'dbo.Orders': ('match', 0)}
+    assert differences_df['target_value'].tolist() == ['NOTE']
+
+
+def test_tables_repeated_on_one_side_pair_through_the_schema_map():
+    mssql = [('archive', 'Orders'), ('dbo', 'Orders'), ('dbo', 'Lines')]
+    snowflake = [('PUBLIC', 'ORDERS'), ('PUBLIC', 'LINES')]
+    pairs, mssql_only, snowflake_only = pair_tables(mssql, snowflake, {'dbo': 'PUBLIC'})
+    assert sorted(pairs) == [(('dbo', 'Lines'), ('PUBLIC', 'LINES')), (('dbo', 'Orders'), ('PUBLIC', 'ORDERS'))]
+    assert (mssql_only, snowflake_only) == ([('archive', 'Orders')], [])
+
+
+def test_tables_of_differently_named_schemas_pair_on_unique_names():
+    pairs, mssql_only, snowflake_only = pair_tables([('dbo', 'Orders'), ('dbo', 'Lines')], [('PUBLIC', 'ORDERS'), ('STAGE', 'ITEMS')])
+    assert pairs == [(('dbo', 'Orders'), ('PUBLIC', 'ORDERS'))]
+    assert (mssql_only, snowflake_only) == ([('dbo', 'Lines')], [('STAGE', 'ITEMS')])
+
+
+def test_metadata_query_orders_by_schema_and_table():
+    query = metadata_query('?', 'dbo', 2)
+    assert query.startswith('SELECT TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME,')
+    assert query.endswith('AND UPPER(TABLE_NAME) IN (UPPER(?), UPPER(?)) ORDER BY TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION')
@@ -0,0 +1,129 @@
+import re
+
+import pyarrow as pa
+import pytest
+
+import connections
+from orchestrator import QUEUE_BATCHES, make_job, run_jobs
+from timing import timed_run
+
+# Tables served by the fake databases: {name: (columns, rows)}
+TABLES = {}
+
+
+class FakeMssqlCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.description = []
+        self.arraysize = 1
+
+    def execute(self, query, *params):
+        name = re.search(r'FROM (\S+)', query).group(1)
+        if name not in TABLES:
+            raise RuntimeError(f"Invalid object name '{name}'")
+        columns, rows = TABLES[name]
+        self.description = [(column,) for column in columns]
+        self.rows = [] if 'TOP 0' in query else list(rows)
+
+    def fetchmany(self, size):
+        self.conn.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakeSnowflakeCursor:
+    def execute(self, query, params=None):
+        name = re.search(r'FROM (\S+)', query).group(1)
+        limit = re.search(r'LIMIT (\d+)', query)
+        columns, rows = TABLES[name]
+        self.description = [(column,) for column in columns]
+        self.rows = rows[:int(limit.group(1))] if limit else rows
+
+    def fetch_arrow_batches(self):
+        columns = [description[0] for description in self.description]
+        for start in range(0, len(self.rows), 3):
+            chunk = self.rows[start:start + 3]
+            yield pa.table({column: [row[idx] for row in chunk] for idx, column in enumerate(columns)})
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor_class):
+        self.cursor_class = cursor_class
+        self.fetches = 0
+
+    def cursor(self):
+        return self.cursor_class(self) if self.cursor_class is FakeMssqlCursor else self.cursor_class()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def databases(monkeypatch):
+    opened = {'mssql': [], 'snowflake': []}
+
+    def opener(kind, cursor_class):
+        def open_fake(config):
+            conn = FakeConnection(cursor_class)
+            opened[kind].append(conn)
+            return conn
+        return open_fake
+    monkeypatch.setitem(connections.OPENERS, 'mssql', opener('mssql', FakeMssqlCursor))
+    monkeypatch.setitem(connections.OPENERS, 'snowflake', opener('snowflake', FakeSnowflakeCursor))
+    TABLES.clear()
+    yield opened
+    TABLES.clear()
+
+
+def rows(count, changed=None):
+    return [(idx, 'changed' if idx == changed else f'v{idx}') for idx in range(count)]
+
+
+def run(jobs, **kwargs):
+    return {idx: results for idx, _, results in run_jobs(jobs, {}, {}, 2, 2, batch_size=4, **kwargs)}
+
+
+def test_jobs_are_compared_batch_by_batch(databases):
+    TABLES.update({
+        'dbo.same': (['id', 'v'], rows(10)), 'SAME': (['ID', 'V'], rows(10)),
+        'dbo.changed': (['id', 'v'], rows(10)), 'CHANGED': (['ID', 'V'], rows(10, changed=7)),
+        'dbo.short': (['id', 'v'], rows(10)), 'SHORT': (['ID', 'V'], rows(6))
+    })
+    results = run([make_job('dbo.same', 'SAME'), make_job('dbo.changed', 'CHANGED'), make_job('dbo.short', 'SHORT'), make_job('dbo.gone', 'SAME')])
+    assert results[0]['rows_compared'] == 10 and results[0]['summary']['mismatches'].sum() == 0
+    assert results[1]['summary']['mismatches'].tolist() == [0, 1]
+    assert (results[2]['source_rows'], results[2]['target_rows']) == (10, 6)
+    assert 'Invalid object name' in str(results[3]['error'])
+    assert set(results[0]['timings']) == {'mssql_fetch', 'snowflake_fetch', 'compare'}
+
+
+def test_source_stops_fetching_once_the_row_limit_is_reached(databases):
+    TABLES.update({'dbo.big': (['id', 'v'], rows(400)), 'BIG': (['ID', 'V'], rows(400))})
+    results = run([make_job('dbo.big', 'BIG', row_limit=8)])
+    assert (results[0]['source_rows'], results[0]['target_rows']) == (8, 8)
+    # The whole table would take 100 batches, only a few are fetched ahead of the comparison
+    assert databases['mssql'][0].fetches <= 8 // 4 + QUEUE_BATCHES + 2
+
+
+def test_spans_of_worker_threads_reach_the_timed_run(databases):
+    TABLES.update({'dbo.same': (['id', 'v'], rows(10)), 'SAME': (['ID', 'V'], rows(10))})
+    with timed_run('multi table') as timer:
+        run([make_job('dbo.same', 'SAME')])
+    phases = {record['phase'] for record in timer.spans}
+    assert {'metadata fetch', 'data fetch', 'compare'} <= phases
+
+
+def test_stopping_early_does_not_wait_for_the_other_jobs(databases):
+    TABLES.update({'dbo.big': (['id', 'v'], rows(400)), 'BIG': (['ID', 'V'], rows(400))})
+    jobs = [make_job('dbo.big', 'BIG') for _ in range(6)]
+    results = run_jobs(jobs, {}, {}, 2, 2, batch_size=4)
+    next(results)
+    results.close()
+    assert sum(conn.fetches for conn in databases['mssql']) < 6 * 100
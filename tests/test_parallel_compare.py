@@ -0,0 +1,48 @@
+import pyarrow as pa
+
+from compare import validate_data_by_key
+from parallel_compare import key_text, unified_schema, validate_data_parallel
+
+
+def serial_counts(source, target, column_names):
+    results = validate_data_by_key(source, target, column_names, column_names, ['id'], ['id'], max_examples=100)
+    return result_counts(results)
+
+
+def result_counts(results):
+    counts = {counter: results[counter] for counter in ('matched_rows', 'mismatched_rows', 'source_only_rows', 'target_only_rows', 'duplicate_keys')}
+    counts['mismatches'] = sorted(zip(results['mismatches']['key'], results['mismatches']['source_column'],
+                                      results['mismatches']['source_value'], results['mismatches']['target_value']))
+    return counts
+
+
+def test_batches_with_changing_types_give_the_serial_results(typed_batches, tmp_path):
+    source, target, column_names = typed_batches
+    expected = serial_counts(source, target, column_names)
+    assert expected['mismatched_rows'] == 1 and expected['duplicate_keys'] == 1
+    results = validate_data_parallel(source, target, column_names, column_names, ['id'], ['id'], workers=2, partitions=3,
+                                     max_examples=100, directory=str(tmp_path))
+    assert result_counts(results) == expected
+
+
+def test_arrow_batches_with_an_all_null_first_batch(typed_batches, tmp_path):
+    source, target, column_names = typed_batches
+    # The last batch mixes decimal scales in one column, which no Arrow batch from a driver does
+    arrow_source = [pa.table({name: pa.array([row[idx] for row in batch]) for idx, name in enumerate(column_names)}) for batch in source[:2]] + source[2:]
+    assert arrow_source[0].schema.field('amount').type == pa.null()
+    results = validate_data_parallel(arrow_source, target, column_names, column_names, ['id'], ['id'], workers=1, partitions=2,
+                                     max_examples=100, directory=str(tmp_path))
+    assert result_counts(results) == serial_counts(source, target, column_names)
+
+
+def test_unified_schema_keeps_types_and_fills_null_columns():
+    schema = unified_schema([
+        pa.schema([('a', pa.null()), ('b', pa.int64()), ('c', pa.decimal128(3, 2))]),
+        pa.schema([('a', pa.int64()), ('b', pa.float64()), ('c', pa.decimal128(5, 4))]),
+    ])
+    assert schema.types == [pa.int64(), pa.string(), pa.string()]
+
+
+def test_keys_are_matched_exactly():
+    table = pa.table({'code': ['ABC(1)', 'abc(2)', ' yes ']})
+    assert key_text(table, [0]).to_pylist() == ['ABC(1)', 'abc(2)', 'yes']
@@ -0,0 +1,35 @@
+import sqlite3
+
+from checksum import snowflake_text
+from profiling import build_profile_queries, compare_profiles
+
+
+def test_boolean_profile_keeps_nulls_out_of_the_aggregates():
+    mssql_query, snowflake_query, specs = build_profile_queries(
+        'dbo.Flags', 'FLAGS', ['active'], ['ACTIVE'], {'active': ('boolean', 0)}, {'ACTIVE': ('boolean', 0)})
+    value = """CASE WHEN "ACTIVE" THEN '1' WHEN NOT "ACTIVE" THEN '0' END"""
+    assert specs == [('boolean', 0)]
+    assert f"MIN({value})" in snowflake_query
+    assert f"SUM(CAST({value} AS INT))" in snowflake_query
+    assert 'IFF' not in snowflake_query
+
+
+def test_boolean_text_of_null_is_null():
+    # The canonical text only uses CASE, which SQLite evaluates with the same NULL rules
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE flags ("ACTIVE" BOOLEAN)')
+    conn.executemany('INSERT INTO flags VALUES (?)', [(True,), (None,), (None,), (True,)])
+    value = snowflake_text('"ACTIVE"', ('boolean', 0), ('boolean', 0))
+    row = conn.execute(f"SELECT COUNT({value}), MIN({value}), MAX({value}), SUM(CAST({value} AS INT)), COUNT(DISTINCT {value}) FROM flags").fetchone()
+    assert row == (2, '1', '1', 2, 1)
+
+
+def test_boolean_profile_flags_nulls_read_as_false():
+    specs = [('boolean', 0)]
+    mssql_row = [4, 2, '1', '1', 2, 1]
+    profile_df = compare_profiles(mssql_row, list(mssql_row), ['active'], ['ACTIVE'], specs)
+    assert profile_df['match'].all()
+    assert profile_df['metric'].tolist() == ['row_count', 'non_null', 'min', 'max', 'sum', 'approx_distinct']
+    # What the target reported while NULL was rendered as '0'
+    profile_df = compare_profiles(mssql_row, [4, 4, '0', '1', 2, 2], ['active'], ['ACTIVE'], specs)
+    assert profile_df.loc[~profile_df['match'], 'metric'].tolist() == ['non_null', 'min', 'approx_distinct']
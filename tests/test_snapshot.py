@@ -0,0 +1,105 @@
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from snapshot import SnapshotCache
+
+
+def table(rows):
+    return pa.table({'id': list(range(rows)), 'v': [f'value {idx}' for idx in range(rows)]})
+
+
+def test_concurrent_stores_of_one_key_do_not_collide(tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+    entries, errors = [], []
+    gate = threading.Barrier(4)
+
+    def store():
+        try:
+            gate.wait()
+            entries.append(cache.store('key', 'v1', iter([table(500), table(500)]), 'test'))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=store) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len({entry['file'] for entry in entries}) == 4
+    latest = cache.lookup('key', 'v1')
+    assert latest['rows'] == 1000
+    # Only the file of the indexed entry is left, and no temporary file
+    assert sorted(os.listdir(tmp_path)) == sorted(['index.json', latest['file']])
+
+
+def test_failed_store_leaves_no_temporary_file(tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+
+    def failing():
+        yield table(10)
+        raise RuntimeError('connection lost')
+    try:
+        cache.store('key', 'v1', failing(), 'test')
+    except RuntimeError:
+        pass
+    assert os.listdir(tmp_path) == []
+
+
+def test_eviction_skips_a_snapshot_that_is_being_read(tmp_path, monkeypatch):
+    import snapshot
+    cache = SnapshotCache(str(tmp_path), max_bytes=1)
+    monkeypatch.setattr(snapshot, 'snapshot_cache', cache)
+    first = cache.store('first', 'v1', iter([table(1000)]), 'test')
+    reader = snapshot.iter_snapshot_batches(first['path'], batch_size=100)
+    assert next(reader).num_rows == 100
+    cache.store('second', 'v1', iter([table(10)]), 'test')
+    # Evicted from the index but still on disk for its reader
+    assert cache.lookup('first', 'v1') is None
+    assert os.path.exists(first['path'])
+    assert sum(batch.num_rows for batch in reader) == 900
+    assert not os.path.exists(first['path'])
+
+
+def test_batches_of_different_types_are_stored_with_one_schema(tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+    batches = [
+        pa.table({'id': [1, 2], 'v': pa.nulls(2)}),
+        pa.table({'id': [3, 4], 'v': [10, None]}),
+        pa.table({'id': [5, 6], 'v': [1.5, 2.0]})
+    ]
+    entry = cache.store('key', 'v1', iter(batches), 'test')
+    stored = pq.read_table(entry['path'])
+    assert entry['rows'] == 6
+    assert stored.schema.types == [pa.int64(), pa.string()]
+    assert stored.column('v').to_pylist() == [None, None, '10', None, '1.5', '2.0']
+    assert sorted(os.listdir(tmp_path)) == sorted(['index.json', entry['file']])
+
+
+class EmptySnowflakeCursor:
+    description = [('ID', 0, None, None, 38, 0, False), ('AMOUNT', 0, None, None, 10, 2, True),
+                   ('NAME', 2, None, None, None, None, True), ('ACTIVE', 13, None, None, None, None, True)]
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetch_arrow_batches(self):
+        return iter([])
+
+    def close(self):
+        pass
+
+
+class EmptySnowflakeConnection:
+    def cursor(self):
+        return EmptySnowflakeCursor()
+
+
+def test_empty_snowflake_result_keeps_the_column_types():
+    import snapshot
+    batches = list(snapshot.iter_snowflake_snapshot_batches(EmptySnowflakeConnection(), 'T'))
+    assert len(batches) == 1 and batches[0].num_rows == 0
+    assert batches[0].schema == pa.schema([('ID', pa.int64()), ('AMOUNT', pa.decimal128(10, 2)),
+                                           ('NAME', pa.string()), ('ACTIVE', pa.bool_())])
@@ -0,0 +1,58 @@
+import pytest
+
+import snowflake_async
+
+
+class FakeStatus:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        self.conn.executed.append((query, params))
+
+    def fetchone(self):
+        return ['Identified SQL statement is being canceled.']
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.executed = []
+
+    def get_query_status_throw_if_error(self, query_id):
+        return self.statuses.pop(0)
+
+    def is_still_running(self, status):
+        return status.name == 'RUNNING'
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_check_reports_a_running_query_without_waiting():
+    conn = FakeConnection([FakeStatus('RUNNING'), FakeStatus('SUCCESS')])
+    assert snowflake_async.check_query(conn, 'q1') == (True, 'RUNNING')
+    assert snowflake_async.check_query(conn, 'q1') == (False, 'SUCCESS')
+    assert conn.executed == []
+
+
+def test_check_raises_the_error_of_a_failed_query():
+    class FailedConnection(FakeConnection):
+        def get_query_status_throw_if_error(self, query_id):
+            raise RuntimeError('SQL compilation error')
+    with pytest.raises(RuntimeError):
+        snowflake_async.check_query(FailedConnection([]), 'q1')
+
+
+def test_cancel_runs_the_system_function():
+    conn = FakeConnection([])
+    assert snowflake_async.cancel_query(conn, 'q1') == 'Identified SQL statement is being canceled.'
+    assert conn.executed == [("SELECT SYSTEM$CANCEL_QUERY(%s)", ('q1',))]
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from table_stats import compare_table_stats, get_table_size, mssql_stats_query, stats_by_table
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, *params):
+        self.conn.executed.append((query, params))
+
+    def fetchall(self):
+        return self.conn.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_mssql_stats_are_grouped_by_schema_and_table():
+    query = mssql_stats_query('dbo', 2)
+    assert query.startswith('SELECT s.name, t.name,')
+    assert query.endswith('GROUP BY s.name, t.name')
+
+
+def test_same_named_tables_of_two_schemas_are_compared_apart():
+    mssql_stats = stats_by_table([('dbo', 'Orders', 10, 8192), ('archive', 'Orders', 500, 16384)])
+    snowflake_stats = stats_by_table([('DBO', 'ORDERS', 10, 1024), ('ARCHIVE', 'ORDERS', 499, 2048), ('DBO', 'LINES', 3, 512)])
+    stats_df = compare_table_stats(mssql_stats, snowflake_stats)
+    rows = {row.target_table: (None if pd.isna(row.source_table) else row.source_table, row.status, row.target_rows) for row in stats_df.itertuples()}
+    assert rows == {
+        'ARCHIVE.ORDERS': ('archive.Orders', 'row count differs', 499),
+        'DBO.ORDERS': ('dbo.Orders', 'match', 10),
+        'LINES': (None, 'missing in MSSQL', 3),
+    }
+
+
+def test_table_size_of_a_qualified_mssql_name():
+    conn = FakeConnection([('archive', 'Orders', 500, 16384)])
+    assert get_table_size('mssql', conn, 'sales.[archive].[Orders]') == (500, 16384)
+    query, params = conn.executed[0]
+    assert 'FROM [sales].sys.tables' in query
+    assert params == ('archive', 'Orders')
+
+
+def test_table_size_of_an_unqualified_name_reads_the_default_schema():
+    conn = FakeConnection([('PUBLIC', 'ORDERS', 7, 1024)])
+    assert get_table_size('snowflake', conn, 'orders') == (7, 1024)
+    query, params = conn.executed[0]
+    assert 'TABLE_SCHEMA = CURRENT_SCHEMA()' in query
+    assert params == (['ORDERS'],)
+    conn = FakeConnection([('dbo', 'Orders', 7, None)])
+    get_table_size('mssql', conn, 'Orders')
+    assert 's.name = SCHEMA_NAME()' in conn.executed[0][0]
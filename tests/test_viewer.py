@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import viewer
+
+
+def result_frame(rows):
+    return pd.DataFrame({
+        'column': [f'col{idx % 7}' for idx in range(rows)],
+        'row_index': list(range(rows)),
+        'source_value': [idx if idx % 3 else f'text {idx}' for idx in range(rows)],
+        'match': [idx % 5 != 0 for idx in range(rows)],
+    })
+
+
+def spilled(tmp_path, frame, monkeypatch):
+    monkeypatch.setattr(viewer, 'SPILL_ROW_GROUP_ROWS', 100)
+    return viewer.spill_frame(frame, str(tmp_path))
+
+
+def test_spilled_frame_pages_like_the_frame(tmp_path, monkeypatch):
+    frame = result_frame(1050)
+    source = spilled(tmp_path, frame, monkeypatch)
+    assert viewer.source_rows(source) == 1050
+    assert viewer.source_columns(source) == list(frame.columns)
+    page = viewer.read_page(source, None, 3, 500)
+    assert list(page['row_index']) == list(range(1000, 1050))
+    # A column of mixed values is kept as text
+    assert list(page['source_value'].iloc[:3]) == ['1000', '1001', 'text 1002']
+
+
+def test_filtered_and_sorted_views_match_the_in_memory_view(tmp_path, monkeypatch):
+    frame = result_frame(1050)
+    source = spilled(tmp_path, frame, monkeypatch)
+    for options in [
+        dict(mismatches_only=True),
+        dict(filter_column='column', filter_text='COL3'),
+        dict(sort_column='row_index', ascending=False),
+        dict(mismatches_only=True, filter_column='column', filter_text='col1', sort_column='source_value'),
+    ]:
+        expected = viewer.view_frame({'frame': frame}, **options)
+        view = viewer.view_frame(source, **options)
+        assert isinstance(view, np.ndarray)
+        assert len(view) == len(expected)
+        for page in range(1, viewer.page_count(len(view), 50) + 1):
+            got = viewer.read_page(source, view, page, 50)
+            want = viewer.read_page({'frame': frame}, expected, page, 50)
+            assert list(got['row_index']) == list(want['row_index'])
+
+
+def test_empty_view_reads_an_empty_page(tmp_path, monkeypatch):
+    source = spilled(tmp_path, result_frame(300), monkeypatch)
+    view = viewer.view_frame(source, filter_column='column', filter_text='nothing like this')
+    assert len(view) == 0
+    page = viewer.read_page(source, view, 1, 50)
+    assert page.empty and list(page.columns) == ['column', 'row_index', 'source_value', 'match']
+
+
+def test_dropping_a_spilled_source_deletes_only_its_file(tmp_path, monkeypatch):
+    source = spilled(tmp_path, result_frame(10), monkeypatch)
+    snapshot = {'path': str(tmp_path / 'snapshot.parquet')}
+    open(snapshot['path'], 'w').close()
+    viewer.drop_source(source)
+    viewer.drop_source(snapshot)
+    assert not os.path.exists(source['path'])
+    assert os.path.exists(snapshot['path'])
+
+
+def test_fingerprint_follows_the_frame_content():
+    frame = result_frame(500)
+    assert viewer.frame_fingerprint(frame) == viewer.frame_fingerprint(result_frame(500))
+    changed = frame.copy()
+    changed.loc[10, 'source_value'] = 'other'
+    assert viewer.frame_fingerprint(changed) != viewer.frame_fingerprint(frame)
+    assert viewer.frame_fingerprint(frame.rename(columns={'match': 'status'})) != viewer.frame_fingerprint(frame)
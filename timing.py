@@ -0,0 +1,125 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Per phase timing of a validation run.
+# A run collects spans (connect, metadata fetch, data fetch, convert, normalize, compare, render)
+# with their wall time, the rows they handled, the bytes they produced where that is cheap to
+# know, and the change in resident memory when psutil is installed. Spans nest, so each span
+# also records its self time without the spans inside it, and the breakdown adds up to the run.
+# Code deeper down calls span() without a timer being passed around; outside of a run span()
+# costs next to nothing. Finished spans are logged as JSON lines on the 'datavalidator.timing'
+# logger. Nothing in here touches Streamlit.
+
+PHASES = ['connect', 'metadata fetch', 'data fetch', 'convert', 'normalize', 'compare', 'render']
+
+logger = logging.getLogger('datavalidator.timing')
+
+current_timer = contextvars.ContextVar('current_timer', default=None)
+current_span = contextvars.ContextVar('current_span', default=None)
+
+# Function to read the resident memory of the process, None without psutil
+def rss_bytes():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+# Function to write the span log lines to a file, once per path
+def configure_log(path):
+    if not path:
+        return
+    path = os.path.abspath(path)
+    if any(getattr(handler, 'baseFilename', None) == path for handler in logger.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+class RunTimer:
+    def __init__(self, run_name):
+        self.run_name = run_name
+        self.started = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.spans.append(record)
+        logger.info(json.dumps(record, default=str))
+
+    # Total self time, rows and bytes per phase, in pipeline order
+    def summary_frame(self):
+        columns = ['phase', 'calls', 'seconds', 'rows', 'bytes', 'share']
+        if not self.spans:
+            return pd.DataFrame(columns=columns)
+        spans_df = pd.DataFrame(self.spans)
+        summary_df = spans_df.groupby('phase', sort=False).agg(
+            calls=('phase', 'size'),
+            seconds=('self_seconds', 'sum'),
+            rows=('rows', 'sum'),
+            bytes=('bytes', 'sum')
+        ).reset_index()
+        total = summary_df['seconds'].sum()
+        summary_df['share'] = (summary_df['seconds'] / total).round(3) if total else 0.0
+        order = {phase: position for position, phase in enumerate(PHASES)}
+        summary_df['order'] = summary_df['phase'].map(lambda phase: order.get(phase, len(PHASES)))
+        return summary_df.sort_values('order', kind='stable').drop(columns='order').reset_index(drop=True)[columns]
+
+    def to_dict(self):
+        return {
+            'run': self.run_name,
+            'seconds': round(time.perf_counter() - self.started, 6),
+            'phases': json.loads(self.summary_frame().to_json(orient='records')),
+            'spans': self.spans
+        }
+
+# Start a timed run, spans opened inside the block are recorded on the returned timer
+@contextmanager
+def timed_run(run_name):
+    timer = RunTimer(run_name)
+    timer_token = current_timer.set(timer)
+    span_token = current_span.set(None)
+    try:
+        yield timer
+    finally:
+        current_span.reset(span_token)
+        current_timer.reset(timer_token)
+
+# Time one phase. The yielded dict takes 'rows' and 'bytes' from the caller.
+@contextmanager
+def span(phase, rows=None, nbytes=None):
+    timer = current_timer.get()
+    if timer is None:
+        yield {}
+        return
+    parent = current_span.get()
+    record = {'run': timer.run_name, 'phase': phase, 'rows': rows, 'bytes': nbytes, 'child_seconds': 0.0}
+    token = current_span.set(record)
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - started
+        current_span.reset(token)
+        rss_after = rss_bytes()
+        record['start'] = round(started - timer.started, 6)
+        record['seconds'] = round(seconds, 6)
+        record['self_seconds'] = round(seconds - record.pop('child_seconds'), 6)
+        record['rss_delta_bytes'] = rss_after - rss_before if rss_before is not None else None
+        record['thread'] = threading.current_thread().name
+        if parent is not None:
+            parent['child_seconds'] += seconds
+        timer.add(record)
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Server side paging, filtering and sorting of result sets for the result viewer in app_v7.py.
+# A result set is either a data frame held in memory ({'frame': frame}) or a Parquet file on
+# disk ({'path': path}, e.g. a snapshot or a spilled frame). Filters and sorting run here, only
+# the rows of the visible page and of the requested download chunk leave this module. A view of
+# a Parquet file reads only the columns it filters and sorts on and keeps the matching row
+# numbers; pages then read only the row groups that hold their rows. Nothing in here touches
+# Streamlit.
+
+DEFAULT_PAGE_SIZE = 100
+PAGE_SIZES = [50, 100, 500, 1000]
+# Rows per downloadable CSV chunk
+DEFAULT_CHUNK_ROWS = 100000
+# Result sets kept per session, the oldest one is dropped first
+MAX_RESULT_SETS = 10
+# Rows per row group of a spilled result set, the unit a page reads from disk
+SPILL_ROW_GROUP_ROWS = 10000
+
+# Function to turn a data frame into an Arrow table, a column Arrow can not type (mixed values)
+# is kept as text
+def frame_to_arrow(frame):
+    arrays = []
+    for column in frame.columns:
+        try:
+            arrays.append(pa.array(frame[column], from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            arrays.append(pa.array([None if value is None else str(value) for value in frame[column]], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in frame.columns])
+
+# Function to fingerprint the content of a data frame, so a frame shown again on a rerun can
+# reuse the file it was spilled to
+def frame_fingerprint(frame):
+    digest = hashlib.sha256(repr([str(column) for column in frame.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Function to write a data frame to a Parquet file in directory, so only its path has to be kept
+def spill_frame(frame, directory):
+    handle, path = tempfile.mkstemp(prefix='result_', suffix='.parquet', dir=directory)
+    os.close(handle)
+    pq.write_table(frame_to_arrow(frame), path, row_group_size=SPILL_ROW_GROUP_ROWS)
+    return {'path': path, 'spilled': True}
+
+# Function to delete the file of a spilled result set, other result sets are left alone
+def drop_source(source):
+    if source.get('spilled'):
+        try:
+            os.remove(source['path'])
+        except FileNotFoundError:
+            pass
+
+# Function to count the rows of a result set without loading a Parquet file
+def source_rows(source):
+    if 'path' in source:
+        return pq.ParquetFile(source['path']).metadata.num_rows
+    return len(source['frame'])
+
+# Function to read the column names of a result set
+def source_columns(source):
+    if 'path' in source:
+        return pq.read_schema(source['path']).names
+    return list(source['frame'].columns)
+
+# Function to turn Arrow data read from a result set into a frame, keeping the driver values
+def arrow_to_frame(table):
+    return table.to_pandas(integer_object_nulls=True, date_as_object=True, timestamp_as_object=True)
+
+# Function to read rows [offset, offset + limit) of a Parquet file from the row groups that hold them
+def parquet_slice(path, offset, limit):
+    parquet_file = pq.ParquetFile(path)
+    groups = []
+    group_start = 0
+    skip = 0
+    for group in range(parquet_file.metadata.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(group).num_rows
+        if group_start + group_rows > offset and group_start < offset + limit:
+            if not groups:
+                skip = offset - group_start
+            groups.append(group)
+        group_start += group_rows
+    if not groups:
+        return pd.DataFrame(columns=parquet_file.schema_arrow.names)
+    return arrow_to_frame(parquet_file.read_row_groups(groups).slice(skip, limit))
+
+# Function to read the given rows of a Parquet file in the given order, one row group at a time
+def parquet_take(path, row_numbers):
+    parquet_file = pq.ParquetFile(path)
+    if not len(row_numbers):
+        return pd.DataFrame(columns=parquet_file.schema_arrow.names)
+    group_rows = [parquet_file.metadata.row_group(group).num_rows for group in range(parquet_file.metadata.num_row_groups)]
+    starts = np.concatenate([[0], np.cumsum(group_rows)])
+    groups = np.searchsorted(starts, row_numbers, side='right') - 1
+    pieces, positions = [], []
+    for group in np.unique(groups):
+        selected = np.nonzero(groups == group)[0]
+        pieces.append(parquet_file.read_row_group(int(group)).take(row_numbers[selected] - starts[group]))
+        positions.append(selected)
+    return arrow_to_frame(pa.concat_tables(pieces).take(np.argsort(np.concatenate(positions))))
+
+# Function to find the rows of a result that are differences, None when the result has no
+# match or status column to tell
+def mismatch_mask(frame):
+    if 'match' in frame.columns:
+        return ~frame['match'].astype(bool)
+    if 'status' in frame.columns:
+        return ~frame['status'].isin(['match', 'matched'])
+    return None
+
+# Function to tell whether a result set can be narrowed to its differences
+def has_mismatch_filter(source):
+    return any(column in ('match', 'status') for column in source_columns(source))
+
+# Function to filter and sort a result set. filter_text is matched case insensitively against
+# the text of filter_column. Columns that mix types are sorted by their text.
+def query_frame(frame, mismatches_only=False, filter_column=None, filter_text='', sort_column=None, ascending=True):
+    if mismatches_only:
+        mask = mismatch_mask(frame)
+        if mask is not None:
+            frame = frame[mask]
+    if filter_column and filter_text:
+        frame = frame[frame[filter_column].astype(str).str.contains(filter_text, case=False, regex=False, na=False)]
+    if sort_column:
+        try:
+            frame = frame.sort_values(sort_column, ascending=ascending, kind='stable')
+        except TypeError:
+            frame = frame.sort_values(sort_column, ascending=ascending, kind='stable', key=lambda values: values.astype(str))
+    return frame
+
+# Function to tell whether a view needs the whole result set, or can be paged straight from disk
+def is_plain_view(mismatches_only, filter_column, filter_text, sort_column):
+    return not mismatches_only and not (filter_column and filter_text) and not sort_column
+
+# Function to filter and sort a Parquet file like query_frame, reading only the columns the view
+# needs batch by batch. Returns the numbers of the matching rows in view order.
+def query_parquet(path, mismatches_only=False, filter_column=None, filter_text='', sort_column=None, ascending=True):
+    parquet_file = pq.ParquetFile(path)
+    needed = {sort_column, filter_column if filter_text else None} | ({'match', 'status'} if mismatches_only else set())
+    columns = [column for column in parquet_file.schema_arrow.names if column in needed]
+    if not columns:
+        return np.arange(parquet_file.metadata.num_rows)
+    pieces = []
+    offset = 0
+    for batch in parquet_file.iter_batches(batch_size=DEFAULT_CHUNK_ROWS, columns=columns):
+        frame = arrow_to_frame(pa.Table.from_batches([batch]))
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        offset += len(frame)
+        frame = query_frame(frame, mismatches_only, filter_column, filter_text)
+        # Only the row numbers, and the values to sort them by, are kept
+        pieces.append(frame[[sort_column]] if sort_column else frame.iloc[:, :0])
+    frame = pd.concat(pieces) if pieces else pd.DataFrame(columns=[sort_column] if sort_column else [])
+    if sort_column:
+        frame = query_frame(frame, sort_column=sort_column, ascending=ascending)
+    return frame.index.to_numpy(dtype=np.int64)
+
+# Function to get the rows of a view of a result set: the filtered and sorted frame, the row
+# numbers of a filtered or sorted Parquet file, or None for a plain view of a Parquet file.
+# Parquet files are paged from disk.
+def view_frame(source, mismatches_only=False, filter_column=None, filter_text='', sort_column=None, ascending=True):
+    if 'path' in source:
+        if is_plain_view(mismatches_only, filter_column, filter_text, sort_column):
+            return None
+        return query_parquet(source['path'], mismatches_only, filter_column, filter_text, sort_column, ascending)
+    return query_frame(source['frame'], mismatches_only, filter_column, filter_text, sort_column, ascending)
+
+# Function to count the pages of a number of rows
+def page_count(rows, page_size):
+    return max(1, -(-rows // page_size))
+
+# Function to read one page (1 based) of a view
+def read_page(source, frame, page, page_size):
+    offset = (page - 1) * page_size
+    if frame is None:
+        return parquet_slice(source['path'], offset, page_size)
+    if isinstance(frame, np.ndarray):
+        return parquet_take(source['path'], frame[offset:offset + page_size])
+    return frame.iloc[offset:offset + page_size]
+
+# Function to render one chunk (1 based) of a view as CSV bytes
+def csv_chunk(source, frame, chunk, chunk_rows=DEFAULT_CHUNK_ROWS):
+    return read_page(source, frame, chunk, chunk_rows).to_csv(index=False).encode()